@@ -0,0 +1,106 @@
+import threading
+from collections import Counter, OrderedDict
+import numpy as np
+
+from audio_utils import frecuencia_a_nota, frecuencias_a_notas, huella_memorizada
+from metricas import atributos_pista, tramo
+
+SR_ANALISIS = 8000
+FMIN = 80
+FMAX = 1000
+FRAME_LENGTH = 512
+HOP_LENGTH = 256
+FRAMES_POR_TROZO = 4096
+MAX_MEMORIZADOS = 32
+
+
+class LineaTiempoNotas:
+    def __init__(self, tiempos, f0):
+        self.tiempos = tiempos
+        self.f0 = f0
+        self.notas = frecuencias_a_notas(f0)
+
+    def nota_predominante(self):
+        validas = self.f0[~np.isnan(self.f0)]
+        if len(validas) == 0:
+            return "No detectada"
+        return frecuencia_a_nota(np.median(validas))
+
+    def histograma(self):
+        # Cuántas tramas caen en cada nota, de la más a la menos frecuente
+        return dict(Counter(nota for nota in self.notas if nota != "N/A").most_common())
+
+    def segmentos(self):
+        # Agrupa tramas consecutivas con la misma nota: (inicio_s, fin_s, nota)
+        if len(self.notas) == 0:
+            return []
+        cambios = np.flatnonzero(self.notas[1:] != self.notas[:-1]) + 1
+        inicios = np.concatenate(([0], cambios))
+        finales = np.concatenate((cambios, [len(self.notas)]))
+        paso = self.tiempos[1] - self.tiempos[0] if len(self.tiempos) > 1 else 0.0
+        return [(float(self.tiempos[i]), float(self.tiempos[f - 1] + paso), self.notas[i])
+                for i, f in zip(inicios, finales) if self.notas[i] != "N/A"]
+
+
+def seguir_tono(audio, sr, fmin=FMIN, fmax=FMAX):
+    # Se reduce la frecuencia de muestreo (la voz cabe de sobra bajo 4 kHz)
+    # y se procesa en trozos de FRAMES_POR_TROZO tramas alineadas al salto.
+    import librosa
+
+    with tramo("tono", **atributos_pista(audio, sr)):
+        if sr > SR_ANALISIS:
+            with tramo("remuestreo", origen=sr, destino=SR_ANALISIS, muestras=len(audio)):
+                audio = librosa.resample(np.asarray(audio, dtype=np.float32), orig_sr=sr,
+                                         target_sr=SR_ANALISIS, res_type="soxr_hq")
+            sr = SR_ANALISIS
+
+        tam_trozo = FRAMES_POR_TROZO * HOP_LENGTH
+        trozos = []
+        for inicio in range(0, max(len(audio) - FRAME_LENGTH, 0) + 1, tam_trozo):
+            segmento = audio[inicio:inicio + tam_trozo + FRAME_LENGTH - HOP_LENGTH]
+            if len(segmento) < FRAME_LENGTH:
+                break
+            trozos.append(librosa.yin(segmento, fmin=fmin, fmax=fmax, sr=sr,
+                                      frame_length=FRAME_LENGTH, hop_length=HOP_LENGTH, center=False))
+
+        f0 = np.concatenate(trozos) if trozos else np.zeros(0)
+        tiempos = (np.arange(len(f0)) * HOP_LENGTH + FRAME_LENGTH / 2) / sr
+        return tiempos, f0
+
+
+_memorizados = OrderedDict()
+_lock_memorizados = threading.Lock()
+
+
+def analizar_tono(audio, sr):
+    clave = (huella_memorizada(audio), sr)
+    with _lock_memorizados:
+        if clave in _memorizados:
+            _memorizados.move_to_end(clave)
+            return _memorizados[clave]
+
+    linea = LineaTiempoNotas(*seguir_tono(audio, sr))
+
+    with _lock_memorizados:
+        _memorizados[clave] = linea
+        while len(_memorizados) > MAX_MEMORIZADOS:
+            _memorizados.popitem(last=False)
+    return linea
+
+
+def memorizados_de(huellas):
+    # [(huella, sr, línea de tiempo)] ya analizadas de estas pistas
+    with _lock_memorizados:
+        return [(huella, sr, linea) for (huella, sr), linea in _memorizados.items() if huella in huellas]
+
+
+def sembrar(huella, sr, linea):
+    with _lock_memorizados:
+        _memorizados[(huella, sr)] = linea
+        while len(_memorizados) > MAX_MEMORIZADOS:
+            _memorizados.popitem(last=False)
+
+
+def limpiar_memorizados():
+    with _lock_memorizados:
+        _memorizados.clear()
@@ -1,84 +1,386 @@
+import hashlib
 import os
+import queue
+import shutil
 import subprocess
+import threading
 import warnings
+import weakref
 import numpy as np
-import librosa
-import soundfile as sf
-from scipy.fft import fft, ifft
-from pydub import AudioSegment
+
+from metricas import atributos_pista, tramo
+from separacion import obtener_motor
+
+# Resultado de la comprobación de ffmpeg: se lanza el proceso una sola vez por sesión
+_ffmpeg_disponible = None
+_lock_ffmpeg = threading.Lock()
 
 def verificar_ffmpeg():
-    try:
-        subprocess.run(["ffmpeg", "-version"], check=True, 
-                       stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    except (subprocess.CalledProcessError, FileNotFoundError):
+    global _ffmpeg_disponible
+    with _lock_ffmpeg:
+        if _ffmpeg_disponible is None:
+            try:
+                subprocess.run(["ffmpeg", "-version"], check=True,
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+                _ffmpeg_disponible = True
+            except (subprocess.CalledProcessError, FileNotFoundError):
+                _ffmpeg_disponible = False
+    if not _ffmpeg_disponible:
         raise EnvironmentError("FFmpeg no encontrado. Descárgalo en: https://ffmpeg.org/download.html")
 
-def aplicar_fft(audio, umbral_porcentaje):
+TAM_BLOQUE_DISCO = 1 << 20
+# Trozos que caben en la caché: max y min del mismo trozo solo leen la memoria una vez
+TAM_BLOQUE_PICO = 1 << 16
+# Buffers que rotan entre el escalado y el hilo que codifica al exportar
+BUFFERS_EXPORTACION = 3
+MAX_HILOS_PISTAS = 4
+# Extensión -> (formato, subtipo) de soundfile
+FORMATOS_AUDIO = {
+    ".wav": ("WAV", "PCM_16"),
+    ".flac": ("FLAC", "PCM_16"),
+    ".ogg": ("OGG", "VORBIS"),
+}
+
+def duracion_audio(ruta):
+    try:
+        resultado = subprocess.run(
+            ["ffprobe", "-v", "error", "-show_entries", "format=duration",
+             "-of", "default=noprint_wrappers=1:nokey=1", ruta],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        return float(resultado.stdout.strip())
+    except (OSError, ValueError):
+        return None
+
+def cargar_audio(ruta, sr=22050, offset=0.0, duracion=None):
+    with tramo("carga", ruta=os.path.basename(ruta), sr=sr, offset=offset) as atributos:
+        try:
+            verificar_ffmpeg()
+        except EnvironmentError:
+            import librosa
+            audio, sr = librosa.load(ruta, sr=sr, offset=offset, duration=duracion, res_type='kaiser_fast')
+            atributos.update(decodificador="librosa", **atributos_pista(audio, sr))
+            return audio, sr
+
+        # ffmpeg decodifica, mezcla a mono y remuestrea en una sola pasada; las muestras
+        # float32 se leen del pipe directamente sobre un buffer reservado de antemano.
+        total = duracion
+        if total is None:
+            total = duracion_audio(ruta)
+            total = max(total - offset, 0.0) if total is not None else 60.0
+        buffer = np.empty(int(np.ceil(total * sr)) + sr, dtype=np.float32)
+
+        leidos = 0
+        with subprocess.Popen(_comando_ffmpeg(ruta, sr, offset, duracion),
+                              stdout=subprocess.PIPE, stderr=subprocess.PIPE) as proceso:
+            while True:
+                if leidos == buffer.nbytes:
+                    # La duración estimada se quedó corta: se duplica la capacidad
+                    buffer = np.resize(buffer, len(buffer) * 2)
+                n = proceso.stdout.readinto(memoryview(buffer).cast("B")[leidos:])
+                if not n:
+                    break
+                leidos += n
+            errores = proceso.stderr.read().decode(errors="replace")
+            if proceso.wait() != 0:
+                raise RuntimeError(f"FFmpeg no pudo decodificar el archivo:\n{errores.strip()}")
+
+        muestras = leidos // 4
+        audio = buffer[:muestras].copy() if muestras < 0.9 * len(buffer) else buffer[:muestras]
+        atributos.update(decodificador="ffmpeg", **atributos_pista(audio, sr))
+        return audio, sr
+
+def cargar_audio_en_disco(ruta, ruta_destino, sr=22050, offset=0.0, duracion=None,
+                          tam_bloque=TAM_BLOQUE_DISCO):
+    # Igual que cargar_audio, pero las muestras van a un archivo float32 que se
+    # devuelve mapeado en memoria: la pista nunca está entera en RAM.
+    with tramo("carga", ruta=os.path.basename(ruta), sr=sr, offset=offset, en_disco=True) as atributos:
+        try:
+            verificar_ffmpeg()
+        except EnvironmentError:
+            import librosa
+            audio, sr = librosa.load(ruta, sr=sr, offset=offset, duration=duracion, res_type='kaiser_fast')
+            audio.tofile(ruta_destino)
+            atributos.update(decodificador="librosa", **atributos_pista(audio, sr))
+            return np.memmap(ruta_destino, dtype=np.float32, mode="r+"), sr
+
+        with open(ruta_destino, "wb") as destino, \
+                subprocess.Popen(_comando_ffmpeg(ruta, sr, offset, duracion),
+                                 stdout=subprocess.PIPE, stderr=subprocess.PIPE) as proceso:
+            shutil.copyfileobj(proceso.stdout, destino, tam_bloque * 4)
+            errores = proceso.stderr.read().decode(errors="replace")
+            if proceso.wait() != 0:
+                raise RuntimeError(f"FFmpeg no pudo decodificar el archivo:\n{errores.strip()}")
+
+        if os.path.getsize(ruta_destino) < 4:
+            raise RuntimeError("FFmpeg no devolvió muestras de audio")
+        audio = np.memmap(ruta_destino, dtype=np.float32, mode="r+")
+        atributos.update(decodificador="ffmpeg", **atributos_pista(audio, sr))
+        return audio, sr
+
+def _comando_ffmpeg(ruta, sr, offset, duracion):
+    comando = ["ffmpeg", "-nostdin", "-v", "error"]
+    if offset:
+        comando += ["-ss", str(offset)]
+    comando += ["-i", ruta]
+    if duracion is not None:
+        comando += ["-t", str(duracion)]
+    return comando + ["-f", "f32le", "-ac", "1", "-ar", str(sr), "-"]
+
+TAM_BLOQUE_FFT = 4096
+
+# Precisión de trabajo de la cadena (filtro FFT, normalización, STFT y exportación):
+# nombre -> (tipo real, tipo complejo)
+PRECISIONES = {
+    "float32": (np.float32, np.complex64),
+    "float64": (np.float64, np.complex128),
+}
+_precision = "float32"
+
+def obtener_precision():
+    return _precision
+
+def establecer_precision(nombre):
+    global _precision
+    if nombre not in PRECISIONES:
+        raise ValueError(f"Precisión no válida: {nombre}")
+    _precision = nombre
+
+def tipos_precision(precision=None):
+    return PRECISIONES[precision or _precision]
+
+
+def ventana_raiz_hann(tam_bloque):
+    # Raíz de Hann periódica: análisis + síntesis con 50% de solape suma exactamente 1
+    return np.sqrt(0.5 - 0.5 * np.cos(2 * np.pi * np.arange(tam_bloque) / tam_bloque))
+
+
+def iterar_bloques(audio, tam_bloque=TAM_BLOQUE_FFT, dtype=np.float64):
+    # Genera (inicio, bloque) con salto de medio bloque. El bloque es un buffer
+    # reutilizado: hay que consumirlo antes de pedir el siguiente.
+    salto = tam_bloque // 2
+    bloque = np.zeros(tam_bloque, dtype=dtype)
+    inicio = -salto
+    while inicio < len(audio):
+        a = max(inicio, 0)
+        b = min(inicio + tam_bloque, len(audio))
+        bloque[:] = 0
+        bloque[a - inicio:b - inicio] = audio[a:b]
+        yield inicio, bloque
+        inicio += salto
+
+
+def maximo_espectral(audio, tam_bloque=TAM_BLOQUE_FFT, precision=None):
+    real, complejo = tipos_precision(precision)
+    ventana = ventana_raiz_hann(tam_bloque).astype(real)
+    espectro = np.empty(tam_bloque // 2 + 1, dtype=complejo)
+    magnitud = np.empty(tam_bloque // 2 + 1, dtype=real)
+    maximo = 0.0
+    for _, bloque in iterar_bloques(audio, tam_bloque, real):
+        bloque *= ventana
+        np.fft.rfft(bloque, out=espectro)
+        maximo = max(maximo, float(np.abs(espectro, out=magnitud).max()))
+    return maximo
+
+
+def aplicar_fft(audio, umbral_porcentaje, tam_bloque=TAM_BLOQUE_FFT, modo_umbral="global", salida=None,
+                precision=None):
     if audio is None:
         return None
-    
-    fft_transform = fft(audio)
-    umbral = (umbral_porcentaje / 100) * np.max(np.abs(fft_transform))
-    fft_transform[np.abs(fft_transform) < umbral] = 0
-    return np.real(ifft(fft_transform))
+    if modo_umbral not in ("global", "bloque"):
+        raise ValueError(f"Modo de umbral no válido: {modo_umbral}")
+
+    real, complejo = tipos_precision(precision)
+    with tramo("fft", muestras=len(audio), umbral=umbral_porcentaje, modo=modo_umbral,
+               precision=np.dtype(real).name):
+        # Todos los buffers por bloque se reservan una vez; el bucle trabaja en el sitio
+        ventana = ventana_raiz_hann(tam_bloque).astype(real)
+        espectro = np.empty(tam_bloque // 2 + 1, dtype=complejo)
+        magnitud = np.empty(tam_bloque // 2 + 1, dtype=real)
+        mascara = np.empty(tam_bloque // 2 + 1, dtype=bool)
+        filtrado = np.empty(tam_bloque, dtype=real)
+
+        factor = umbral_porcentaje / 100
+        # En modo global se necesita una primera pasada para conocer el máximo de todo el audio
+        umbral_global = (factor * maximo_espectral(audio, tam_bloque, precision)
+                         if modo_umbral == "global" else None)
+
+        if salida is None:
+            salida = np.zeros(len(audio), dtype=real)
+        else:
+            salida[:] = 0
+        for inicio, bloque in iterar_bloques(audio, tam_bloque, real):
+            bloque *= ventana
+            np.fft.rfft(bloque, out=espectro)
+            np.abs(espectro, out=magnitud)
+            umbral = umbral_global if umbral_global is not None else factor * magnitud.max()
+            np.less(magnitud, umbral, out=mascara)
+            np.copyto(espectro, 0, where=mascara)
+            np.fft.irfft(espectro, n=tam_bloque, out=filtrado)
+            filtrado *= ventana
+
+            a = max(inicio, 0)
+            b = min(inicio + tam_bloque, len(audio))
+            salida[a:b] += filtrado[a - inicio:b - inicio]
+        return salida
 
 def normalizar_audio(audio):
-    if audio is None or np.max(np.abs(audio)) == 0:
+    # El pico se busca por bloques (sin copias de |audio|)
+    if audio is None:
+        return audio
+    pico = pico_absoluto(audio)
+    if pico == 0:
         return audio
-    return audio / np.max(np.abs(audio))
+    return audio / pico
+
+def pico_absoluto(audio, tam_bloque=TAM_BLOQUE_PICO):
+    pico = 0.0
+    for inicio in range(0, len(audio), tam_bloque):
+        bloque = audio[inicio:inicio + tam_bloque]
+        pico = max(pico, float(np.max(bloque)), float(-np.min(bloque)))
+    return pico
 
-def guardar_audio(pista, sr, ruta_guardado):
+def guardar_audio(pista, sr, ruta_guardado, tam_bloque=TAM_BLOQUE_DISCO):
     if pista is None:
         raise ValueError("No hay pista para guardar")
-    pista_normalizada = normalizar_audio(pista)
-    sf.write(ruta_guardado, pista_normalizada, sr)
+    import soundfile as sf
+
+    extension = os.path.splitext(ruta_guardado)[1].lower()
+    # Otras extensiones: soundfile deduce el formato (o lo rechaza)
+    formato, subtipo = FORMATOS_AUDIO.get(extension, (None, None))
+
+    with tramo("exportacion", formato=extension, **atributos_pista(pista, sr)):
+        # Se normaliza y escribe por bloques para no duplicar en memoria pistas largas
+        # (o mapeadas desde disco). Un hilo codifica (FLAC/OGG son lo caro) mientras
+        # este escala el bloque siguiente; los buffers rotan, no se crean por bloque.
+        real, _ = tipos_precision()
+        pico = pico_absoluto(pista)
+        escala = real(1.0 / pico if pico > 0 else 1.0)
+        libres = queue.Queue()
+        llenos = queue.Queue()
+        for _ in range(BUFFERS_EXPORTACION):
+            libres.put(np.empty(min(tam_bloque, len(pista)), dtype=real))
+        errores = []
+
+        with sf.SoundFile(ruta_guardado, "w", samplerate=sr, channels=1,
+                          format=formato, subtype=subtipo) as archivo:
+            def codificar():
+                try:
+                    while (lleno := llenos.get()) is not None:
+                        buffer, longitud = lleno
+                        archivo.write(buffer[:longitud])
+                        libres.put(buffer)
+                except BaseException as e:
+                    errores.append(e)
+                    libres.put(None)  # desbloquea al que escala
+
+            hilo = threading.Thread(target=codificar, name="codificador", daemon=True)
+            hilo.start()
+            try:
+                for inicio in range(0, len(pista), tam_bloque):
+                    buffer = libres.get()
+                    if buffer is None:
+                        break
+                    longitud = min(tam_bloque, len(pista) - inicio)
+                    np.multiply(pista[inicio:inicio + longitud], escala, out=buffer[:longitud])
+                    llenos.put((buffer, longitud))
+            finally:
+                llenos.put(None)
+                hilo.join()
+        if errores:
+            raise errores[0]
+
+def guardar_pistas(pistas, sr, max_hilos=MAX_HILOS_PISTAS):
+    # pistas: [(pista, ruta)]. Cada una se exporta en su propio hilo; libsndfile
+    # suelta el GIL, así que la voz y el instrumental se codifican a la vez
+    from concurrent.futures import ThreadPoolExecutor
+
+    pistas = list(pistas)
+    with ThreadPoolExecutor(max_workers=max(1, min(max_hilos, len(pistas)))) as pool:
+        futuros = [pool.submit(guardar_audio, pista, sr, ruta) for pista, ruta in pistas]
+        for futuro in futuros:
+            futuro.result()
+    return [ruta for _, ruta in pistas]
+
+NOTAS = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
 
 def obtener_nota_predominante(audio, sr):
     try:
-        f0 = librosa.yin(audio, fmin=80, fmax=1000, sr=sr)
-        f0 = f0[~np.isnan(f0)]
-        if len(f0) == 0:
-            return "No detectada"
-        return frecuencia_a_nota(np.median(f0))
-    except:
+        from analisis_tono import analizar_tono
+        return analizar_tono(audio, sr).nota_predominante()
+    except Exception:
         return "Error en detección"
 
 def frecuencia_a_nota(frecuencia):
     if frecuencia <= 0:
         return "N/A"
-    notas = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
-    num_midi = 12 * np.log2(frecuencia / 440.0) + 69
-    octava = int((num_midi // 12) - 1)
-    return f"{notas[int(num_midi % 12)]}{octava}"
+    # Semitono más cercano: truncar nombra un E4 algo bajo como D#4
+    num_midi = int(round(12 * np.log2(frecuencia / 440.0) + 69))
+    octava = num_midi // 12 - 1
+    return f"{NOTAS[num_midi % 12]}{octava}"
 
-def separar_pistas(audio_array, sr, temp_name="temp_audio"):
-    temp_dir = "temp_processing"
-    os.makedirs(temp_dir, exist_ok=True)
-    temp_path = os.path.join(temp_dir, f"{temp_name}.wav")
-    sf.write(temp_path, audio_array, sr)
+def frecuencias_a_notas(frecuencias):
+    # Versión vectorizada de frecuencia_a_nota: NaN y valores <= 0 dan "N/A"
+    frecuencias = np.asarray(frecuencias, dtype=np.float64)
+    notas = np.full(frecuencias.shape, "N/A", dtype=object)
+    validas = np.isfinite(frecuencias) & (frecuencias > 0)
+    num_midi = np.rint(12 * np.log2(frecuencias[validas] / 440.0) + 69).astype(int)
+    nombres = np.array(NOTAS)[num_midi % 12]
+    octavas = (num_midi // 12 - 1).astype(str)
+    notas[validas] = np.char.add(nombres, octavas)
+    return notas
 
-    comando = [
-        "demucs",
-        "--two-stems", "vocals",
-        "-o", "separated",
-        temp_path
-    ]
-    proceso = subprocess.Popen(comando, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
-    proceso.communicate()
+def huella_audio(audio, *extras):
+    h = hashlib.blake2b(digest_size=20)
+    h.update(str(np.asarray(audio).dtype).encode())
+    h.update(np.ascontiguousarray(audio).view(np.uint8))
+    for extra in extras:
+        h.update(repr(extra).encode())
+    return h.hexdigest()
 
-    base_path = os.path.join("separated", "htdemucs", temp_name)
-    vocal_path = os.path.join(base_path, "vocals.wav")
-    instrumental_path = os.path.join(base_path, "other.wav")
+def huella_convertida(audio, dtype, tam_bloque=TAM_BLOQUE_DISCO):
+    # La huella_audio que tendría audio.astype(dtype), sin convertirlo entero
+    dtype = np.dtype(dtype)
+    h = hashlib.blake2b(digest_size=20)
+    h.update(str(dtype).encode())
+    plano = np.asarray(audio).reshape(-1)
+    for inicio in range(0, len(plano), tam_bloque):
+        h.update(np.ascontiguousarray(plano[inicio:inicio + tam_bloque], dtype=dtype).view(np.uint8))
+    return h.hexdigest()
 
-    if not os.path.exists(vocal_path) or not os.path.exists(instrumental_path):
-        raise FileNotFoundError("No se encontraron las pistas separadas")
+_huellas = {}
+_lock_huellas = threading.Lock()
 
-    vocal_track, _ = librosa.load(vocal_path, sr=sr)
-    instrumental_track, _ = librosa.load(instrumental_path, sr=sr)
+def huella_memorizada(audio):
+    # Igual que huella_audio, pero recuerda el resultado mientras viva el array
+    clave = id(audio)
+    with _lock_huellas:
+        registro = _huellas.get(clave)
+        if registro is not None and registro[0]() is audio:
+            return registro[1]
+    huella = huella_audio(audio)
+    with _lock_huellas:
+        _huellas[clave] = (weakref.ref(audio, lambda _, c=clave: _huellas.pop(c, None)), huella)
+    return huella
 
-    if os.path.exists(temp_path):
-        os.remove(temp_path)
+def sembrar_huella(audio, huella):
+    # Para arrays cuya huella ya se conoce (p. ej. al abrir una sesión): evita
+    # leer la pista entera solo para calcularla
+    clave = id(audio)
+    with _lock_huellas:
+        _huellas[clave] = (weakref.ref(audio, lambda _, c=clave: _huellas.pop(c, None)), huella)
 
-    return vocal_track, instrumental_track
+def separar_pistas(audio_array, sr, motor=None, cache=None, progreso=None):
+    if audio_array is None:
+        raise ValueError("No hay audio para separar")
+    motor = motor or obtener_motor()
+    with tramo("separacion", motor=type(motor).__name__, **atributos_pista(audio_array, sr)) as atributos:
+        if cache is None:
+            return motor.separar(audio_array, sr, progreso=progreso)
 
+        clave = cache.clave(audio_array, sr, motor.parametros())
+        pistas = cache.obtener(clave)
+        atributos["cache"] = "acierto" if pistas is not None else "fallo"
+        if pistas is None:
+            pistas = motor.separar(audio_array, sr, progreso=progreso)
+            cache.guardar(clave, *pistas)
+        return pistas
@@ -0,0 +1,109 @@
+import numpy as np
+
+from audio_utils import TAM_BLOQUE_FFT, iterar_bloques, tipos_precision, ventana_raiz_hann
+from metricas import tramo
+
+UMBRALES_CURVA = np.arange(0, 101)
+# Por encima (unos 10 min a 22050 Hz, ~265 MB de análisis) se filtra con una
+# FFT por umbral en lugar de guardar el barrido
+MAX_MUESTRAS_BARRIDO = 10 * 60 * 22050
+
+
+class BarridoUmbral:
+    # Análisis de una pista para explorar umbrales sin repetir la FFT. Guarda los
+    # espectros de los bloques de aplicar_fft (raíz de Hann, 50% de solape) y sus
+    # magnitudes ordenadas con la energía acumulada: la energía retenida y los
+    # bins que sobreviven a un umbral salen de una búsqueda binaria, y la señal
+    # filtrada solo necesita la transformada inversa. Ocupa unos 20 bytes por
+    # muestra en float32.
+    def __init__(self, audio, tam_bloque=TAM_BLOQUE_FFT, precision=None):
+        real, complejo = tipos_precision(precision)
+        self.longitud = len(audio)
+        self.tam_bloque = tam_bloque
+        self.real = real
+        n_bins = tam_bloque // 2 + 1
+
+        with tramo("barrido", muestras=len(audio), tam_bloque=tam_bloque):
+            n_bloques = len(range(-(tam_bloque // 2), self.longitud, tam_bloque // 2))
+            self.espectros = np.empty((n_bloques, n_bins), dtype=complejo)
+            self.maximos_bloque = np.empty(n_bloques, dtype=real)
+            magnitudes = np.empty((n_bloques, n_bins), dtype=real)
+            ventana = ventana_raiz_hann(tam_bloque).astype(real)
+            for i, (_, bloque) in enumerate(iterar_bloques(audio, tam_bloque, real)):
+                bloque *= ventana
+                np.fft.rfft(bloque, out=self.espectros[i])
+                np.abs(self.espectros[i], out=magnitudes[i])
+                self.maximos_bloque[i] = magnitudes[i].max() if n_bins else 0
+
+            self.maximo = float(self.maximos_bloque.max()) if n_bloques else 0.0
+            # Orden ascendente: lo que cae bajo un umbral es siempre un prefijo
+            self.magnitudes_ordenadas = np.sort(magnitudes, axis=None)
+            del magnitudes
+            self.energia_acumulada = np.cumsum(np.square(self.magnitudes_ordenadas, dtype=np.float64))
+            self.energia_total = float(self.energia_acumulada[-1]) if len(self.energia_acumulada) else 0.0
+
+    @property
+    def nbytes(self):
+        return (self.espectros.nbytes + self.maximos_bloque.nbytes
+                + self.magnitudes_ordenadas.nbytes + self.energia_acumulada.nbytes)
+
+    @property
+    def total_bins(self):
+        return len(self.magnitudes_ordenadas)
+
+    def umbral_absoluto(self, umbral_porcentaje):
+        # Mismo criterio que aplicar_fft en modo global
+        return umbral_porcentaje / 100 * self.maximo
+
+    def _eliminados(self, umbral_porcentaje):
+        # Cuántos bins quedan por debajo del umbral (los que aplicar_fft pone a 0)
+        umbral = np.asarray(umbral_porcentaje, dtype=np.float64) / 100 * self.maximo
+        return np.searchsorted(self.magnitudes_ordenadas, umbral.astype(self.real), side="left")
+
+    def bins_supervivientes(self, umbral_porcentaje):
+        return self.total_bins - self._eliminados(umbral_porcentaje)
+
+    def energia_retenida(self, umbral_porcentaje):
+        # Fracción (0-1) de la energía espectral que sobrevive al umbral
+        if not self.energia_total:
+            return np.zeros_like(np.asarray(umbral_porcentaje, dtype=np.float64))
+        eliminados = self._eliminados(umbral_porcentaje)
+        perdida = np.where(eliminados > 0, self.energia_acumulada[np.maximum(eliminados - 1, 0)], 0.0)
+        return (self.energia_total - perdida) / self.energia_total
+
+    def curva_energia(self, umbrales=UMBRALES_CURVA):
+        # (umbrales, energía retenida, bins supervivientes) para dibujar junto al deslizador
+        umbrales = np.asarray(umbrales, dtype=np.float64)
+        return umbrales, self.energia_retenida(umbrales), self.bins_supervivientes(umbrales)
+
+    def senal_filtrada(self, umbral_porcentaje, salida=None):
+        # Igual que aplicar_fft(audio, umbral_porcentaje) en modo global
+        b = self.tam_bloque
+        umbral = self.real(self.umbral_absoluto(umbral_porcentaje))
+        with tramo("fft", muestras=self.longitud, umbral=umbral_porcentaje, modo="barrido",
+                   precision=np.dtype(self.real).name):
+            ventana = ventana_raiz_hann(b).astype(self.real)
+            espectro = np.empty(b // 2 + 1, dtype=self.espectros.dtype)
+            magnitud = np.empty(b // 2 + 1, dtype=self.real)
+            mascara = np.empty(b // 2 + 1, dtype=bool)
+            filtrado = np.empty(b, dtype=self.real)
+
+            if salida is None:
+                salida = np.zeros(self.longitud, dtype=self.real)
+            else:
+                salida[:] = 0
+            for i, inicio in enumerate(range(-(b // 2), self.longitud, b // 2)):
+                if self.maximos_bloque[i] < umbral:
+                    # Todo el bloque queda por debajo del umbral: no aporta nada
+                    continue
+                np.copyto(espectro, self.espectros[i])
+                np.abs(espectro, out=magnitud)
+                np.less(magnitud, umbral, out=mascara)
+                np.copyto(espectro, 0, where=mascara)
+                np.fft.irfft(espectro, n=b, out=filtrado)
+                filtrado *= ventana
+
+                a = max(inicio, 0)
+                fin = min(inicio + b, self.longitud)
+                salida[a:fin] += filtrado[a - inicio:fin - inicio]
+            return salida
@@ -0,0 +1,556 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:
+    # Windows: no hay getrusage, la memoria pico se deja en blanco
+    resource = None
+
+ARCHIVO_BASE = "benchmarks_base.json"
+SR_BENCH = 22050
+DURACIONES = (5, 30, 120)
+SENALES = ("tono", "chirp", "ruido")
+UMBRAL_BENCH = 15
+TOLERANCIA = 0.25
+
+
+def generar_senal(tipo, duracion, sr=SR_BENCH, semilla=0):
+    # Señales sintéticas reproducibles en float32, con pico 0.5
+    t = np.arange(int(duracion * sr)) / sr
+    if tipo == "tono":
+        # La 440 Hz con armónicos y un vibrato leve, para que el tono tenga algo que seguir
+        fase = 2 * np.pi * 440 * t + 3 * np.sin(2 * np.pi * 5 * t)
+        senal = sum(np.sin(k * fase) / k for k in range(1, 6))
+    elif tipo == "chirp":
+        # Barrido logarítmico de 80 Hz a 8 kHz que se repite cada 10 s
+        f0, f1, periodo = 80.0, 8000.0, 10.0
+        k = np.log(f1 / f0) / periodo
+        senal = np.sin(2 * np.pi * f0 * np.expm1(k * (t % periodo)) / k)
+    elif tipo == "ruido":
+        senal = np.random.default_rng(semilla).standard_normal(len(t))
+    else:
+        raise ValueError(f"Señal sintética desconocida: {tipo}")
+    senal = np.asarray(senal, dtype=np.float32)
+    pico = np.max(np.abs(senal)) if len(senal) else 0
+    return senal * np.float32(0.5 / pico) if pico else senal
+
+
+def pico_rss_mb():
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux lo da en KiB y macOS en bytes
+    return pico / 1024 ** 2 if sys.platform == "darwin" else pico / 1024
+
+
+def _limpiar_caches():
+    # Cada repetición debe medir el cálculo, no un acierto de las cachés en memoria
+    from analisis_tono import limpiar_memorizados
+    from espectrogramas import almacen_espectrogramas
+
+    almacen_espectrogramas.limpiar()
+    limpiar_memorizados()
+
+
+# Cada etapa recibe (audio, sr, directorio de trabajo) y devuelve la función sin
+# argumentos que se cronometra. La preparación no entra en la medida.
+def _etapa_aplicar_fft(audio, sr, directorio):
+    from audio_utils import aplicar_fft
+    return lambda: aplicar_fft(audio, UMBRAL_BENCH)
+
+
+def _etapa_normalizar_audio(audio, sr, directorio):
+    from audio_utils import normalizar_audio
+    return lambda: normalizar_audio(audio)
+
+
+def _etapa_nota_predominante(audio, sr, directorio):
+    from audio_utils import obtener_nota_predominante
+    return lambda: obtener_nota_predominante(audio, sr)
+
+
+def _etapa_frecuencia_a_nota(audio, sr, directorio):
+    # Una frecuencia por trama de análisis, como en el seguimiento de tono
+    from analisis_tono import HOP_LENGTH, SR_ANALISIS
+    from audio_utils import frecuencia_a_nota
+
+    n = max(1, len(audio) * SR_ANALISIS // (sr * HOP_LENGTH))
+    frecuencias = np.random.default_rng(0).uniform(80, 1000, n)
+    return lambda: [frecuencia_a_nota(f) for f in frecuencias]
+
+
+def _etapa_frecuencias_a_notas(audio, sr, directorio):
+    from analisis_tono import HOP_LENGTH, SR_ANALISIS
+    from audio_utils import frecuencias_a_notas
+
+    n = max(1, len(audio) * SR_ANALISIS // (sr * HOP_LENGTH))
+    frecuencias = np.random.default_rng(0).uniform(80, 1000, n)
+    return lambda: frecuencias_a_notas(frecuencias)
+
+
+def _etapa_graficar_espectrograma(audio, sr, directorio):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    from visuals import graficar_espectrograma
+
+    def graficar():
+        figura = plt.figure(figsize=(12, 4))
+        graficar_espectrograma(audio, sr, "Benchmark", UMBRAL_BENCH)
+        figura.canvas.draw()
+        plt.close(figura)
+
+    return graficar
+
+
+def _etapa_cargar_audio(audio, sr, directorio):
+    import librosa
+    import soundfile as sf
+    from audio_utils import cargar_audio
+
+    # Se guarda a 44.1 kHz para que la carga incluya el remuestreo habitual
+    ruta = os.path.join(directorio, "entrada.wav")
+    sf.write(ruta, librosa.resample(audio, orig_sr=sr, target_sr=44100), 44100)
+    return lambda: cargar_audio(ruta, sr=sr)
+
+
+def _etapa_separar_pistas(audio, sr, directorio):
+    from audio_utils import separar_pistas
+    from separacion import MotorSimulado
+
+    motor = MotorSimulado()
+    return lambda: separar_pistas(audio, sr, motor=motor)
+
+
+ETAPAS = {
+    "aplicar_fft": _etapa_aplicar_fft,
+    "normalizar_audio": _etapa_normalizar_audio,
+    "obtener_nota_predominante": _etapa_nota_predominante,
+    "frecuencia_a_nota": _etapa_frecuencia_a_nota,
+    "frecuencias_a_notas": _etapa_frecuencias_a_notas,
+    "graficar_espectrograma": _etapa_graficar_espectrograma,
+    "cargar_audio": _etapa_cargar_audio,
+    "separar_pistas": _etapa_separar_pistas,
+}
+
+
+def medir_etapa(etapa, senal, duracion, repeticiones=3, sr=SR_BENCH):
+    # Se ejecuta en un proceso nuevo por caso para que la memoria pico sea solo suya
+    audio = generar_senal(senal, duracion, sr)
+    with tempfile.TemporaryDirectory(prefix="tg_bench_") as directorio:
+        funcion = ETAPAS[etapa](audio, sr, directorio)
+        rss_inicial = pico_rss_mb()
+
+        # Primera ejecución de calentamiento (compilación de numba, cachés de FFT...)
+        _limpiar_caches()
+        funcion()
+
+        tiempos = []
+        for _ in range(repeticiones):
+            _limpiar_caches()
+            inicio = time.perf_counter()
+            funcion()
+            tiempos.append(time.perf_counter() - inicio)
+
+    rss_final = pico_rss_mb()
+    return {
+        "etapa": etapa,
+        "senal": senal,
+        "duracion_s": duracion,
+        "tiempo_s": statistics.median(tiempos),
+        "tiempo_min_s": min(tiempos),
+        "tiempos_s": tiempos,
+        "pico_rss_mb": rss_final,
+        "incremento_rss_mb": None if rss_final is None else rss_final - rss_inicial,
+    }
+
+
+# Se ejecuta en un intérprete nuevo: mide la importación de gui y, si hay
+# pantalla, el tiempo hasta que la ventana está dibujada
+CODIGO_ARRANQUE = """
+import json, time
+inicio = time.perf_counter()
+import gui
+importado = time.perf_counter()
+ventana = None
+try:
+    import tkinter as tk
+    root = tk.Tk()
+except Exception:
+    root = None
+if root is not None:
+    app = gui.AudioPlayerApp(root, precalentar=False)
+    root.update()
+    ventana = time.perf_counter() - inicio
+    root.destroy()
+print(json.dumps({"importacion_s": importado - inicio, "ventana_s": ventana}))
+"""
+
+
+def medir_arranque(repeticiones=5):
+    # Arranque en frío: proceso completo (intérprete incluido) hasta tener la ventana
+    directorio = os.path.dirname(os.path.abspath(__file__))
+    tiempos, importaciones, ventanas = [], [], []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        salida = subprocess.run([sys.executable, "-W", "ignore", "-c", CODIGO_ARRANQUE], cwd=directorio,
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True)
+        tiempos.append(time.perf_counter() - inicio)
+        medidas = json.loads(salida.stdout.strip().splitlines()[-1])
+        importaciones.append(medidas["importacion_s"])
+        if medidas["ventana_s"] is not None:
+            ventanas.append(medidas["ventana_s"])
+
+    rss = None
+    if resource is not None:
+        rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        rss = rss / 1024 ** 2 if sys.platform == "darwin" else rss / 1024
+    return {
+        "etapa": "arranque",
+        "senal": "gui",
+        "duracion_s": 0,
+        "tiempo_s": statistics.median(tiempos),
+        "tiempo_min_s": min(tiempos),
+        "tiempos_s": tiempos,
+        "importacion_s": statistics.median(importaciones),
+        "ventana_s": statistics.median(ventanas) if ventanas else None,
+        "pico_rss_mb": rss,
+        "incremento_rss_mb": None,
+    }
+
+
+def _memoria_pico_mb(funcion):
+    tracemalloc.start()
+    try:
+        resultado = funcion()
+        return resultado, tracemalloc.get_traced_memory()[1] / 1024 ** 2
+    finally:
+        tracemalloc.stop()
+
+
+def comparar_precisiones(senales, duracion=60.0, sr=SR_BENCH):
+    # Exactitud del modo float32 frente a float64 y memoria de trabajo por etapa
+    # (pico de tracemalloc; la entrada no cuenta) para `duracion` segundos de audio
+    from audio_utils import aplicar_fft, establecer_precision, normalizar_audio, obtener_precision
+    from espectrogramas import calcular_db
+
+    etapas = {
+        "aplicar_fft": lambda audio: aplicar_fft(audio, UMBRAL_BENCH),
+        "normalizar_audio": lambda audio: normalizar_audio(audio),
+        "stft_db": lambda audio: calcular_db(audio),
+    }
+    anterior = obtener_precision()
+    filas = []
+    try:
+        for senal in senales:
+            audio32 = generar_senal(senal, duracion, sr)
+            audio64 = audio32.astype(np.float64)
+            for etapa, funcion in etapas.items():
+                establecer_precision("float64")
+                referencia, memoria64 = _memoria_pico_mb(lambda: funcion(audio64))
+                establecer_precision("float32")
+                resultado, memoria32 = _memoria_pico_mb(lambda: funcion(audio32))
+                diferencia = np.asarray(resultado, dtype=np.float64) - referencia
+                potencia_error = float(np.mean(diferencia ** 2))
+                filas.append({
+                    "senal": senal,
+                    "etapa": etapa,
+                    "dtype": str(resultado.dtype),
+                    "error_max": float(np.max(np.abs(diferencia))),
+                    # En dB de espectrograma la SNR no tiene sentido: solo el error máximo
+                    "snr_db": (None if etapa == "stft_db" or potencia_error == 0
+                               else 10 * np.log10(float(np.mean(referencia ** 2)) / potencia_error)),
+                    "memoria_float64_mb": memoria64,
+                    "memoria_float32_mb": memoria32,
+                })
+    finally:
+        establecer_precision(anterior)
+    return filas
+
+
+def comparar_segmentos(duracion=600.0, sr=SR_BENCH, trabajadores=None):
+    # Separación por segmentos: error del cosido con el motor puntual (debe ser
+    # ~1e-7) y tiempo con 1 y N procesos usando el motor simulado
+    from separacion import MotorPuntual, MotorSegmentado
+
+    trabajadores = trabajadores or os.cpu_count() or 1
+    audio = generar_senal("ruido", duracion, sr)
+    segmentado = MotorSegmentado("puntual", trabajadores=trabajadores)
+    try:
+        voz, instrumental = segmentado.separar(audio, sr)
+    finally:
+        segmentado.cerrar()
+    referencia_voz, referencia_instrumental = MotorPuntual().separar(audio, sr)
+    informe = {
+        "duracion_s": duracion,
+        "error_cosido": float(max(np.max(np.abs(voz - referencia_voz)),
+                                  np.max(np.abs(instrumental - referencia_instrumental)))),
+        "tiempos_s": {},
+    }
+    for n in sorted({1, trabajadores}):
+        motor = MotorSegmentado("simulado", trabajadores=n)
+        try:
+            motor.cargar()
+            motor.separar(audio[:sr], sr)  # arranque de los procesos fuera de la medida
+            inicio = time.perf_counter()
+            motor.separar(audio, sr)
+            informe["tiempos_s"][n] = time.perf_counter() - inicio
+        finally:
+            motor.cerrar()
+    return informe
+
+
+def medir_vivo(duracion=3.0):
+    # Modo en vivo con la fuente simulada a ritmo real: latencia desde la
+    # captura de la última muestra analizada hasta que su columna está lista
+    # (sin contar el dibujado), con y sin el filtro, y muestras perdidas
+    from entrada_vivo import INTERVALO_REFRESCO_MS, AnalizadorVivo, EntradaVivo, senal_prueba
+
+    informe = {}
+    for filtro in (False, True):
+        entrada = EntradaVivo(senal_simulada=senal_prueba())
+        entrada.filtro.activo = filtro
+        analizador = AnalizadorVivo(entrada.buffer, entrada.sr)
+        notas = set()
+        entrada.iniciar()
+        try:
+            inicio = time.perf_counter()
+            while time.perf_counter() - inicio < duracion:
+                time.sleep(INTERVALO_REFRESCO_MS / 1000)
+                if analizador.actualizar():
+                    analizador.registrar_latencia()
+                    notas.add(analizador.nota)
+        finally:
+            entrada.detener()
+        p50, p95 = analizador.latencias()
+        informe["con_filtro" if filtro else "sin_filtro"] = {
+            "p50_ms": p50 * 1000, "p95_ms": p95 * 1000,
+            "perdidas": entrada.buffer.perdidos, "notas": sorted(notas - {"N/A"}),
+        }
+    return informe
+
+
+def medir_reproduccion(duracion=30.0, sr=SR_BENCH, bloques=2000):
+    # Callback del motor de reproducción sin tarjeta de sonido: tiempo por bloque
+    # cambiando de pista y buscando cada 20 bloques, memoria reservada dentro del
+    # callback y el mayor salto entre muestras frente al de la propia señal
+    from filtro_vivo import FiltroEnVivo
+    from motor_reproduccion import MotorReproduccion
+
+    original = generar_senal("tono", duracion, sr)
+    voz = (0.5 * original).astype(np.float32)
+    informe = {}
+    for con_filtro in (False, True):
+        filtro = FiltroEnVivo()
+        filtro.activo = con_filtro
+        motor = MotorReproduccion(filtro.tam_bloque, filtro=filtro)
+        motor.sr = sr
+        motor.cargar("original", original)
+        motor.cargar("voz", voz)
+        salida = np.zeros(motor.tam_bloque, dtype=np.float32)
+        motor.reproducir("original")
+        motor.procesar(salida)
+
+        tiempos = np.zeros(bloques)
+        salto = 0.0
+        anterior = salida[-1]
+        tracemalloc.start()
+        inicial, _ = tracemalloc.get_traced_memory()
+        for i in range(bloques):
+            if i % 20 == 0:
+                motor.reproducir("voz" if i % 40 else "original")
+            if i % 200 == 100:
+                motor.buscar((i / bloques) * duracion * 0.9)
+            inicio = time.perf_counter()
+            motor.procesar(salida)
+            tiempos[i] = time.perf_counter() - inicio
+            if not con_filtro:
+                salto = max(salto, abs(float(salida[0]) - float(anterior)), float(np.abs(np.diff(salida)).max()))
+                anterior = salida[-1]
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        fila = {
+            "bloque_us_p50": float(np.median(tiempos)) * 1e6,
+            "bloque_us_max": float(tiempos.max()) * 1e6,
+            "presupuesto_us": motor.tam_bloque / sr * 1e6,
+            "memoria_kb": (pico - inicial) / 1024,
+        }
+        if not con_filtro:
+            fila["salto_max"] = salto
+            fila["salto_senal"] = float(np.abs(np.diff(original)).max())
+        informe["con_filtro" if con_filtro else "sin_filtro"] = fila
+    return informe
+
+
+def clave_caso(resultado):
+    return f"{resultado['etapa']}/{resultado['senal']}/{resultado['duracion_s']:g}"
+
+
+def ejecutar(etapas, senales, duraciones, repeticiones=3):
+    contexto = multiprocessing.get_context("spawn")
+    casos = [(etapa, senal, duracion) for etapa in etapas for senal in senales for duracion in duraciones]
+    resultados = []
+    with contexto.Pool(1, maxtasksperchild=1) as pool:
+        for indice, (etapa, senal, duracion) in enumerate(casos, start=1):
+            resultado = pool.apply(medir_etapa, (etapa, senal, duracion, repeticiones))
+            resultados.append(resultado)
+            rss = resultado["pico_rss_mb"]
+            print(f"[{indice}/{len(casos)}] {clave_caso(resultado):45s} "
+                  f"{resultado['tiempo_s'] * 1000:10.1f} ms"
+                  + ("" if rss is None else f"  {rss:8.1f} MB pico (+{resultado['incremento_rss_mb']:.1f})"))
+    return resultados
+
+
+def escalado(resultados):
+    # Exponente de crecimiento del tiempo con la duración entre tamaños consecutivos
+    # (1 = lineal). Sirve para ver qué etapas no escalan.
+    grupos = {}
+    for resultado in resultados:
+        grupos.setdefault((resultado["etapa"], resultado["senal"]), []).append(resultado)
+    filas = []
+    for (etapa, senal), grupo in grupos.items():
+        grupo.sort(key=lambda r: r["duracion_s"])
+        for previo, actual in zip(grupo, grupo[1:]):
+            if previo["tiempo_s"] > 0 and actual["duracion_s"] > previo["duracion_s"]:
+                exponente = (np.log(actual["tiempo_s"] / previo["tiempo_s"])
+                             / np.log(actual["duracion_s"] / previo["duracion_s"]))
+                filas.append((etapa, senal, previo["duracion_s"], actual["duracion_s"], float(exponente)))
+    return filas
+
+
+def comparar_con_base(resultados, base, tolerancia=TOLERANCIA):
+    # Devuelve las regresiones: casos más lentos que la base en más de `tolerancia`
+    referencia = {clave_caso(r): r for r in base["resultados"]}
+    regresiones = []
+    for resultado in resultados:
+        previo = referencia.get(clave_caso(resultado))
+        if previo is None:
+            continue
+        cociente = resultado["tiempo_s"] / previo["tiempo_s"] if previo["tiempo_s"] else float("inf")
+        marca = "REGRESIÓN" if cociente > 1 + tolerancia else ("mejora" if cociente < 1 - tolerancia else "")
+        print(f"{clave_caso(resultado):45s} {previo['tiempo_s'] * 1000:10.1f} ms -> "
+              f"{resultado['tiempo_s'] * 1000:10.1f} ms  x{cociente:5.2f}  {marca}")
+        if marca == "REGRESIÓN":
+            regresiones.append((clave_caso(resultado), cociente))
+    return regresiones
+
+
+def entorno():
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "plataforma": platform.platform(),
+        "procesador": platform.processor() or platform.machine(),
+        "cpus": os.cpu_count(),
+        "fecha": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks del procesamiento de audio con señales sintéticas")
+    parser.add_argument("--etapas", nargs="*", default=list(ETAPAS), choices=list(ETAPAS))
+    parser.add_argument("--arranque", action="store_true",
+                        help="Medir también el arranque en frío de la interfaz")
+    parser.add_argument("--precision", action="store_true",
+                        help="Comparar exactitud y memoria de float32 frente a float64")
+    parser.add_argument("--segmentos", action="store_true",
+                        help="Comprobar el cosido y el escalado de la separación por segmentos")
+    parser.add_argument("--reproduccion", action="store_true",
+                        help="Medir el callback del motor de reproducción al cambiar de pista y buscar")
+    parser.add_argument("--vivo", action="store_true",
+                        help="Medir la latencia del modo en vivo con la entrada simulada")
+    parser.add_argument("--senales", nargs="+", default=list(SENALES), choices=list(SENALES))
+    parser.add_argument("--duraciones", nargs="+", type=float, default=list(DURACIONES),
+                        help="Duraciones de las señales en segundos")
+    parser.add_argument("-r", "--repeticiones", type=int, default=3)
+    parser.add_argument("-o", "--salida", default=None, help="Guardar los resultados en este JSON")
+    parser.add_argument("--base", default=ARCHIVO_BASE, help="Archivo de resultados de referencia")
+    parser.add_argument("--guardar-base", action="store_true", help="Guardar estos resultados como referencia")
+    parser.add_argument("--tolerancia", type=float, default=TOLERANCIA,
+                        help="Margen relativo antes de considerar una regresión")
+    args = parser.parse_args(argv)
+
+    resultados = ejecutar(args.etapas, args.senales, sorted(args.duraciones), args.repeticiones)
+    if args.arranque:
+        arranque = medir_arranque(max(args.repeticiones, 5))
+        resultados.append(arranque)
+        ventana = arranque["ventana_s"]
+        print(f"arranque en frío: {arranque['tiempo_s'] * 1000:.0f} ms proceso, "
+              f"{arranque['importacion_s'] * 1000:.0f} ms importando gui"
+              + ("" if ventana is None else f", {ventana * 1000:.0f} ms hasta la ventana"))
+    informe = {"entorno": entorno(), "resultados": resultados}
+
+    if args.precision:
+        duracion = max(args.duraciones)
+        informe["precision"] = comparar_precisiones(args.senales, duracion)
+        print(f"\nfloat32 frente a float64 ({duracion:g} s de audio):")
+        for fila in informe["precision"]:
+            snr = "" if fila["snr_db"] is None else f"  SNR {fila['snr_db']:6.1f} dB"
+            print(f"  {fila['etapa']}/{fila['senal']:6s} error máx {fila['error_max']:.2e}{snr}  "
+                  f"memoria {fila['memoria_float64_mb']:7.1f} -> {fila['memoria_float32_mb']:7.1f} MB")
+
+    if args.segmentos:
+        duracion = max(args.duraciones)
+        informe["segmentos"] = comparar_segmentos(duracion)
+        print(f"\nSeparación por segmentos ({duracion:g} s de audio): "
+              f"error de cosido {informe['segmentos']['error_cosido']:.2e}")
+        for n, tiempo in informe["segmentos"]["tiempos_s"].items():
+            print(f"  {n:3d} procesos: {tiempo:.2f} s")
+
+    if args.vivo:
+        informe["vivo"] = medir_vivo()
+        print("\nModo en vivo (entrada simulada, sin contar el dibujado):")
+        for caso, fila in informe["vivo"].items():
+            print(f"  {caso:10s} latencia p50 {fila['p50_ms']:5.1f} ms  p95 {fila['p95_ms']:5.1f} ms  "
+                  f"perdidas {fila['perdidas']}  notas {' '.join(fila['notas'])}")
+
+    if args.reproduccion:
+        informe["reproduccion"] = medir_reproduccion()
+        print("\nMotor de reproducción (cambio de pista cada 20 bloques, búsqueda cada 200):")
+        for caso, fila in informe["reproduccion"].items():
+            salto = (f"  salto máx {fila['salto_max']:.3f} (señal {fila['salto_senal']:.3f})"
+                     if "salto_max" in fila else "")
+            print(f"  {caso:10s} bloque p50 {fila['bloque_us_p50']:6.1f} us  máx {fila['bloque_us_max']:7.1f} us  "
+                  f"(presupuesto {fila['presupuesto_us']:.0f} us)  memoria {fila['memoria_kb']:.1f} KB{salto}")
+
+    filas = escalado(resultados)
+    if filas:
+        print("\nEscalado (exponente del tiempo respecto a la duración, 1 = lineal):")
+        for etapa, senal, d0, d1, exponente in filas:
+            print(f"  {etapa}/{senal} {d0:g}s -> {d1:g}s: {exponente:.2f}")
+
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as archivo:
+            json.dump(informe, archivo, ensure_ascii=False, indent=2)
+
+    if args.guardar_base:
+        with open(args.base, "w", encoding="utf-8") as archivo:
+            json.dump(informe, archivo, ensure_ascii=False, indent=2)
+        print(f"\nReferencia guardada en {args.base}")
+        return 0
+
+    if os.path.exists(args.base):
+        with open(args.base, encoding="utf-8") as archivo:
+            base = json.load(archivo)
+        print(f"\nComparación con {args.base} ({base['entorno']['fecha']}):")
+        regresiones = comparar_con_base(resultados, base, args.tolerancia)
+        if regresiones:
+            print(f"{len(regresiones)} casos más lentos que la referencia")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
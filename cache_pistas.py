@@ -0,0 +1,89 @@
+import json
+import os
+import shutil
+import threading
+import numpy as np
+
+from audio_utils import huella_audio
+
+ARCHIVOS_PISTAS = ("vocals.npy", "other.npy")
+
+
+class CachePistas:
+    def __init__(self, directorio="cache_separacion", limite_bytes=2 * 1024 ** 3):
+        self.directorio = directorio
+        self.limite_bytes = limite_bytes
+        self.aciertos = 0
+        self.fallos = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.directorio, exist_ok=True)
+
+    def clave(self, audio, sr, parametros):
+        return huella_audio(audio, sr, json.dumps(parametros, sort_keys=True))
+
+    def obtener(self, clave):
+        ruta = os.path.join(self.directorio, clave)
+        with self._lock:
+            try:
+                pistas = tuple(np.load(os.path.join(ruta, nombre), mmap_mode="r")
+                               for nombre in ARCHIVOS_PISTAS)
+            except (FileNotFoundError, ValueError):
+                self.fallos += 1
+                return None
+            # La fecha de modificación del directorio marca el último uso (LRU)
+            os.utime(ruta)
+            self.aciertos += 1
+            return pistas
+
+    def guardar(self, clave, voz, instrumental):
+        ruta = os.path.join(self.directorio, clave)
+        temporal = f"{ruta}.tmp-{os.getpid()}-{threading.get_ident()}"
+        os.makedirs(temporal, exist_ok=True)
+        for nombre, pista in zip(ARCHIVOS_PISTAS, (voz, instrumental)):
+            np.save(os.path.join(temporal, nombre), np.asarray(pista, dtype=np.float32))
+
+        with self._lock:
+            try:
+                os.rename(temporal, ruta)
+            except OSError:
+                # Otro proceso guardó la misma entrada primero
+                shutil.rmtree(temporal, ignore_errors=True)
+            self._recortar()
+
+    def estadisticas(self):
+        with self._lock:
+            entradas = self._entradas()
+            total = self.aciertos + self.fallos
+            return {
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "tasa_aciertos": self.aciertos / total if total else 0.0,
+                "entradas": len(entradas),
+                "bytes": sum(tamano for _, _, tamano in entradas),
+            }
+
+    def limpiar(self):
+        with self._lock:
+            for ruta, _, _ in self._entradas():
+                shutil.rmtree(ruta, ignore_errors=True)
+
+    def _entradas(self):
+        entradas = []
+        for nombre in os.listdir(self.directorio):
+            ruta = os.path.join(self.directorio, nombre)
+            if ".tmp-" in nombre or not os.path.isdir(ruta):
+                continue
+            try:
+                tamano = sum(os.path.getsize(os.path.join(ruta, archivo)) for archivo in os.listdir(ruta))
+                entradas.append((ruta, os.path.getmtime(ruta), tamano))
+            except OSError:
+                continue
+        return entradas
+
+    def _recortar(self):
+        entradas = sorted(self._entradas(), key=lambda entrada: entrada[1])
+        total = sum(tamano for _, _, tamano in entradas)
+        while entradas and total > self.limite_bytes:
+            ruta, _, tamano = entradas.pop(0)
+            shutil.rmtree(ruta, ignore_errors=True)
+            total -= tamano
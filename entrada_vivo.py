@@ -0,0 +1,372 @@
+import threading
+import time
+import tkinter as tk
+from tkinter import ttk
+import numpy as np
+
+from audio_utils import frecuencia_a_nota
+from filtro_vivo import FiltroEnVivo
+from render_raster import LUT_PLASMA
+
+SR_VIVO = 22050
+# 256 muestras = 11.6 ms por bloque a 22050 Hz
+TAM_BLOQUE_ENTRADA = 256
+N_FFT_VIVO = 1024
+HOP_VIVO = 256
+FILAS_VIVO = 128
+COLUMNAS_VIVO = 400
+FMIN_VIVO = 40.0
+CAPACIDAD_VIVO_S = 2.0
+# Bloques de los que se recuerda el instante de captura (para medir la latencia)
+N_MARCAS = 256
+VENTANA_NOTA_S = 0.5
+# Autocorrelación normalizada mínima para dar una trama por sonora
+UMBRAL_SONORIDAD = 0.5
+FMIN_NOTA = 80
+FMAX_NOTA = 1000
+INTERVALO_REFRESCO_MS = 15
+N_LATENCIAS = 256
+
+
+class BufferCircular:
+    # Un solo productor (el callback de audio) y un solo consumidor (la interfaz)
+    # sin cerrojos: cada contador lo escribe un único lado y se publica después
+    # de copiar los datos. Todo se reserva aquí; si el consumidor se atrasa, el
+    # bloque nuevo se descarta en lugar de bloquear el callback.
+    def __init__(self, capacidad):
+        self.capacidad = 1 << max(0, int(capacidad) - 1).bit_length()
+        self._mascara = self.capacidad - 1
+        self._datos = np.zeros(self.capacidad, dtype=np.float32)
+        self._finales = np.zeros(N_MARCAS, dtype=np.int64)
+        self._instantes = np.zeros(N_MARCAS, dtype=np.float64)
+        self._marcas = 0
+        self.escritos = 0
+        self.leidos = 0
+        self.perdidos = 0
+
+    def escribir(self, bloque, instante):
+        n = len(bloque)
+        if n > self.capacidad - (self.escritos - self.leidos):
+            self.perdidos += n
+            return False
+        inicio = self.escritos & self._mascara
+        primera = min(n, self.capacidad - inicio)
+        self._datos[inicio:inicio + primera] = bloque[:primera]
+        self._datos[:n - primera] = bloque[primera:]
+        fin = self.escritos + n
+        marca = self._marcas % N_MARCAS
+        self._finales[marca] = fin
+        self._instantes[marca] = instante
+        self._marcas += 1
+        self.escritos = fin
+        return True
+
+    def disponibles(self):
+        return self.escritos - self.leidos
+
+    def leer(self, destino):
+        # Copia en `destino` hasta len(destino) muestras; devuelve cuántas
+        n = min(len(destino), self.escritos - self.leidos)
+        inicio = self.leidos & self._mascara
+        primera = min(n, self.capacidad - inicio)
+        destino[:primera] = self._datos[inicio:inicio + primera]
+        destino[primera:n] = self._datos[:n - primera]
+        self.leidos += n
+        return n
+
+    def instante(self, posicion):
+        # Captura del bloque más reciente que termina en `posicion` o antes
+        marcas = self._marcas
+        for k in range(marcas - 1, max(marcas - N_MARCAS, 0) - 1, -1):
+            if self._finales[k % N_MARCAS] <= posicion:
+                return float(self._instantes[k % N_MARCAS])
+        return None
+
+
+class FuenteSimulada:
+    # Sustituye al InputStream: entrega `senal` en bucle, en bloques y a ritmo
+    # real, llamando al mismo callback que usaría sounddevice
+    def __init__(self, senal, sr, tam_bloque, callback):
+        self.senal = np.asarray(senal, dtype=np.float32)
+        self.sr = sr
+        self.tam_bloque = tam_bloque
+        self.callback = callback
+        self._bloque = np.zeros((tam_bloque, 1), dtype=np.float32)
+        self._parar = threading.Event()
+        self._hilo = None
+
+    def start(self):
+        self._parar.clear()
+        self._hilo = threading.Thread(target=self._emitir, name="fuente-simulada", daemon=True)
+        self._hilo.start()
+
+    def stop(self):
+        self._parar.set()
+        if self._hilo is not None:
+            self._hilo.join()
+            self._hilo = None
+
+    def close(self):
+        self.stop()
+
+    def _emitir(self):
+        inicio = time.perf_counter()
+        posicion = 0
+        emitidos = 0
+        while not self._parar.is_set():
+            primera = min(self.tam_bloque, len(self.senal) - posicion)
+            self._bloque[:primera, 0] = self.senal[posicion:posicion + primera]
+            self._bloque[primera:, 0] = self.senal[:self.tam_bloque - primera]
+            posicion = (posicion + self.tam_bloque) % len(self.senal)
+            emitidos += 1
+            # Como un micrófono: el bloque está listo cuando termina de "grabarse"
+            espera = inicio + emitidos * self.tam_bloque / self.sr - time.perf_counter()
+            if espera > 0:
+                time.sleep(espera)
+            self.callback(self._bloque, self.tam_bloque, None, None)
+
+
+class EntradaVivo:
+    # Productor: micrófono (o fuente simulada) -> filtro de umbral opcional -> buffer
+    def __init__(self, sr=SR_VIVO, tam_bloque=TAM_BLOQUE_ENTRADA, capacidad_s=CAPACIDAD_VIVO_S,
+                 senal_simulada=None):
+        self.sr = sr
+        self.tam_bloque = tam_bloque
+        self.senal_simulada = senal_simulada
+        self.buffer = BufferCircular(int(capacidad_s * sr))
+        self.filtro = FiltroEnVivo(tam_bloque)
+        self._bloque = np.zeros(tam_bloque, dtype=np.float32)
+        self.stream = None
+
+    def iniciar(self):
+        if self.senal_simulada is not None:
+            self.stream = FuenteSimulada(self.senal_simulada, self.sr, self.tam_bloque, self._callback)
+        else:
+            import sounddevice as sd
+            self.stream = sd.InputStream(samplerate=self.sr, channels=1, dtype="float32",
+                                         blocksize=self.tam_bloque, latency="low", callback=self._callback)
+        self.filtro.reiniciar()
+        self.stream.start()
+
+    def detener(self):
+        if self.stream is not None:
+            self.stream.stop()
+            self.stream.close()
+            self.stream = None
+
+    def _callback(self, indata, frames, time_info, status):
+        # Sin reservas de memoria: solo copias sobre buffers existentes
+        instante = time.perf_counter()
+        if time_info is not None:
+            # Lo que tardó el bloque en llegar desde el conversor
+            instante -= max(0.0, time_info.currentTime - time_info.inputBufferAdcTime)
+        bloque = indata[:, 0]
+        if self.filtro.activo and frames == self.filtro.tam_bloque:
+            self._bloque[:] = bloque
+            bloque = self.filtro.procesar(self._bloque)
+            # La salida del filtro va un bloque por detrás
+            instante -= frames / self.sr
+        self.buffer.escribir(bloque, instante)
+
+
+class AnalizadorVivo:
+    # Consumidor: saca del buffer lo nuevo, añade solo las columnas nuevas al
+    # espectrograma circular (uint8, 0.5 dB por paso como PiramideEspectrograma)
+    # y sigue la nota con la mediana de f0 de la última VENTANA_NOTA_S
+    def __init__(self, buffer, sr, n_fft=N_FFT_VIVO, hop=HOP_VIVO, filas=FILAS_VIVO, columnas=COLUMNAS_VIVO):
+        self.buffer = buffer
+        self.sr = sr
+        self.n_fft = n_fft
+        self.hop = hop
+        self.filas = filas
+        self.columnas = columnas
+        self.imagen = np.zeros((filas, columnas), dtype=np.uint8)
+        self.columna = 0
+        self.nota = "N/A"
+
+        frecuencias = np.geomspace(FMIN_VIVO, sr / 2, filas + 1)
+        self._inicios_filas = np.minimum((frecuencias[:-1] * n_fft / sr).astype(int), n_fft // 2)
+        self._ventana = (0.5 - 0.5 * np.cos(2 * np.pi * np.arange(n_fft) / n_fft)).astype(np.float32)
+        self._referencia = n_fft / 2
+        self._lag_min = int(sr / FMAX_NOTA)
+        self._lag_max = min(int(sr / FMIN_NOTA), n_fft - 1)
+
+        self._cola = np.zeros(n_fft + buffer.capacidad, dtype=np.float32)
+        self._llenado = 0
+        self._ventaneada = np.zeros(n_fft, dtype=np.float32)
+        self._espectro = np.zeros(n_fft // 2 + 1, dtype=np.complex64)
+        self._magnitud = np.zeros(n_fft // 2 + 1, dtype=np.float32)
+        self._centrada = np.zeros(2 * n_fft, dtype=np.float32)
+        self._espectro_auto = np.zeros(n_fft + 1, dtype=np.complex64)
+        self._autocorrelacion = np.zeros(2 * n_fft, dtype=np.float32)
+        self._f0 = np.full(max(1, int(VENTANA_NOTA_S * sr / hop)), np.nan)
+        self._tramas = 0
+        self._latencias = np.full(N_LATENCIAS, np.nan)
+        self._n_latencias = 0
+
+    def actualizar(self):
+        # Devuelve cuántas columnas nuevas hay (las últimas antes de self.columna)
+        n = self.buffer.leer(self._cola[self._llenado:])
+        self._llenado += n
+        nuevas = 0
+        desplazamiento = 0
+        while desplazamiento + self.n_fft <= self._llenado:
+            self._analizar(self._cola[desplazamiento:desplazamiento + self.n_fft])
+            desplazamiento += self.hop
+            nuevas += 1
+        if desplazamiento:
+            resto = self._llenado - desplazamiento
+            self._cola[:resto] = self._cola[desplazamiento:self._llenado]
+            self._llenado = resto
+        if nuevas:
+            validas = self._f0[~np.isnan(self._f0)]
+            self.nota = frecuencia_a_nota(float(np.median(validas))) if len(validas) else "N/A"
+        return min(nuevas, self.columnas)
+
+    def _analizar(self, trama):
+        np.multiply(trama, self._ventana, out=self._ventaneada)
+        np.fft.rfft(self._ventaneada, out=self._espectro)
+        np.abs(self._espectro, out=self._magnitud)
+        bandas = np.maximum.reduceat(self._magnitud, self._inicios_filas)
+        db = 20 * np.log10(np.maximum(bandas, 1e-10) / self._referencia)
+        self.imagen[:, self.columna] = np.clip(255 + 2 * db, 0, 255)[::-1]
+        self.columna = (self.columna + 1) % self.columnas
+
+        # f0 por autocorrelación (con relleno para que no sea circular)
+        self._centrada[:self.n_fft] = trama
+        self._centrada[:self.n_fft] -= trama.mean()
+        np.fft.rfft(self._centrada, out=self._espectro_auto)
+        np.multiply(self._espectro_auto, self._espectro_auto.conj(), out=self._espectro_auto)
+        np.fft.irfft(self._espectro_auto, n=2 * self.n_fft, out=self._autocorrelacion)
+        energia = self._autocorrelacion[0]
+        f0 = np.nan
+        if energia > 1e-8:
+            candidatos = self._autocorrelacion[self._lag_min:self._lag_max + 1]
+            lag = int(np.argmax(candidatos))
+            if candidatos[lag] / energia >= UMBRAL_SONORIDAD:
+                f0 = self.sr / (lag + self._lag_min)
+        self._f0[self._tramas % len(self._f0)] = f0
+        self._tramas += 1
+
+    def registrar_latencia(self, ahora=None):
+        # Desde la captura de la última muestra analizada hasta ahora (tras dibujar).
+        # La cola guarda el solape de la siguiente trama (n_fft - hop muestras ya
+        # analizadas) y lo que aún no ha llegado a ninguna columna
+        sin_analizar = max(self._llenado - (self.n_fft - self.hop), 0)
+        instante = self.buffer.instante(self.buffer.leidos - sin_analizar)
+        if instante is None:
+            return None
+        latencia = (ahora if ahora is not None else time.perf_counter()) - instante
+        self._latencias[self._n_latencias % N_LATENCIAS] = latencia
+        self._n_latencias += 1
+        return latencia
+
+    def latencias(self):
+        # (p50, p95) en segundos de las últimas N_LATENCIAS medidas
+        validas = self._latencias[~np.isnan(self._latencias)]
+        if not len(validas):
+            return None, None
+        return float(np.percentile(validas, 50)), float(np.percentile(validas, 95))
+
+
+def senal_prueba(sr=SR_VIVO, duracion_nota=0.5):
+    # Arpegio La3-Do4-Mi4-La4 con algo de ruido, para el modo simulado
+    frecuencias = (220.0, 261.63, 329.63, 440.0)
+    t = np.arange(int(duracion_nota * sr)) / sr
+    notas = [0.4 * np.sin(2 * np.pi * f * t) + 0.1 * np.sin(4 * np.pi * f * t) for f in frecuencias]
+    senal = np.concatenate(notas)
+    return (senal + 0.01 * np.random.default_rng(0).standard_normal(len(senal))).astype(np.float32)
+
+
+class PanelVivo(ttk.Frame):
+    def __init__(self, master, alto=256, **kwargs):
+        super().__init__(master, **kwargs)
+        botones = ttk.Frame(self)
+        botones.pack(fill=tk.X, pady=5)
+        ttk.Button(botones, text="🎙️ Micrófono", command=lambda: self.iniciar(simulado=False)).pack(
+            side=tk.LEFT, expand=True, fill=tk.X)
+        ttk.Button(botones, text="🧪 Simulación", command=lambda: self.iniciar(simulado=True)).pack(
+            side=tk.LEFT, expand=True, fill=tk.X, padx=5)
+        ttk.Button(botones, text="⏹ Detener", command=self.detener).pack(side=tk.LEFT, expand=True, fill=tk.X)
+
+        self.filtrar = tk.BooleanVar(value=False)
+        ttk.Checkbutton(self, text="🎚️ Aplicar el umbral FFT a la entrada", variable=self.filtrar,
+                        command=self._cambiar_filtro).pack(pady=5)
+
+        self.canvas = tk.Canvas(self, width=COLUMNAS_VIVO, height=alto, background="black", highlightthickness=0)
+        self.canvas.pack(pady=5)
+        self.alto = alto
+        self.etiqueta_nota = ttk.Label(self, text="Nota: -", font=("Arial", 14, "bold"))
+        self.etiqueta_nota.pack()
+        self.etiqueta_latencia = ttk.Label(self, text="Latencia: -")
+        self.etiqueta_latencia.pack()
+
+        self.umbral = 15
+        self.entrada = None
+        self.analizador = None
+        self._imagen = None
+        self._programado = None
+
+    def iniciar(self, simulado=False):
+        self.detener()
+        self.entrada = EntradaVivo(senal_simulada=senal_prueba() if simulado else None)
+        self.analizador = AnalizadorVivo(self.entrada.buffer, self.entrada.sr)
+        self._cambiar_filtro()
+        self._imagen = tk.PhotoImage(width=COLUMNAS_VIVO, height=self.alto)
+        self.canvas.delete("all")
+        self.canvas.create_image(0, 0, image=self._imagen, anchor=tk.NW)
+        self.canvas.create_line(0, 0, 0, self.alto, fill="white", tags="cursor")
+        try:
+            self.entrada.iniciar()
+        except Exception as e:
+            self.entrada = None
+            self.etiqueta_latencia.config(text=f"No se pudo abrir la entrada: {e}")
+            return
+        self._programado = self.after(INTERVALO_REFRESCO_MS, self._refrescar)
+
+    def detener(self):
+        if self._programado is not None:
+            self.after_cancel(self._programado)
+            self._programado = None
+        if self.entrada is not None:
+            self.entrada.detener()
+            self.entrada = None
+
+    def establecer_umbral(self, umbral):
+        self.umbral = umbral
+        if self.entrada is not None:
+            self.entrada.filtro.umbral_porcentaje = umbral
+
+    def _cambiar_filtro(self):
+        if self.entrada is not None:
+            self.entrada.filtro.umbral_porcentaje = self.umbral
+            self.entrada.filtro.activo = self.filtrar.get()
+
+    def _refrescar(self):
+        nuevas = self.analizador.actualizar()
+        if nuevas:
+            # Solo se pintan las columnas nuevas, como una tira que se copia en su sitio
+            fin = self.analizador.columna
+            inicio = fin - nuevas
+            indices = np.arange(inicio, fin) % COLUMNAS_VIVO
+            filas = (np.arange(self.alto) * FILAS_VIVO // self.alto)
+            rgb = LUT_PLASMA[self.analizador.imagen[filas][:, indices]]
+            cabecera = f"P6 {nuevas} {self.alto} 255\n".encode()
+            tira = tk.PhotoImage(width=nuevas, height=self.alto, data=cabecera + rgb.tobytes(), format="PPM")
+            # Una tira puede cruzar el borde derecho: se copia en dos trozos
+            corte = min(nuevas, COLUMNAS_VIVO - indices[0])
+            self._imagen.tk.call(self._imagen, "copy", tira, "-from", 0, 0, corte, self.alto,
+                                 "-to", int(indices[0]), 0)
+            if corte < nuevas:
+                self._imagen.tk.call(self._imagen, "copy", tira, "-from", corte, 0, nuevas, self.alto, "-to", 0, 0)
+            self.canvas.coords("cursor", fin, 0, fin, self.alto)
+            self.etiqueta_nota.config(text=f"Nota: {self.analizador.nota}")
+            self.update_idletasks()
+            latencia = self.analizador.registrar_latencia()
+            p50, p95 = self.analizador.latencias()
+            if latencia is not None:
+                perdidos = self.entrada.buffer.perdidos
+                self.etiqueta_latencia.config(
+                    text=f"Latencia: {latencia * 1000:.0f} ms (p50 {p50 * 1000:.0f} · p95 {p95 * 1000:.0f} ms)"
+                    + (f" · {perdidos} muestras perdidas" if perdidos else ""))
+        self._programado = self.after(INTERVALO_REFRESCO_MS, self._refrescar)
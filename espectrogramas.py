@@ -0,0 +1,206 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+
+from audio_utils import aplicar_fft, huella_memorizada, obtener_precision, tipos_precision
+from barrido_umbral import MAX_MUESTRAS_BARRIDO, BarridoUmbral
+from metricas import tramo
+
+N_FFT = 2048
+HOP_LENGTH = 512
+MAX_COLUMNAS = 20000
+TRAMAS_POR_TROZO = 2048
+AMIN = 1e-5
+TOP_DB = 80.0
+
+
+class AlmacenEspectrogramas:
+    # Caché LRU limitada en bytes de matrices en dB (y de las señales filtradas
+    # de las que salen), compartida por las vistas y los exportadores.
+    def __init__(self, limite_bytes=512 * 1024 ** 2):
+        self.limite_bytes = limite_bytes
+        self.bytes_usados = 0
+        self.aciertos = 0
+        self.fallos = 0
+        self._entradas = OrderedDict()
+        self._en_curso = {}
+        self._lock = threading.RLock()
+        # Si se define, reserva la salida de las señales filtradas (p. ej. en disco);
+        # liberar recibe esas salidas cuando salen de la caché
+        self.reservar = None
+        self.liberar = None
+        self._reservadas = set()
+
+    def barrido(self, audio):
+        return self._obtener(("barrido", huella_memorizada(audio), obtener_precision()),
+                             lambda: BarridoUmbral(audio))
+
+    def filtrada(self, audio, umbral):
+        if not umbral:
+            return audio
+
+        clave = ("senal", huella_memorizada(audio), umbral, obtener_precision())
+
+        def calcular():
+            salida = self._reservar(len(audio))
+            if salida is None:
+                if len(audio) > MAX_MUESTRAS_BARRIDO:
+                    return aplicar_fft(audio, umbral)
+                # Cada umbral nuevo de la misma pista reutiliza su FFT
+                return self.barrido(audio).senal_filtrada(umbral)
+            # Pistas en disco: el barrido guardaría en RAM todos los espectros,
+            # así que se filtra por bloques sin conservarlos
+            try:
+                aplicar_fft(audio, umbral, salida=salida)
+            except BaseException:
+                self._liberar(salida)
+                raise
+            with self._lock:
+                self._reservadas.add(clave)
+            return salida
+
+        return self._obtener(clave, calcular)
+
+    def obtener(self, audio, umbral=None, n_fft=N_FFT, hop_length=HOP_LENGTH):
+        clave = ("db", huella_memorizada(audio), umbral or None, n_fft, hop_length, obtener_precision())
+
+        def calcular():
+            senal = self.filtrada(audio, umbral)
+            return calcular_db(senal, n_fft, hop_length)
+
+        return self._obtener(clave, calcular)
+
+    def entradas_de(self, huellas):
+        # Señales filtradas y espectrogramas ya calculados de estas pistas
+        with self._lock:
+            return [(clave, valor) for clave, valor in self._entradas.items()
+                    if clave[0] in ("senal", "db") and clave[1] in huellas]
+
+    def sembrar(self, clave, valor):
+        # Entrada calculada en otra parte (p. ej. leída de una sesión guardada)
+        with self._lock:
+            if clave not in self._entradas:
+                self._entradas[clave] = valor
+                self.bytes_usados += valor.nbytes
+                self._recortar()
+
+    def _reservar(self, longitud):
+        return self.reservar(longitud) if self.reservar is not None else None
+
+    def _liberar(self, valor):
+        if self.liberar is not None:
+            self.liberar(valor)
+
+    def _expulsar(self, clave, valor):
+        # Lo reservado por esta caché se devuelve al salir; si no, cada umbral
+        # nuevo en modo archivo grande dejaría un archivo de la pista entera
+        self.bytes_usados -= valor.nbytes
+        if clave in self._reservadas:
+            self._reservadas.discard(clave)
+            self._liberar(valor)
+
+    def limpiar(self):
+        with self._lock:
+            while self._entradas:
+                self._expulsar(*self._entradas.popitem(last=False))
+
+    def _obtener(self, clave, calcular):
+        while True:
+            with self._lock:
+                if clave in self._entradas:
+                    self._entradas.move_to_end(clave)
+                    self.aciertos += 1
+                    return self._entradas[clave]
+                # Si otro hilo ya calcula la misma clave se espera a su resultado
+                # en lugar de repetir el cálculo
+                en_curso = self._en_curso.get(clave)
+                if en_curso is None:
+                    self._en_curso[clave] = threading.Event()
+                    self.fallos += 1
+                    break
+            en_curso.wait()
+
+        try:
+            valor = calcular()
+            with self._lock:
+                self._entradas[clave] = valor
+                self.bytes_usados += valor.nbytes
+                self._recortar()
+            return valor
+        finally:
+            with self._lock:
+                self._en_curso.pop(clave).set()
+
+    def _recortar(self):
+        # Siempre se conserva la última entrada aunque supere el límite por sí sola
+        while self.bytes_usados > self.limite_bytes and len(self._entradas) > 1:
+            self._expulsar(*self._entradas.popitem(last=False))
+
+
+def factor_agrupado(longitud, hop_length=HOP_LENGTH, max_columnas=MAX_COLUMNAS):
+    n_tramas = 1 + longitud // hop_length
+    return max(1, -(-n_tramas // max_columnas))
+
+
+def hop_visual(longitud, hop_length=HOP_LENGTH):
+    # Salto efectivo entre columnas tras agrupar tramas en pistas largas
+    return hop_length * factor_agrupado(longitud, hop_length)
+
+
+def calcular_db(audio, n_fft=N_FFT, hop_length=HOP_LENGTH):
+    # Equivale a amplitude_to_db(abs(stft(audio)), ref=np.max), pero lee el audio
+    # por trozos de tramas (sirve para pistas mapeadas en disco) y, en pistas muy
+    # largas, se queda con el máximo de cada grupo de tramas consecutivas.
+    import librosa
+
+    with tramo("stft", muestras=len(audio), n_fft=n_fft, hop_length=hop_length):
+        longitud = len(audio)
+        n_tramas = 1 + longitud // hop_length
+        factor = factor_agrupado(longitud, hop_length)
+        n_bins = 1 + n_fft // 2
+        real, _ = tipos_precision()
+        S = np.empty((n_bins, -(-n_tramas // factor)), dtype=real)
+
+        tramas_por_trozo = factor * max(1, TRAMAS_POR_TROZO // factor)
+        segmento = np.zeros((tramas_por_trozo - 1) * hop_length + n_fft, dtype=real)
+        magnitudes = np.empty((n_bins, tramas_por_trozo), dtype=real)
+        for t0 in range(0, n_tramas, tramas_por_trozo):
+            t1 = min(t0 + tramas_por_trozo, n_tramas)
+            # Con center=True la trama t cubre [t*hop - n_fft/2, t*hop + n_fft/2)
+            a = t0 * hop_length - n_fft // 2
+            b = (t1 - 1) * hop_length - n_fft // 2 + n_fft
+            trozo = segmento[:b - a]
+            trozo[:] = 0
+            trozo[max(a, 0) - a:min(b, longitud) - a] = audio[max(a, 0):min(b, longitud)]
+            espectro = librosa.stft(trozo, n_fft=n_fft, hop_length=hop_length, center=False)
+            magnitud = np.abs(espectro, out=magnitudes[:, :espectro.shape[1]])
+
+            c0 = t0 // factor
+            completas = (t1 - t0) // factor
+            S[:, c0:c0 + completas] = magnitud[:, :completas * factor].reshape(n_bins, completas, factor).max(axis=2)
+            if (t1 - t0) % factor:
+                S[:, c0 + completas] = magnitud[:, completas * factor:].max(axis=1)
+
+        # amplitude_to_db en el mismo buffer
+        referencia = max(float(S.max()), AMIN)
+        np.maximum(S, AMIN, out=S)
+        np.log10(S, out=S)
+        S *= 20.0
+        S -= 20.0 * np.log10(referencia)
+        np.maximum(S, S.max() - TOP_DB, out=S)
+        return S
+
+
+almacen_espectrogramas = AlmacenEspectrogramas()
+
+
+def obtener_espectrograma(audio, umbral=None, n_fft=N_FFT, hop_length=HOP_LENGTH):
+    return almacen_espectrogramas.obtener(audio, umbral, n_fft, hop_length)
+
+
+def obtener_senal_filtrada(audio, umbral):
+    return almacen_espectrogramas.filtrada(audio, umbral)
+
+
+def obtener_barrido(audio):
+    return almacen_espectrogramas.barrido(audio)
@@ -0,0 +1,78 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from audio_utils import guardar_audio
+from espectrogramas import obtener_espectrograma, obtener_senal_filtrada
+from metricas import tramo
+from visuals import guardar_figura
+
+MAX_HILOS_EXPORTACION = 4
+
+
+def plan_exportacion(sr, umbral, audio=None, vocal=None, instrumental=None, formato_audio="wav"):
+    # Devuelve los intermedios que comparten las salidas, como (audio, umbral), y
+    # las salidas como (nombre de archivo, función que lo escribe en una ruta)
+    intermedios = []
+    salidas = []
+
+    if audio is not None:
+        intermedios.append((audio, None))
+        salidas.append(("espectrograma_original.png", lambda ruta: guardar_figura(
+            [(audio, None, "Espectrograma Original")], sr, ruta)))
+
+    if vocal is not None and instrumental is not None:
+        intermedios += [(vocal, None), (instrumental, None), (vocal, umbral), (instrumental, umbral)]
+        salidas += [
+            (f"voz.{formato_audio}", lambda ruta: guardar_audio(vocal, sr, ruta)),
+            (f"instrumental.{formato_audio}", lambda ruta: guardar_audio(instrumental, sr, ruta)),
+            (f"voz_fft.{formato_audio}", lambda ruta: guardar_audio(obtener_senal_filtrada(vocal, umbral), sr, ruta)),
+            (f"instrumental_fft.{formato_audio}", lambda ruta: guardar_audio(
+                obtener_senal_filtrada(instrumental, umbral), sr, ruta)),
+            ("separacion.png", lambda ruta: guardar_figura(
+                [(vocal, None, "Espectrograma Voz Separada"),
+                 (instrumental, None, "Espectrograma Instrumental Separado")], sr, ruta, figsize=(12, 8))),
+            ("fft_voz.png", lambda ruta: guardar_figura(
+                [(vocal, umbral, "FFT Aplicada a Voz")], sr, ruta)),
+            ("fft_instrumental.png", lambda ruta: guardar_figura(
+                [(instrumental, umbral, "FFT Aplicada a Instrumental")], sr, ruta)),
+            ("comparativas_fft.png", lambda ruta: guardar_figura(
+                [(vocal, umbral, "Voz - FFT Aplicada"),
+                 (instrumental, umbral, "Instrumental - FFT Aplicada")], sr, ruta, figsize=(14, 8))),
+        ]
+    return intermedios, salidas
+
+
+def exportar_todo(directorio, sr, umbral, audio=None, vocal=None, instrumental=None,
+                  formato_audio="wav", max_hilos=MAX_HILOS_EXPORTACION, progreso=None):
+    # Escribe en `directorio` todas las pistas (WAV, FLAC u OGG) y figuras disponibles. Los
+    # intermedios (señales filtradas y espectrogramas) se encolan antes que las
+    # escrituras y viven en el almacén compartido, que no repite un cálculo en
+    # curso: cada uno se calcula una sola vez aunque varias salidas lo pidan a la
+    # vez. progreso(hechos, total, nombre) puede lanzar una excepción para
+    # cancelar; lo que no haya empezado se descarta.
+    with tramo("exportacion_todo", directorio=directorio, umbral=umbral):
+        intermedios, salidas = plan_exportacion(sr, umbral, audio, vocal, instrumental, formato_audio)
+        if not salidas:
+            raise ValueError("No hay nada que exportar")
+        os.makedirs(directorio, exist_ok=True)
+
+        total = len(intermedios) + len(salidas)
+        rutas = []
+        with ThreadPoolExecutor(max_workers=max_hilos) as pool:
+            futuros = {pool.submit(obtener_espectrograma, pista, umbral_pista): None
+                       for pista, umbral_pista in intermedios}
+            futuros.update({pool.submit(escribir, os.path.join(directorio, nombre)): nombre
+                            for nombre, escribir in salidas})
+            try:
+                for hechos, futuro in enumerate(as_completed(futuros), start=1):
+                    futuro.result()
+                    nombre = futuros[futuro]
+                    if nombre is not None:
+                        rutas.append(os.path.join(directorio, nombre))
+                    if progreso is not None:
+                        progreso(hechos, total, nombre or "espectrogramas")
+            except BaseException:
+                for futuro in futuros:
+                    futuro.cancel()
+                raise
+        return sorted(rutas)
@@ -0,0 +1,49 @@
+import numpy as np
+
+from audio_utils import ventana_raiz_hann
+
+TAM_BLOQUE_VIVO = 1024
+
+
+class FiltroEnVivo:
+    # Umbral espectral por bloques para el callback de audio: tramas de 2 bloques
+    # con salto de 1 bloque (raíz de Hann, solape-suma). Todos los buffers se
+    # reservan aquí; procesar() no crea arrays nuevos. La salida va retrasada un
+    # bloque respecto a la entrada.
+    def __init__(self, tam_bloque=TAM_BLOQUE_VIVO, umbral_porcentaje=15):
+        self.tam_bloque = tam_bloque
+        self.umbral_porcentaje = umbral_porcentaje
+        self.activo = False
+        n = 2 * tam_bloque
+        self._ventana = ventana_raiz_hann(n).astype(np.float32)
+        self._trama = np.zeros(n, dtype=np.float32)
+        self._ventaneada = np.zeros(n, dtype=np.float32)
+        self._sintesis = np.zeros(n, dtype=np.float32)
+        self._cola = np.zeros(tam_bloque, dtype=np.float32)
+        self._espectro = np.zeros(tam_bloque + 1, dtype=np.complex64)
+        self._magnitud = np.zeros(tam_bloque + 1, dtype=np.float32)
+        self._mascara = np.zeros(tam_bloque + 1, dtype=bool)
+
+    def reiniciar(self):
+        self._trama[:] = 0
+        self._cola[:] = 0
+
+    def procesar(self, bloque):
+        # Filtra en el sitio un bloque float32 de exactamente tam_bloque muestras
+        b = self.tam_bloque
+        self._trama[:b] = self._trama[b:]
+        self._trama[b:] = bloque
+
+        np.multiply(self._trama, self._ventana, out=self._ventaneada)
+        np.fft.rfft(self._ventaneada, out=self._espectro)
+        np.abs(self._espectro, out=self._magnitud)
+        # El umbral se lee una vez por bloque: un cambio del deslizador se oye en el siguiente
+        umbral = self.umbral_porcentaje / 100 * self._magnitud.max()
+        np.less(self._magnitud, umbral, out=self._mascara)
+        np.copyto(self._espectro, 0, where=self._mascara)
+        np.fft.irfft(self._espectro, n=2 * b, out=self._sintesis)
+        self._sintesis *= self._ventana
+
+        np.add(self._cola, self._sintesis[:b], out=bloque)
+        self._cola[:] = self._sintesis[b:]
+        return bloque
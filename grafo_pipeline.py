@@ -0,0 +1,221 @@
+import itertools
+import threading
+from collections import OrderedDict
+
+from metricas import tramo
+
+LIMITE_BYTES_GRAFO = 512 * 1024 ** 2
+
+
+def tamano_bytes(valor):
+    # Aproximado: arrays (y objetos con nbytes), tuplas de ellos y el resto casi nada
+    if hasattr(valor, "nbytes"):
+        return int(valor.nbytes)
+    if isinstance(valor, (tuple, list)):
+        return sum(tamano_bytes(elemento) for elemento in valor)
+    if isinstance(valor, str):
+        return len(valor)
+    return 64
+
+
+class Nodo:
+    def __init__(self, nombre, funcion, dependencias=(), parametros=(), memorizar=True):
+        self.nombre = nombre
+        self.funcion = funcion
+        self.dependencias = tuple(dependencias)
+        self.parametros = tuple(parametros)
+        self.memorizar = memorizar
+
+
+class GrafoPipeline:
+    # Grafo de nodos memorizados. La clave de un nodo sale de sus parámetros y de
+    # las claves de sus dependencias (no del contenido de los arrays), así que
+    # cambiar un parámetro solo cambia la clave de lo que depende de él: el resto
+    # se sigue sirviendo de la caché. Los resultados viven en una LRU limitada en
+    # bytes; volver a un valor anterior del parámetro es un acierto mientras no
+    # se haya expulsado. fijar() sustituye el resultado de un nodo por un valor
+    # calculado fuera (p. ej. una separación con progreso en la interfaz). Los
+    # nodos con memorizar=False no se guardan aquí: su función ya consulta otra
+    # caché (p. ej. el almacén de espectrogramas) y el grafo solo los encadena.
+    def __init__(self, limite_bytes=LIMITE_BYTES_GRAFO):
+        self.limite_bytes = limite_bytes
+        self.bytes_usados = 0
+        self.aciertos = 0
+        self.fallos = 0
+        self.calculos = {}
+        self._nodos = {}
+        self._parametros = {}
+        self._fijados = {}
+        self._vigentes = {}
+        self._entradas = OrderedDict()
+        self._en_curso = {}
+        self._versiones = itertools.count(1)
+        self._lock = threading.RLock()
+
+    def agregar(self, nombre, funcion, dependencias=(), parametros=(), memorizar=True):
+        faltan = [dependencia for dependencia in dependencias if dependencia not in self._nodos]
+        if faltan:
+            raise ValueError(f"'{nombre}' depende de nodos que no existen: {', '.join(faltan)}")
+        self._nodos[nombre] = Nodo(nombre, funcion, dependencias, parametros, memorizar)
+
+    def fuente(self, nombre):
+        # Nodo sin cálculo propio: su valor siempre llega con fijar()
+        def sin_valor():
+            raise ValueError(f"'{nombre}' no tiene valor")
+        self.agregar(nombre, sin_valor)
+
+    def dependientes(self, nombre):
+        # Todos los nodos aguas abajo de `nombre` (de un nodo o de un parámetro)
+        resultado = set()
+        pendientes = [nombre]
+        while pendientes:
+            actual = pendientes.pop()
+            for nodo in self._nodos.values():
+                if nodo.nombre not in resultado and (actual in nodo.dependencias or actual in nodo.parametros):
+                    resultado.add(nodo.nombre)
+                    pendientes.append(nodo.nombre)
+        return resultado
+
+    def establecer(self, **parametros):
+        # Devuelve los nodos invalidados
+        invalidados = set()
+        with self._lock:
+            for nombre, valor in parametros.items():
+                if nombre in self._parametros and self._parametros[nombre] == valor:
+                    continue
+                self._parametros[nombre] = valor
+                invalidados |= self.dependientes(nombre)
+            self._invalidar(invalidados)
+        return invalidados
+
+    def fijar(self, nombre, valor):
+        with self._lock:
+            self._fijados[nombre] = (next(self._versiones), valor)
+            invalidados = self.dependientes(nombre) | {nombre}
+            self._invalidar(invalidados)
+        return invalidados
+
+    def soltar(self, nombre):
+        # Vuelve a calcular el nodo con su función
+        with self._lock:
+            if self._fijados.pop(nombre, None) is not None:
+                self._invalidar(self.dependientes(nombre) | {nombre})
+
+    def vigente(self, nombre):
+        # True si el nodo está calculado para los parámetros actuales
+        with self._lock:
+            if nombre in self._fijados:
+                return True
+            clave = self._vigentes.get(nombre)
+            return clave is not None and clave in self._entradas
+
+    def obtener(self, nombre, **parametros):
+        # Los parámetros dados sustituyen a los actuales solo en esta llamada: una
+        # tarea en segundo plano usa los valores con que se lanzó aunque entretanto
+        # se mueva el deslizador
+        with self._lock:
+            parametros = {**self._parametros, **parametros}
+        clave, valor = self._resolver(nombre, parametros)
+        return valor
+
+    def _resolver(self, nombre, parametros_llamada):
+        nodo = self._nodos[nombre]
+        with self._lock:
+            if nombre in self._fijados:
+                version, valor = self._fijados[nombre]
+                return (nombre, "fijado", version), valor
+            faltan = [parametro for parametro in nodo.parametros if parametro not in parametros_llamada]
+            if faltan:
+                raise ValueError(f"Faltan parámetros para '{nombre}': {', '.join(faltan)}")
+            parametros = {parametro: parametros_llamada[parametro] for parametro in nodo.parametros}
+
+        dependencias = [self._resolver(dependencia, parametros_llamada) for dependencia in nodo.dependencias]
+        clave = (nombre, tuple(sorted(parametros.items())), tuple(c for c, _ in dependencias))
+        if not nodo.memorizar:
+            with tramo("grafo", nodo=nombre):
+                return clave, nodo.funcion(*(valor for _, valor in dependencias), **parametros)
+
+        while True:
+            with self._lock:
+                if clave in self._entradas:
+                    self._entradas.move_to_end(clave)
+                    self.aciertos += 1
+                    self._marcar_vigente(nombre, clave, parametros_llamada)
+                    return clave, self._entradas[clave][0]
+                en_curso = self._en_curso.get(clave)
+                if en_curso is None:
+                    self._en_curso[clave] = threading.Event()
+                    self.fallos += 1
+                    break
+            en_curso.wait()
+
+        try:
+            with tramo("grafo", nodo=nombre):
+                valor = nodo.funcion(*(valor for _, valor in dependencias), **parametros)
+            with self._lock:
+                tamano = tamano_bytes(valor)
+                self._entradas[clave] = (valor, tamano)
+                self.bytes_usados += tamano
+                self.calculos[nombre] = self.calculos.get(nombre, 0) + 1
+                self._marcar_vigente(nombre, clave, parametros_llamada)
+                self._recortar()
+            return clave, valor
+        finally:
+            with self._lock:
+                self._en_curso.pop(clave).set()
+
+    def limpiar(self):
+        with self._lock:
+            while self._entradas:
+                self._expulsar()
+            self._vigentes.clear()
+
+    def _marcar_vigente(self, nombre, clave, parametros_llamada):
+        # Solo si se calculó con los parámetros actuales (no con los de una llamada)
+        if all(self._parametros.get(parametro) == valor for parametro, valor in parametros_llamada.items()):
+            self._vigentes[nombre] = clave
+
+    def _invalidar(self, nombres):
+        for nombre in nombres:
+            self._vigentes.pop(nombre, None)
+
+    def _recortar(self):
+        # Siempre se conserva la última entrada aunque supere el límite por sí sola
+        while self.bytes_usados > self.limite_bytes and len(self._entradas) > 1:
+            self._expulsar()
+
+    def _expulsar(self):
+        _, (_, tamano) = self._entradas.popitem(last=False)
+        self.bytes_usados -= tamano
+
+
+def crear_grafo_analisis(limite_bytes=LIMITE_BYTES_GRAFO, motor=None, cache=None, almacen=None):
+    # carga -> separación -> filtrado(umbral) -> STFT / nota, y el barrido de
+    # umbrales, para la pista original, la voz y el instrumental. "audio" se fija al cargar; sr y
+    # umbral son parámetros. El grafo solo memoriza la separación: barrido,
+    # señales filtradas y espectrogramas salen del almacén de espectrogramas (el
+    # mismo que usan las demás vistas y la exportación, con un único límite de
+    # bytes y las salidas en disco del modo archivo grande) y la nota, de
+    # analizar_tono, así que nada se calcula ni se guarda dos veces.
+    from analisis_tono import analizar_tono
+    from audio_utils import separar_pistas
+    from espectrogramas import almacen_espectrogramas
+
+    almacen = almacen or almacen_espectrogramas
+
+    def nota(senal, sr):
+        return analizar_tono(senal, sr).nota_predominante()
+
+    grafo = GrafoPipeline(limite_bytes)
+    grafo.fuente("audio")
+    grafo.agregar("pistas", lambda audio, sr: separar_pistas(audio, sr, motor=motor, cache=cache),
+                  ["audio"], ["sr"])
+    grafo.agregar("voz", lambda pistas: pistas[0], ["pistas"], memorizar=False)
+    grafo.agregar("instrumental", lambda pistas: pistas[1], ["pistas"], memorizar=False)
+    for pista in ("audio", "voz", "instrumental"):
+        grafo.agregar(f"{pista}_espectrograma", almacen.obtener, [pista], memorizar=False)
+        grafo.agregar(f"{pista}_barrido", almacen.barrido, [pista], memorizar=False)
+        grafo.agregar(f"{pista}_filtrada", almacen.filtrada, [pista], ["umbral"], memorizar=False)
+        grafo.agregar(f"{pista}_espectrograma_filtrado", almacen.obtener, [pista], ["umbral"], memorizar=False)
+        grafo.agregar(f"{pista}_nota", nota, [f"{pista}_filtrada"], ["sr"], memorizar=False)
+    return grafo
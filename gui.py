@@ -1,37 +1,89 @@
+import importlib
 import os
 import subprocess
 import threading
 import time
 import warnings
+from collections import OrderedDict
 import tkinter as tk
 from tkinter import filedialog, messagebox, Scale, ttk
 import numpy as np
-import matplotlib.pyplot as plt
-import librosa
-import librosa.display
-import sounddevice as sd
-import soundfile as sf
-from pydub import AudioSegment
 
 from audio_utils import (
     verificar_ffmpeg,
-    aplicar_fft,
+    cargar_audio,
+    cargar_audio_en_disco,
     guardar_audio,
+    guardar_pistas,
+    huella_memorizada,
     obtener_nota_predominante,
     frecuencia_a_nota,
     separar_pistas
 )
 
+from barrido_umbral import MAX_MUESTRAS_BARRIDO
+
+from cache_pistas import CachePistas
+
+from filtro_vivo import FiltroEnVivo
+
+from entrada_vivo import PanelVivo
+
+from motor_reproduccion import MotorReproduccion
+
+from separacion import MotorSegmentado
+
+from visor_espectrograma import PiramideEspectrograma, VisorEspectrograma
+
+from tareas import PlanificadorTareas, TareaEnConflicto
+
+from espectrogramas import (
+    almacen_espectrogramas,
+    hop_visual,
+    obtener_barrido,
+    obtener_espectrograma,
+    obtener_senal_filtrada,
+)
+
+from pistas_disco import AlmacenDisco
+
+from exportacion import exportar_todo
+
+from grafo_pipeline import crear_grafo_analisis
+
+from sesion import EXTENSION_SESION, cargar_sesion, guardar_sesion
+
+from metricas import DIRECTORIO_METRICAS, metricas, tramo
+
 from visuals import (
+    dibujar_espectrograma,
     graficar_espectrograma,
+    guardar_figura,
     mostrar_espectrograma,
     mostrar_espectrogramas_separados,
     mostrar_comparacion_fft,
 )
 
+MAX_PIRAMIDES = 4
+TIPOS_AUDIO = [("Archivo WAV", "*.wav"), ("Archivo FLAC", "*.flac"), ("Archivo OGG Vorbis", "*.ogg"),
+               ("Todos los archivos", "*.*")]
+ANCHO_CURVA, ALTO_CURVA = 250, 60
+# Módulos pesados que se importan en segundo plano al abrir la ventana (ver precalentar)
+MODULOS_PRECALENTAR = (
+    "scipy.fft",
+    "soundfile",
+    "sounddevice",
+    "librosa.core.audio",
+    "librosa.core.spectrum",
+    "librosa.core.pitch",
+    "matplotlib.pyplot",
+    "librosa.display",
+)
+RETARDO_PRECALENTAR_MS = 200
+
 
 class AudioPlayerApp:
-    def __init__(self, root):
+    def __init__(self, root, precalentar=True):
         self.root = root
         self.root.title("Reproductor y Análisis de Audio Avanzado")
         self.audio_file = None
@@ -39,17 +91,30 @@ class AudioPlayerApp:
         self.vocal_track = None
         self.instrumental_track = None
         self.sr = 22050
-        self.is_processing = False
-
-        self.is_playing = False
-        self.playback_position = 0.0
-        self.current_audio = None
-        self.stream = None
-        self.audio_buffer = None
-        self.buffer_position = 0
+        self.cache_pistas = CachePistas()
+        self.disco = None
+        self.grafo = None
+        self.piramides = OrderedDict()
+
+        self.filtro_vivo = FiltroEnVivo()
+        self.reproductor = MotorReproduccion(self.filtro_vivo.tam_bloque, filtro=self.filtro_vivo)
+        self.fuente_filtrada = None
+        self.arrastrando_posicion = False
+        self.sonando = False
+        self.barrido = None
+        self.pista_barrido = None
+        self.analizando_umbrales = None
+        self.motor_segmentado = None
+        self.nombre_audio = None
 
         self.setup_ui()
         self.setup_estilos()
+        self.crear_grafo()
+        self.planificador = PlanificadorTareas(self.root, al_cambiar=self.mostrar_tareas)
+        self.root.protocol("WM_DELETE_WINDOW", self.cerrar)
+        metricas.configurar(DIRECTORIO_METRICAS)
+        if precalentar:
+            self.root.after(RETARDO_PRECALENTAR_MS, self.precalentar)
 
     def setup_ui(self):
         self.panel_tabs = ttk.Notebook(self.root)
@@ -59,34 +124,93 @@ class AudioPlayerApp:
         self.tab_procesamiento = ttk.Frame(self.panel_tabs)
         self.tab_visualizacion = ttk.Frame(self.panel_tabs)
         self.tab_exportar = ttk.Frame(self.panel_tabs)
+        self.tab_vivo = ttk.Frame(self.panel_tabs)
 
         self.panel_tabs.add(self.tab_audio, text="🎧 Audio")
         self.panel_tabs.add(self.tab_procesamiento, text="⚙️ Procesamiento")
         self.panel_tabs.add(self.tab_visualizacion, text="📊 Visualización")
         self.panel_tabs.add(self.tab_exportar, text="💾 Exportar")
+        self.panel_tabs.add(self.tab_vivo, text="🎙️ En Vivo")
 
         # AUDIO TAB
         grupo_audio = ttk.LabelFrame(self.tab_audio, text="🎧 Gestión de Audio")
         grupo_audio.pack(pady=10, padx=10, fill=tk.X)
 
         ttk.Button(grupo_audio, text="📂 Cargar Audio", command=self.cargar_audio).pack(pady=5, fill=tk.X)
-        ttk.Button(grupo_audio, text="▶️ Reproducir Original", command=lambda: self.iniciar_reproduccion(self.audio_file)).pack(pady=5, fill=tk.X)
+        panel_sesion = ttk.Frame(grupo_audio)
+        panel_sesion.pack(pady=5, fill=tk.X)
+        ttk.Button(panel_sesion, text="🗂️ Abrir Sesión", command=self.abrir_sesion).pack(side=tk.LEFT, expand=True, fill=tk.X)
+        ttk.Button(panel_sesion, text="💾 Guardar Sesión", command=self.guardar_sesion).pack(side=tk.LEFT, expand=True, fill=tk.X, padx=(5, 0))
+
+        panel_ventana = ttk.Frame(grupo_audio)
+        panel_ventana.pack(pady=5, fill=tk.X)
+        ttk.Label(panel_ventana, text="Inicio (s):").pack(side=tk.LEFT)
+        self.entrada_inicio = ttk.Entry(panel_ventana, width=8)
+        self.entrada_inicio.pack(side=tk.LEFT, padx=5)
+        ttk.Label(panel_ventana, text="Duración (s, vacío = todo):").pack(side=tk.LEFT)
+        self.entrada_duracion = ttk.Entry(panel_ventana, width=8)
+        self.entrada_duracion.pack(side=tk.LEFT, padx=5)
+
+        self.modo_grande = tk.BooleanVar(value=False)
+        ttk.Checkbutton(grupo_audio, text="💽 Modo archivo grande (pistas mapeadas en disco)",
+                        variable=self.modo_grande, command=self.cambiar_modo_grande).pack(pady=5, fill=tk.X)
+        ttk.Button(grupo_audio, text="▶️ Reproducir Original", command=lambda: self.iniciar_reproduccion("original")).pack(pady=5, fill=tk.X)
+        ttk.Button(grupo_audio, text="🎤 Reproducir Voz", command=lambda: self.iniciar_reproduccion("voz")).pack(pady=5, fill=tk.X)
+        ttk.Button(grupo_audio, text="🎸 Reproducir Instrumental", command=lambda: self.iniciar_reproduccion("instrumental")).pack(pady=5, fill=tk.X)
+        ttk.Button(grupo_audio, text="🎚️ Reproducir Filtrada (umbral actual)", command=self.reproducir_filtrada).pack(pady=5, fill=tk.X)
+        ttk.Button(grupo_audio, text="🔀 A/B (pista anterior)", command=self.alternar_ab).pack(pady=5, fill=tk.X)
         ttk.Button(grupo_audio, text="⏯ Pausar / Reanudar", command=self.pausar_reanudar).pack(pady=5, fill=tk.X)
         ttk.Button(grupo_audio, text="⏹ Detener", command=self.detener_audio).pack(pady=5, fill=tk.X)
 
+        # Posición de reproducción: arrastrar busca al instante en la pista que suena
+        panel_posicion = ttk.Frame(grupo_audio)
+        panel_posicion.pack(pady=5, fill=tk.X)
+        self.posicion_reproduccion = tk.DoubleVar(value=0.0)
+        self.barra_posicion = ttk.Scale(panel_posicion, from_=0.0, to=1.0, orient=tk.HORIZONTAL,
+                                        variable=self.posicion_reproduccion, command=self.buscar_posicion)
+        self.barra_posicion.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        self.barra_posicion.bind("<ButtonPress-1>", lambda _: setattr(self, "arrastrando_posicion", True))
+        self.barra_posicion.bind("<ButtonRelease-1>", lambda _: setattr(self, "arrastrando_posicion", False))
+        self.etiqueta_posicion = ttk.Label(panel_posicion, text="0:00 / 0:00", width=14)
+        self.etiqueta_posicion.pack(side=tk.LEFT, padx=5)
+
         # PROCESAMIENTO TAB
         grupo_procesamiento = ttk.LabelFrame(self.tab_procesamiento, text="⚙️ Operaciones de Procesamiento")
         grupo_procesamiento.pack(pady=10, padx=10, fill=tk.X)
 
         ttk.Button(grupo_procesamiento, text="🛠️ Separar Pistas", command=self.separar_pistas).pack(pady=5, fill=tk.X)
 
+        panel_segmentos = ttk.Frame(grupo_procesamiento)
+        panel_segmentos.pack(pady=5, fill=tk.X)
+        self.separar_por_segmentos = tk.BooleanVar(value=False)
+        ttk.Checkbutton(panel_segmentos, text="⚡ Separar por segmentos en paralelo (pistas largas)",
+                        variable=self.separar_por_segmentos).pack(side=tk.LEFT)
+        ttk.Label(panel_segmentos, text="Procesos:").pack(side=tk.LEFT, padx=(10, 0))
+        self.procesos_separacion = tk.IntVar(value=os.cpu_count() or 1)
+        ttk.Spinbox(panel_segmentos, from_=1, to=os.cpu_count() or 1, width=4,
+                    textvariable=self.procesos_separacion).pack(side=tk.LEFT, padx=5)
+
         self.panel_config = ttk.LabelFrame(self.tab_procesamiento, text="⚡ Configuración FFT")
         self.panel_config.pack(pady=10, padx=10, fill=tk.X)
 
         self.slider_umbral = Scale(self.panel_config, from_=1, to=100, orient=tk.HORIZONTAL,
-                                label="Umbral FFT (%)", length=250)
+                                label="Umbral FFT (%)", length=250, command=self.cambiar_umbral)
         self.slider_umbral.set(15)
         self.slider_umbral.pack(pady=10)
+        self.slider_umbral.bind("<ButtonPress-1>", self.mostrar_curva_umbral)
+        self.slider_umbral.bind("<KeyPress>", self.mostrar_curva_umbral)
+
+        # Energía retenida según el umbral (se calcula una sola FFT por pista)
+        self.curva_umbral = tk.Canvas(self.panel_config, width=ANCHO_CURVA, height=ALTO_CURVA,
+                                      bg="white", highlightthickness=1, highlightbackground="#cccccc")
+        self.curva_umbral.pack()
+        self.curva_umbral.bind("<ButtonPress-1>", self.mostrar_curva_umbral)
+        self.etiqueta_energia = ttk.Label(self.panel_config, text="Energía retenida: -")
+        self.etiqueta_energia.pack(pady=(2, 5))
+
+        self.filtro_en_vivo = tk.BooleanVar(value=False)
+        ttk.Checkbutton(self.panel_config, text="🎚️ Aplicar el umbral en vivo durante la reproducción",
+                        variable=self.filtro_en_vivo, command=self.cambiar_filtro_vivo).pack(pady=5)
 
         # VISUALIZACIÓN TAB
         grupo_visualizacion = ttk.LabelFrame(self.tab_visualizacion, text="📊 Visualización de Resultados")
@@ -98,6 +222,20 @@ class AudioPlayerApp:
         ttk.Button(grupo_visualizacion, text="🎸 FFT Instrumental", command=self.ver_fft_instrumental).pack(pady=5, fill=tk.X)
         ttk.Button(grupo_visualizacion, text="📈 Comparativas FFT", command=self.graficar_comparativas).pack(pady=5, fill=tk.X)
 
+        grupo_visor = ttk.LabelFrame(self.tab_visualizacion, text="🔍 Visor Interactivo")
+        grupo_visor.pack(pady=10, padx=10, fill=tk.BOTH, expand=True)
+
+        panel_visor = ttk.Frame(grupo_visor)
+        panel_visor.pack(fill=tk.X, pady=5)
+        self.pista_visor = ttk.Combobox(panel_visor, state="readonly",
+                                        values=["Original", "Voz", "Instrumental", "Voz FFT", "Instrumental FFT"])
+        self.pista_visor.current(0)
+        self.pista_visor.pack(side=tk.LEFT, padx=5)
+        ttk.Button(panel_visor, text="🔍 Abrir en visor", command=self.abrir_en_visor).pack(side=tk.LEFT, padx=5)
+
+        self.visor = VisorEspectrograma(grupo_visor)
+        self.visor.pack(fill=tk.BOTH, expand=True)
+
 
         # EXPORTAR TAB
         grupo_exportar = ttk.LabelFrame(self.tab_exportar, text="💾 Exportar Audios")
@@ -105,17 +243,42 @@ class AudioPlayerApp:
 
         ttk.Button(grupo_exportar, text="💾 Guardar Voz", command=lambda: self.guardar_audio(self.vocal_track)).pack(pady=5, fill=tk.X)
         ttk.Button(grupo_exportar, text="💾 Guardar Instrumental", command=lambda: self.guardar_audio(self.instrumental_track)).pack(pady=5, fill=tk.X)
+        ttk.Button(grupo_exportar, text="💾 Guardar Voz e Instrumental", command=self.guardar_pistas).pack(pady=5, fill=tk.X)
         ttk.Button(grupo_exportar, text="🖼️ Guardar Espectrograma Original", command=self.guardar_espectrograma_original).pack(pady=5, fill=tk.X)
         ttk.Button(grupo_exportar, text="🖼️ Guardar Separación de Pistas", command=self.guardar_espectrograma_separacion).pack(pady=5, fill=tk.X)
         ttk.Button(grupo_exportar, text="🖼️ Guardar FFT Voz", command=self.guardar_fft_voz).pack(pady=5, fill=tk.X)
         ttk.Button(grupo_exportar, text="🖼️ Guardar FFT Instrumental", command=self.guardar_fft_instrumental).pack(pady=5, fill=tk.X)
         ttk.Button(grupo_exportar, text="🖼️ Guardar Comparativas FFT", command=self.guardar_comparativas_fft).pack(pady=5, fill=tk.X)
+        ttk.Button(grupo_exportar, text="📦 Exportar Todo", command=self.exportar_todo).pack(pady=5, fill=tk.X)
+        panel_formato = ttk.Frame(grupo_exportar)
+        panel_formato.pack(pady=5, fill=tk.X)
+        ttk.Label(panel_formato, text="Formato de audio al exportar todo:").pack(side=tk.LEFT)
+        self.formato_exportacion = tk.StringVar(value="wav")
+        ttk.Combobox(panel_formato, textvariable=self.formato_exportacion, values=("wav", "flac", "ogg"),
+                     state="readonly", width=6).pack(side=tk.LEFT, padx=5)
+
+
+        # EN VIVO TAB
+        self.panel_vivo = PanelVivo(self.tab_vivo)
+        self.panel_vivo.pack(pady=10, padx=10, fill=tk.BOTH, expand=True)
+        self.panel_vivo.establecer_umbral(self.slider_umbral.get())
 
 
         # Barra de estado
         self.barra_estado = ttk.Label(self.root, text="Listo", relief=tk.SUNKEN)
         self.barra_estado.pack(side=tk.BOTTOM, fill=tk.X)
 
+        # Tareas en segundo plano
+        panel_tareas = ttk.Frame(self.root)
+        panel_tareas.pack(side=tk.BOTTOM, fill=tk.X, padx=20)
+        self.etiqueta_tareas = ttk.Label(panel_tareas, text="")
+        self.etiqueta_tareas.pack(side=tk.LEFT)
+        self.boton_cancelar = ttk.Button(panel_tareas, text="✖ Cancelar", command=lambda: self.planificador.cancelar())
+        self.boton_cancelar.pack(side=tk.RIGHT)
+        self.boton_cancelar.state(["disabled"])
+        self.barra_progreso = ttk.Progressbar(panel_tareas, mode="determinate", maximum=100)
+        self.barra_progreso.pack(side=tk.RIGHT, fill=tk.X, expand=True, padx=10)
+
 
     def setup_estilos(self):
         style = ttk.Style(self.root)
@@ -154,88 +317,343 @@ class AudioPlayerApp:
         self.barra_estado.config(background=primary_color, foreground='white', font=('Segoe UI', 9, 'bold'))
 
 
+    def lanzar(self, nombre, funcion, *args, error="Error", al_terminar=None,
+               exclusivos=(), compartidos=()):
+        try:
+            return self.planificador.enviar(
+                nombre, funcion, *args,
+                exclusivos=exclusivos, compartidos=compartidos,
+                al_terminar=al_terminar,
+                al_fallar=lambda e: messagebox.showerror("Error", f"{error}:\n{str(e)}"),
+                al_cancelar=lambda: self.actualizar_estado(f"{nombre}: cancelado"))
+        except TareaEnConflicto as e:
+            messagebox.showwarning("Advertencia", str(e))
+            return None
+
+    def mostrar_tareas(self, activas):
+        if not activas:
+            self.barra_progreso["value"] = 0
+            self.etiqueta_tareas.config(text="")
+            self.boton_cancelar.state(["disabled"])
+            return
+        tarea = activas[0]
+        extra = f" (+{len(activas) - 1} más)" if len(activas) > 1 else ""
+        self.barra_progreso["value"] = tarea.progreso * 100
+        self.etiqueta_tareas.config(text=f"{tarea.mensaje}{extra}")
+        self.boton_cancelar.state(["!disabled"])
+
+    def precalentar(self):
+        # Con la ventana ya visible, importa en un hilo aparte lo que necesitarán
+        # la primera carga, gráfica o reproducción, y deja comprobado ffmpeg
+        def cargar():
+            with tramo("precalentado"):
+                for modulo in MODULOS_PRECALENTAR:
+                    try:
+                        importlib.import_module(modulo)
+                    except Exception:
+                        # Si falta una dependencia, el error se mostrará al usar esa función
+                        pass
+                try:
+                    verificar_ffmpeg()
+                except EnvironmentError:
+                    pass
+
+        threading.Thread(target=cargar, name="precalentar", daemon=True).start()
+
+    def cerrar(self):
+        self.planificador.cerrar()
+        self.reproductor.cerrar()
+        self.panel_vivo.detener()
+        self.root.destroy()
+        if self.disco is not None:
+            self.disco.cerrar()
+        if self.motor_segmentado is not None:
+            self.motor_segmentado.cerrar()
+        metricas.cerrar()
+
+    def cambiar_umbral(self, valor):
+        # El callback de audio lee este atributo en cada bloque
+        self.filtro_vivo.umbral_porcentaje = float(valor)
+        self.panel_vivo.establecer_umbral(float(valor))
+        # Solo invalida lo que depende del umbral; la separación y el barrido se conservan
+        self.grafo.establecer(umbral=self.slider_umbral.get())
+        self.marcar_umbral()
+
+    def cambiar_filtro_vivo(self):
+        self.filtro_vivo.reiniciar()
+        self.filtro_vivo.activo = self.filtro_en_vivo.get()
+
+    def cambiar_modo_grande(self):
+        # En modo archivo grande las pistas (y las señales filtradas) son float32 en disco
+        if self.modo_grande.get():
+            if self.disco is None:
+                self.disco = AlmacenDisco()
+            almacen_espectrogramas.reservar = lambda longitud: self.disco.reservar(longitud, "filtrada")
+            almacen_espectrogramas.liberar = self.disco.liberar
+        else:
+            almacen_espectrogramas.reservar = None
+
+    def crear_grafo(self):
+        # Grafo carga -> separación -> filtrado -> STFT / nota de las vistas de
+        # análisis; sus resultados viven en almacen_espectrogramas
+        self.grafo = crear_grafo_analisis(cache=self.cache_pistas)
+        self.grafo.establecer(sr=self.sr, umbral=self.slider_umbral.get())
+        if self.audio_file is not None:
+            self.grafo.fijar("audio", self.audio_file)
+        if self.vocal_track is not None and self.instrumental_track is not None:
+            self.grafo.fijar("pistas", (self.vocal_track, self.instrumental_track))
+
     def cargar_audio(self):
         rutas_audio = [("Archivos de audio", "*.wav *.mp3 *.flac *.ogg")]
         ruta_archivo = filedialog.askopenfilename(filetypes=rutas_audio)
 
         if ruta_archivo:
             try:
-                with warnings.catch_warnings():
-                    warnings.simplefilter("ignore")
-
-                    if not ruta_archivo.endswith(".wav"):
-                        audio = AudioSegment.from_file(ruta_archivo)
-                        ruta_archivo = "temp_conversion.wav"
-                        audio.export(ruta_archivo, format="wav")
-
-                    self.audio_file, self.sr = librosa.load(ruta_archivo, sr=self.sr, res_type='kaiser_fast')
-                    self.actualizar_estado(f"Audio cargado: {os.path.basename(ruta_archivo)}")
-
-                    if os.path.exists("temp_conversion.wav"):
-                        os.remove("temp_conversion.wav")
-
-            except Exception as e:
-                messagebox.showerror("Error", f"Error al cargar audio:\n{str(e)}")
+                offset = float(self.entrada_inicio.get() or 0)
+                duracion = float(self.entrada_duracion.get()) if self.entrada_duracion.get() else None
+            except ValueError:
+                messagebox.showwarning("Advertencia", "Inicio y duración deben ser números (segundos)")
+                return
+            # Las variables de Tk se leen aquí, en el hilo de la interfaz
+            disco = self.disco if self.modo_grande.get() else None
+            self.lanzar("Cargando audio", self._tarea_cargar_audio, ruta_archivo, self.sr, offset, duracion, disco,
+                        exclusivos=("audio",), al_terminar=self._audio_cargado,
+                        error="Error al cargar audio")
+
+    def _tarea_cargar_audio(self, tarea, ruta_archivo, sr, offset, duracion, disco):
+        tarea.reportar(0.0, "Decodificando audio...")
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            if disco is not None:
+                audio, sr = cargar_audio_en_disco(ruta_archivo, disco.ruta_nueva("original"),
+                                                  sr=sr, offset=offset, duracion=duracion)
+            else:
+                audio, sr = cargar_audio(ruta_archivo, sr=sr, offset=offset, duracion=duracion)
+        return audio, sr, os.path.basename(ruta_archivo)
+
+    def _audio_cargado(self, resultado):
+        self.audio_file, self.sr, nombre = resultado
+        self.nombre_audio = nombre
+        self.grafo.fijar("audio", self.audio_file)
+        self.grafo.establecer(sr=self.sr)
+        self.actualizar_estado(f"Audio cargado: {nombre}")
+        self.analizar_umbrales(self.audio_file)
+
+    def guardar_sesion(self):
+        if self.audio_file is None:
+            messagebox.showwarning("Advertencia", "Primero carga un audio")
+            return
+        tipos = [("Sesión", f"*{EXTENSION_SESION}"), ("Todos los archivos", "*.*")]
+        ruta = filedialog.asksaveasfilename(defaultextension=EXTENSION_SESION, filetypes=tipos)
+        if not ruta:
+            return
+        audio, vocal, instrumental = self.audio_file, self.vocal_track, self.instrumental_track
+        umbral, en_vivo, sr = self.slider_umbral.get(), self.filtro_en_vivo.get(), self.sr
+        self.lanzar("Guardando sesión",
+                    lambda tarea: guardar_sesion(ruta, sr, audio, vocal, instrumental, umbral, en_vivo,
+                                                 self.nombre_audio),
+                    compartidos=("audio", "pistas"), error="No se pudo guardar la sesión",
+                    al_terminar=lambda _: self.actualizar_estado(f"Sesión guardada: {os.path.basename(ruta)}"))
+
+    def abrir_sesion(self):
+        tipos = [("Sesión", f"*{EXTENSION_SESION}"), ("Todos los archivos", "*.*")]
+        ruta = filedialog.askopenfilename(filetypes=tipos)
+        if ruta:
+            self.lanzar("Abriendo sesión", lambda tarea: cargar_sesion(ruta),
+                        exclusivos=("audio", "pistas"), al_terminar=self._sesion_abierta,
+                        error="No se pudo abrir la sesión")
+
+    def _sesion_abierta(self, sesion):
+        # Las pistas quedan mapeadas desde el archivo de la sesión: no se leen hasta usarlas
+        self.detener_audio()
+        self.audio_file, self.sr = sesion["original"], sesion["sr"]
+        self.vocal_track, self.instrumental_track = sesion["voz"], sesion["instrumental"]
+        self.nombre_audio = sesion["nombre"]
+        if sesion["umbral"] is not None:
+            self.slider_umbral.set(sesion["umbral"])
+        self.filtro_en_vivo.set(sesion["filtro_en_vivo"])
+        self.cambiar_filtro_vivo()
+        self.crear_grafo()
+        self.actualizar_estado(f"Sesión abierta: {sesion['nombre'] or 'sin nombre'}")
+        self.analizar_umbrales(self.vocal_track if self.vocal_track is not None else self.audio_file)
 
     def separar_pistas(self):
         if self.audio_file is None:
             messagebox.showwarning("Advertencia", "Primero carga un archivo de audio")
             return
         try:
-            self.is_processing = True
-            self.actualizar_estado("Iniciando separación de pistas...")
-            
-            ventana = self.mostrar_cargando("Separando pistas...")
-
-            self.vocal_track, self.instrumental_track = separar_pistas(self.audio_file, self.sr)
-
-            ventana.destroy()
-
+            procesos = max(1, self.procesos_separacion.get()) if self.separar_por_segmentos.get() else None
+        except tk.TclError:
+            messagebox.showwarning("Advertencia", "El número de procesos debe ser un entero")
+            return
+        self.actualizar_estado("Iniciando separación de pistas...")
+        disco = self.disco if self.modo_grande.get() else None
+        self.lanzar("Separando pistas", self._tarea_separar, self.audio_file, self.sr, disco, procesos,
+                    exclusivos=("pistas",), compartidos=("audio",),
+                    al_terminar=self._pistas_separadas, error="Error en separación")
+
+    def _tarea_separar(self, tarea, audio, sr, disco, procesos):
+        tarea.reportar(0.0, "Separando pistas...")
+        aciertos_previos = self.cache_pistas.aciertos
+        motor = self.obtener_motor_segmentado(procesos) if procesos else None
+        pistas = separar_pistas(audio, sr, motor=motor, cache=self.cache_pistas,
+                                progreso=lambda hechos, total: tarea.reportar(
+                                    0.9 * hechos / total, f"Separando pistas: segmento {hechos}/{total}"))
+        if disco is not None:
+            tarea.reportar(0.9, "Guardando pistas en disco...")
+            pistas = (disco.copiar(pistas[0], "voz"), disco.copiar(pistas[1], "instrumental"))
+        return pistas, self.cache_pistas.aciertos > aciertos_previos
+
+    def obtener_motor_segmentado(self, procesos):
+        # Se conserva entre separaciones: cada proceso mantiene su modelo cargado.
+        # Corre en el hilo de la tarea; `procesos` llega leído desde la interfaz
+        if self.motor_segmentado is None or self.motor_segmentado.trabajadores != procesos:
+            if self.motor_segmentado is not None:
+                self.motor_segmentado.cerrar()
+            self.motor_segmentado = MotorSegmentado(trabajadores=procesos)
+        return self.motor_segmentado
+
+    def _pistas_separadas(self, resultado):
+        (self.vocal_track, self.instrumental_track), desde_cache = resultado
+        self.grafo.fijar("pistas", (self.vocal_track, self.instrumental_track))
+        if desde_cache:
+            self.actualizar_estado("Separación recuperada de la caché")
+        else:
             self.actualizar_estado("Separación completada exitosamente")
-            messagebox.showinfo("Éxito", "Pistas separadas correctamente")
-
-        except Exception as e:
-            messagebox.showerror("Error", f"Error en separación:\n{str(e)}")
-        finally:
-            self.is_processing = False
+        self.analizar_umbrales(self.vocal_track)
+        messagebox.showinfo("Éxito", "Pistas separadas correctamente")
+
+    def analizar_umbrales(self, pista):
+        # Pista que se va a filtrar; su curva de energía retenida frente al umbral
+        # se calcula la primera vez que se toca el umbral (ver mostrar_curva_umbral)
+        self.barrido = None
+        self.pista_barrido = pista
+        self.analizando_umbrales = None
+        self.curva_umbral.delete("all")
+        self.etiqueta_energia.config(text="Energía retenida: mueve el umbral para calcularla")
+
+    def mostrar_curva_umbral(self, evento=None):
+        pista = self.pista_barrido
+        if pista is None or self.barrido is not None or self.analizando_umbrales is pista:
+            return
+        # El análisis vive en memoria (unos 20 bytes por muestra)
+        if self.modo_grande.get():
+            self.etiqueta_energia.config(text="Energía retenida: no disponible en modo archivo grande")
+            return
+        if len(pista) > MAX_MUESTRAS_BARRIDO:
+            self.etiqueta_energia.config(text="Energía retenida: no disponible para pistas tan largas")
+            return
+        self.analizando_umbrales = pista
+        self.etiqueta_energia.config(text="Energía retenida: analizando...")
+        # Sin recursos: no debe bloquear una separación o una carga posterior
+        self.lanzar("Analizando umbrales", lambda tarea: (pista, obtener_barrido(pista)),
+                    al_terminar=self._umbrales_analizados, error="Error al analizar umbrales")
+
+    def _umbrales_analizados(self, resultado):
+        pista, barrido = resultado
+        if pista is not self.pista_barrido:
+            return  # Llegó tarde: ya se pidió el análisis de otra pista
+        self.barrido = barrido
+        umbrales, energia, _ = barrido.curva_energia()
+        xs = umbrales / 100 * (ANCHO_CURVA - 1)
+        ys = (1 - energia) * (ALTO_CURVA - 4) + 2
+        self.curva_umbral.delete("all")
+        self.curva_umbral.create_line(*np.column_stack([xs, ys]).ravel(), fill="#1f77b4", width=2)
+        self.marcar_umbral()
+
+    def marcar_umbral(self):
+        if self.barrido is None:
+            return
+        umbral = self.slider_umbral.get()
+        energia = float(self.barrido.energia_retenida(umbral))
+        bins = int(self.barrido.bins_supervivientes(umbral))
+        x = umbral / 100 * (ANCHO_CURVA - 1)
+        y = (1 - energia) * (ALTO_CURVA - 4) + 2
+        self.curva_umbral.delete("marca")
+        self.curva_umbral.create_line(x, 0, x, ALTO_CURVA, fill="#d62728", tags="marca")
+        self.curva_umbral.create_oval(x - 3, y - 3, x + 3, y + 3, fill="#d62728", outline="", tags="marca")
+        self.etiqueta_energia.config(
+            text=f"Energía retenida: {energia:.1%} · bins: {bins}/{self.barrido.total_bins}")
 
     def guardar_audio(self, pista):
         if pista is None:
             messagebox.showwarning("Advertencia", "No hay pista para guardar")
             return
 
-        opciones = [("Archivo WAV", "*.wav"), ("Todos los archivos", "*.*")]
-        ruta_guardado = filedialog.asksaveasfilename(defaultextension=".wav", filetypes=opciones)
+        ruta_guardado = filedialog.asksaveasfilename(defaultextension=".wav", filetypes=TIPOS_AUDIO)
 
         if ruta_guardado:
-            try:
-                guardar_audio(pista, self.sr, ruta_guardado)
-                self.actualizar_estado(f"Archivo guardado: {os.path.basename(ruta_guardado)}")
-            except Exception as e:
-                messagebox.showerror("Error", f"Error al guardar:\n{str(e)}")
+            self.lanzar("Guardando audio", lambda tarea: guardar_audio(pista, self.sr, ruta_guardado),
+                        compartidos=("pistas",), error="Error al guardar",
+                        al_terminar=lambda _: self.actualizar_estado(
+                            f"Archivo guardado: {os.path.basename(ruta_guardado)}"))
+
+    def guardar_pistas(self):
+        if self.vocal_track is None or self.instrumental_track is None:
+            messagebox.showwarning("Advertencia", "Primero separa las pistas")
+            return
+
+        # Una sola ruta base: se escriben <base>_voz y <base>_instrumental a la vez
+        ruta_base = filedialog.asksaveasfilename(defaultextension=".wav", filetypes=TIPOS_AUDIO)
+        if ruta_base:
+            base, extension = os.path.splitext(ruta_base)
+            pistas = [(self.vocal_track, f"{base}_voz{extension}"),
+                      (self.instrumental_track, f"{base}_instrumental{extension}")]
+            self.lanzar("Guardando pistas", lambda tarea: guardar_pistas(pistas, self.sr),
+                        compartidos=("pistas",), error="Error al guardar",
+                        al_terminar=lambda rutas: self.actualizar_estado(
+                            "Archivos guardados: " + ", ".join(os.path.basename(r) for r in rutas)))
+
+    def preparar_graficas(self, nombre, paneles, al_terminar, notas=True):
+        # Calcula en segundo plano los espectrogramas (y notas) que luego se dibujan
+        # en el hilo de Tk: al graficar ya están en el almacén compartido.
+        sr = self.sr
+
+        def tarea_preparar(tarea):
+            for indice, (audio, umbral) in enumerate(paneles):
+                tarea.reportar(indice / len(paneles), f"{nombre}: calculando espectrograma {indice + 1}/{len(paneles)}")
+                obtener_espectrograma(audio, umbral)
+                if notas:
+                    tarea.reportar(mensaje=f"{nombre}: detectando nota {indice + 1}/{len(paneles)}")
+                    obtener_nota_predominante(obtener_senal_filtrada(audio, umbral), sr)
+
+        self.lanzar(nombre, tarea_preparar, compartidos=("audio", "pistas"),
+                    al_terminar=al_terminar, error="Error al graficar")
 
     def ver_espectrograma_original(self):
         if self.audio_file is not None:
-            plt.figure(figsize=(12, 4))
-            graficar_espectrograma(self.audio_file, self.sr, "Original")
-            plt.tight_layout()
-            plt.show()
+            audio = self.audio_file
+
+            def mostrar(_):
+                import matplotlib.pyplot as plt
+                plt.figure(figsize=(12, 4))
+                graficar_espectrograma(audio, self.sr, "Original")
+                plt.tight_layout()
+                plt.show(block=False)
+
+            self.preparar_graficas("Espectrograma original", [(audio, None)], mostrar)
         else:
             messagebox.showwarning("Advertencia", "Primero carga un audio")
 
 
     def ver_espectrogramas_separados(self):
         if self.vocal_track is not None and self.instrumental_track is not None:
-            plt.figure(figsize=(12, 8))
+            vocal, instrumental = self.vocal_track, self.instrumental_track
+
+            def mostrar(_):
+                import matplotlib.pyplot as plt
+                plt.figure(figsize=(12, 8))
 
-            plt.subplot(2, 1, 1)
-            graficar_espectrograma(self.vocal_track, self.sr, "Voz - Separada")
+                plt.subplot(2, 1, 1)
+                graficar_espectrograma(vocal, self.sr, "Voz - Separada")
 
-            plt.subplot(2, 1, 2)
-            graficar_espectrograma(self.instrumental_track, self.sr, "Instrumental - Separado")
+                plt.subplot(2, 1, 2)
+                graficar_espectrograma(instrumental, self.sr, "Instrumental - Separado")
+
+                plt.tight_layout()
+                plt.show(block=False)
 
-            plt.tight_layout()
-            plt.show()
+            self.preparar_graficas("Ver separación", [(vocal, None), (instrumental, None)], mostrar)
         else:
             messagebox.showwarning("Advertencia", "Primero separa las pistas")
 
@@ -244,298 +662,282 @@ class AudioPlayerApp:
         if self.vocal_track is None:
             messagebox.showwarning("Advertencia", "Primero separa las pistas")
             return
-
-        # Verificar si ya se aplicó FFT
-        if np.array_equal(self.vocal_track, aplicar_fft(self.vocal_track.copy(), 0)):
-            messagebox.showwarning("Advertencia", "Debes aplicar la FFT a la pista vocal antes de visualizarla")
-            return
-
-        original = self.vocal_track.copy()
-        procesado = aplicar_fft(original, self.slider_umbral.get())
-        mostrar_comparacion_fft(original, procesado, self.sr, "Voz")
+        self._ver_fft(self.vocal_track, "Voz")
 
 
     def ver_fft_instrumental(self):
         if self.instrumental_track is None:
             messagebox.showwarning("Advertencia", "Primero separa las pistas")
             return
+        self._ver_fft(self.instrumental_track, "Instrumental")
 
-        if np.array_equal(self.instrumental_track, aplicar_fft(self.instrumental_track.copy(), 0)):
-            messagebox.showwarning("Advertencia", "Debes aplicar la FFT a la pista instrumental antes de visualizarla")
-            return
-
-        original = self.instrumental_track.copy()
-        procesado = aplicar_fft(original, self.slider_umbral.get())
-        mostrar_comparacion_fft(original, procesado, self.sr, "Instrumental")
+    def _ver_fft(self, pista, titulo):
+        umbral = self.slider_umbral.get()
+        self.preparar_graficas(f"FFT {titulo}", [(pista, None), (pista, umbral)],
+                               lambda _: mostrar_comparacion_fft(pista, self.sr, titulo, umbral))
 
 
     def graficar_comparativas(self):
-        try:
-            if self.vocal_track is None or self.instrumental_track is None:
-                messagebox.showwarning("Advertencia", "Primero separa las pistas")
-                return
-
-            # Aplicar FFT en tiempo real según el umbral seleccionado
-            vocal_fft = aplicar_fft(self.vocal_track.copy(), self.slider_umbral.get())
-            instrumental_fft = aplicar_fft(self.instrumental_track.copy(), self.slider_umbral.get())
+        if self.vocal_track is None or self.instrumental_track is None:
+            messagebox.showwarning("Advertencia", "Primero separa las pistas")
+            return
 
+        # Aplicar FFT según el umbral seleccionado: el grafo solo recalcula lo
+        # que dependa de un umbral distinto al de la última vez
+        umbral = self.slider_umbral.get()
+        grafo, sr = self.grafo, self.sr
+        longitudes = {"voz": len(self.vocal_track), "instrumental": len(self.instrumental_track)}
+
+        def calcular(tarea):
+            resultados = {}
+            for indice, pista in enumerate(("voz", "instrumental")):
+                tarea.reportar(indice / 2, f"Comparativas FFT: {pista}")
+                resultados[pista] = (grafo.obtener(f"{pista}_espectrograma_filtrado", umbral=umbral),
+                                     grafo.obtener(f"{pista}_nota", umbral=umbral))
+            return resultados
+
+        def mostrar(resultados):
+            import matplotlib.pyplot as plt
             plt.figure(figsize=(14, 8))
-
-            # --- Graficar espectrograma de la voz ---
-            plt.subplot(2, 1, 1)
-            D_vocal = librosa.amplitude_to_db(np.abs(librosa.stft(vocal_fft)), ref=np.max)
-            librosa.display.specshow(D_vocal, sr=self.sr, x_axis='time', y_axis='log', cmap='plasma')
-            plt.colorbar(format='%+2.0f dB')
-            
-            nota_vocal = obtener_nota_predominante(vocal_fft, self.sr)
-            plt.title(f"Voz - FFT Aplicada - Nota Predominante: {nota_vocal}", fontsize=14, fontweight='bold')
-            plt.xlabel("")
-            plt.ylabel("Frecuencia (Hz)")
-
-            # --- Graficar espectrograma del instrumental ---
-            plt.subplot(2, 1, 2)
-            D_instrumental = librosa.amplitude_to_db(np.abs(librosa.stft(instrumental_fft)), ref=np.max)
-            librosa.display.specshow(D_instrumental, sr=self.sr, x_axis='time', y_axis='log', cmap='plasma')
-            plt.colorbar(format='%+2.0f dB')
-
-            nota_instrumental = obtener_nota_predominante(instrumental_fft, self.sr)
-            plt.title(f"Instrumental - FFT Aplicada - Nota Predominante: {nota_instrumental}", fontsize=14, fontweight='bold')
-            plt.xlabel("Tiempo (s)")
-            plt.ylabel("Frecuencia (Hz)")
-
+            for indice, (pista, titulo) in enumerate((("voz", "Voz"), ("instrumental", "Instrumental")), start=1):
+                espectrograma, nota = resultados[pista]
+                plt.subplot(2, 1, indice)
+                dibujar_espectrograma(espectrograma, sr, hop_visual(longitudes[pista]))
+                plt.title(f"{titulo} - FFT Aplicada - Nota Predominante: {nota}", fontsize=14, fontweight='bold')
+                plt.xlabel("Tiempo (s)" if indice == 2 else "")
+                plt.ylabel("Frecuencia (Hz)")
             plt.tight_layout(pad=2.0)
-            plt.show()
-
-        except Exception as e:
-            messagebox.showerror("Error", f"Error al graficar:\n{str(e)}")
+            plt.show(block=False)
+
+        self.lanzar("Comparativas FFT", calcular, compartidos=("audio", "pistas"),
+                    al_terminar=mostrar, error="Error al graficar")
+
+    def abrir_en_visor(self):
+        seleccion = self.pista_visor.get()
+        pistas = {
+            "Original": (self.audio_file, None),
+            "Voz": (self.vocal_track, None),
+            "Instrumental": (self.instrumental_track, None),
+            "Voz FFT": (self.vocal_track, self.slider_umbral.get()),
+            "Instrumental FFT": (self.instrumental_track, self.slider_umbral.get()),
+        }
+        audio, umbral = pistas[seleccion]
+        if audio is None:
+            messagebox.showwarning("Advertencia", "Primero carga el audio y separa las pistas")
+            return
 
-    def guardar_espectrograma_original(self):
-        try:
-            if self.audio_file is None:
-                messagebox.showwarning("Advertencia", "Primero carga un audio")
-                return
+        clave = (huella_memorizada(audio), umbral)
+        if clave in self.piramides:
+            self.piramides.move_to_end(clave)
+            self.visor.mostrar(self.piramides[clave])
+            return
 
-            ruta_guardado = filedialog.asksaveasfilename(defaultextension=".png",
-                                                        filetypes=[("PNG Image", "*.png"), ("JPEG Image", "*.jpg")])
-            if ruta_guardado:
-                plt.figure(figsize=(12, 4))
-                D = librosa.amplitude_to_db(np.abs(librosa.stft(self.audio_file)), ref=np.max)
-                librosa.display.specshow(D, sr=self.sr, x_axis='time', y_axis='log', cmap='plasma')
-                plt.colorbar(format='%+2.0f dB')
-                plt.title("Espectrograma Original")
-                plt.tight_layout()
-                plt.savefig(ruta_guardado)
-                plt.close()
-                messagebox.showinfo("Éxito", f"Gráfico guardado exitosamente:\n{ruta_guardado}")
-        except Exception as e:
-            messagebox.showerror("Error", f"No se pudo guardar el espectrograma:\n{str(e)}")
+        def construir(tarea):
+            tarea.reportar(0.0, f"Visor: preparando {seleccion}...")
+            return PiramideEspectrograma(obtener_senal_filtrada(audio, umbral), self.sr)
 
-    def guardar_espectrograma_separacion(self):
-        try:
-            if self.vocal_track is None or self.instrumental_track is None:
-                messagebox.showwarning("Advertencia", "Primero separa las pistas")
-                return
+        def mostrar(piramide):
+            self.piramides[clave] = piramide
+            while len(self.piramides) > MAX_PIRAMIDES:
+                self.piramides.popitem(last=False)
+            self.visor.mostrar(piramide)
 
-            ruta_guardado = filedialog.asksaveasfilename(defaultextension=".png",
-                                                        filetypes=[("PNG Image", "*.png"), ("JPEG Image", "*.jpg")])
-            if ruta_guardado:
-                plt.figure(figsize=(12, 8))
-                plt.subplot(2, 1, 1)
-                D_vocal = librosa.amplitude_to_db(np.abs(librosa.stft(self.vocal_track)), ref=np.max)
-                librosa.display.specshow(D_vocal, sr=self.sr, x_axis='time', y_axis='log', cmap='plasma')
-                plt.colorbar(format='%+2.0f dB')
-                plt.title("Espectrograma Voz Separada")
+        self.lanzar(f"Visor {seleccion}", construir, compartidos=("audio", "pistas"),
+                    al_terminar=mostrar, error="Error en el visor")
 
-                plt.subplot(2, 1, 2)
-                D_instrumental = librosa.amplitude_to_db(np.abs(librosa.stft(self.instrumental_track)), ref=np.max)
-                librosa.display.specshow(D_instrumental, sr=self.sr, x_axis='time', y_axis='log', cmap='plasma')
-                plt.colorbar(format='%+2.0f dB')
-                plt.title("Espectrograma Instrumental Separado")
+    def pedir_ruta_imagen(self):
+        return filedialog.asksaveasfilename(defaultextension=".png",
+                                            filetypes=[("PNG Image", "*.png"), ("JPEG Image", "*.jpg")])
 
-                plt.tight_layout()
-                plt.savefig(ruta_guardado)
-                plt.close()
-                messagebox.showinfo("Éxito", f"Gráfico guardado exitosamente:\n{ruta_guardado}")
-        except Exception as e:
-            messagebox.showerror("Error", f"No se pudo guardar el espectrograma de separación:\n{str(e)}")
+    def exportar_figura(self, nombre, paneles, error, figsize=(12, 4)):
+        # paneles: lista de (audio, umbral, titulo). El render no usa pyplot,
+        # así que todo el trabajo ocurre fuera del hilo de Tk.
+        ruta_guardado = self.pedir_ruta_imagen()
+        if not ruta_guardado:
+            return
 
-    def guardar_fft_voz(self):
-        try:
-            if self.vocal_track is None:
-                messagebox.showwarning("Advertencia", "Primero separa las pistas")
-                return
+        def guardar(tarea):
+            tarea.reportar(0.0, f"{nombre}...")
+            guardar_figura(paneles, self.sr, ruta_guardado, figsize=figsize)
 
-            ruta_guardado = filedialog.asksaveasfilename(defaultextension=".png",
-                                                        filetypes=[("PNG Image", "*.png"), ("JPEG Image", "*.jpg")])
-            if ruta_guardado:
-                plt.figure(figsize=(12, 4))
-                original = self.vocal_track.copy()
-                procesado = aplicar_fft(original, self.slider_umbral.get())
+        self.lanzar(nombre, guardar, compartidos=("audio", "pistas"), error=error,
+                    al_terminar=lambda _: messagebox.showinfo("Éxito", f"Gráfico guardado exitosamente:\n{ruta_guardado}"))
 
-                D = librosa.amplitude_to_db(np.abs(librosa.stft(procesado)), ref=np.max)
-                librosa.display.specshow(D, sr=self.sr, x_axis='time', y_axis='log', cmap='plasma')
-                plt.colorbar(format='%+2.0f dB')
-                plt.title("FFT Aplicada a Voz")
-                plt.tight_layout()
-                plt.savefig(ruta_guardado)
-                plt.close()
-                messagebox.showinfo("Éxito", f"Gráfico guardado exitosamente:\n{ruta_guardado}")
-        except Exception as e:
-            messagebox.showerror("Error", f"No se pudo guardar la FFT de voz:\n{str(e)}")
+    def guardar_espectrograma_original(self):
+        if self.audio_file is None:
+            messagebox.showwarning("Advertencia", "Primero carga un audio")
+            return
+        self.exportar_figura("Guardar espectrograma", [(self.audio_file, None, "Espectrograma Original")],
+                             "No se pudo guardar el espectrograma")
 
-    def guardar_fft_instrumental(self):
-        try:
-            if self.instrumental_track is None:
-                messagebox.showwarning("Advertencia", "Primero separa las pistas")
-                return
+    def guardar_espectrograma_separacion(self):
+        if self.vocal_track is None or self.instrumental_track is None:
+            messagebox.showwarning("Advertencia", "Primero separa las pistas")
+            return
+        self.exportar_figura("Guardar separación",
+                             [(self.vocal_track, None, "Espectrograma Voz Separada"),
+                              (self.instrumental_track, None, "Espectrograma Instrumental Separado")],
+                             "No se pudo guardar el espectrograma de separación", figsize=(12, 8))
 
-            ruta_guardado = filedialog.asksaveasfilename(defaultextension=".png",
-                                                        filetypes=[("PNG Image", "*.png"), ("JPEG Image", "*.jpg")])
-            if ruta_guardado:
-                plt.figure(figsize=(12, 4))
-                original = self.instrumental_track.copy()
-                procesado = aplicar_fft(original, self.slider_umbral.get())
+    def guardar_fft_voz(self):
+        if self.vocal_track is None:
+            messagebox.showwarning("Advertencia", "Primero separa las pistas")
+            return
+        self.exportar_figura("Guardar FFT voz",
+                             [(self.vocal_track, self.slider_umbral.get(), "FFT Aplicada a Voz")],
+                             "No se pudo guardar la FFT de voz")
 
-                D = librosa.amplitude_to_db(np.abs(librosa.stft(procesado)), ref=np.max)
-                librosa.display.specshow(D, sr=self.sr, x_axis='time', y_axis='log', cmap='plasma')
-                plt.colorbar(format='%+2.0f dB')
-                plt.title("FFT Aplicada a Instrumental")
-                plt.tight_layout()
-                plt.savefig(ruta_guardado)
-                plt.close()
-                messagebox.showinfo("Éxito", f"Gráfico guardado exitosamente:\n{ruta_guardado}")
-        except Exception as e:
-            messagebox.showerror("Error", f"No se pudo guardar la FFT de instrumental:\n{str(e)}")
+    def guardar_fft_instrumental(self):
+        if self.instrumental_track is None:
+            messagebox.showwarning("Advertencia", "Primero separa las pistas")
+            return
+        self.exportar_figura("Guardar FFT instrumental",
+                             [(self.instrumental_track, self.slider_umbral.get(), "FFT Aplicada a Instrumental")],
+                             "No se pudo guardar la FFT de instrumental")
 
     def guardar_comparativas_fft(self):
-        try:
-            if self.vocal_track is None or self.instrumental_track is None:
-                messagebox.showwarning("Advertencia", "Primero separa las pistas")
-                return
-
-            ruta_guardado = filedialog.asksaveasfilename(defaultextension=".png",
-                                                        filetypes=[("PNG Image", "*.png"), ("JPEG Image", "*.jpg")])
-            if ruta_guardado:
-                vocal_fft = aplicar_fft(self.vocal_track.copy(), self.slider_umbral.get())
-                instrumental_fft = aplicar_fft(self.instrumental_track.copy(), self.slider_umbral.get())
-
-                plt.figure(figsize=(14, 8))
-
-                plt.subplot(2, 1, 1)
-                D_vocal = librosa.amplitude_to_db(np.abs(librosa.stft(vocal_fft)), ref=np.max)
-                librosa.display.specshow(D_vocal, sr=self.sr, x_axis='time', y_axis='log', cmap='plasma')
-                plt.colorbar(format='%+2.0f dB')
-                plt.title("Voz - FFT Aplicada")
-
-                plt.subplot(2, 1, 2)
-                D_instrumental = librosa.amplitude_to_db(np.abs(librosa.stft(instrumental_fft)), ref=np.max)
-                librosa.display.specshow(D_instrumental, sr=self.sr, x_axis='time', y_axis='log', cmap='plasma')
-                plt.colorbar(format='%+2.0f dB')
-                plt.title("Instrumental - FFT Aplicada")
-
-                plt.tight_layout()
-                plt.savefig(ruta_guardado)
-                plt.close()
-                messagebox.showinfo("Éxito", f"Gráfico guardado exitosamente:\n{ruta_guardado}")
-        except Exception as e:
-            messagebox.showerror("Error", f"No se pudo guardar las comparativas FFT:\n{str(e)}")
-
+        if self.vocal_track is None or self.instrumental_track is None:
+            messagebox.showwarning("Advertencia", "Primero separa las pistas")
+            return
+        umbral = self.slider_umbral.get()
+        self.exportar_figura("Guardar comparativas",
+                             [(self.vocal_track, umbral, "Voz - FFT Aplicada"),
+                              (self.instrumental_track, umbral, "Instrumental - FFT Aplicada")],
+                             "No se pudo guardar las comparativas FFT", figsize=(14, 8))
 
-    def iniciar_reproduccion(self, audio):
-        if audio is None:
+    def exportar_todo(self):
+        if self.audio_file is None:
+            messagebox.showwarning("Advertencia", "Primero carga un audio")
+            return
+        directorio = filedialog.askdirectory(title="Carpeta de exportación")
+        if not directorio:
+            return
+        audio, vocal, instrumental = self.audio_file, self.vocal_track, self.instrumental_track
+        umbral = self.slider_umbral.get()
+        formato = self.formato_exportacion.get()
+
+        def exportar(tarea):
+            def progreso(hechos, total, nombre):
+                tarea.comprobar()
+                tarea.reportar(hechos / total, f"Exportando: {nombre} ({hechos}/{total})")
+            return exportar_todo(directorio, self.sr, umbral, audio, vocal, instrumental,
+                                 formato_audio=formato, progreso=progreso)
+
+        self.lanzar("Exportar todo", exportar, compartidos=("audio", "pistas"), error="No se pudo exportar",
+                    al_terminar=lambda rutas: messagebox.showinfo(
+                        "Éxito", f"{len(rutas)} archivos exportados en:\n{directorio}"))
+
+
+    def sincronizar_pistas(self):
+        # Las ranuras del motor apuntan a las pistas actuales (sin copiarlas)
+        self.reproductor.cargar("original", self.audio_file)
+        self.reproductor.cargar("voz", self.vocal_track)
+        self.reproductor.cargar("instrumental", self.instrumental_track)
+        if not any(self.fuente_filtrada is pista for pista in (self.audio_file, self.vocal_track, self.instrumental_track)):
+            self.fuente_filtrada = None
+            self.reproductor.cargar("filtrada", None)
+
+    def iniciar_reproduccion(self, nombre, alternar=True):
+        self.sincronizar_pistas()
+        if self.reproductor.pista_cargada(nombre) is None:
             messagebox.showwarning("Advertencia", "No hay audio para reproducir")
             return
 
-        if self.current_audio is not audio:
-            self.playback_position = 0.0
-            self.current_audio = audio
-            self.audio_buffer = audio.copy()
-            self.buffer_position = 0
-
-        if self.is_playing:
+        if alternar and self.reproductor.pista == nombre and self.reproductor.reproduciendo:
             self.pausar_reanudar()
             return
 
-        self.reproducir_audio()
-
-    def reproducir_audio(self):
         try:
-            if self.stream is not None:
-                self.stream.close()
-
-            start_sample = int(self.playback_position * self.sr)
-            self.audio_buffer = self.current_audio[start_sample:]
-            self.buffer_position = 0
-
-            def callback(outdata, frames, time_info, status):
-                if self.is_playing:
-                    remaining = len(self.audio_buffer) - self.buffer_position
-                    if remaining <= 0:
-                        outdata[:] = 0
-                        raise sd.CallbackStop
-
-                    chunksize = min(remaining, frames)
-                    outdata[:chunksize] = self.audio_buffer[
-                        self.buffer_position:self.buffer_position + chunksize
-                    ].reshape(-1, 1)
-                    outdata[chunksize:] = 0
-                    self.buffer_position += chunksize
-                    self.playback_position += chunksize / self.sr
-                else:
-                    raise sd.CallbackStop
-
-            self.stream = sd.OutputStream(
-                samplerate=self.sr,
-                channels=1,
-                callback=callback,
-                finished_callback=self.finalizar_reproduccion
-            )
-            self.stream.start()
-            self.is_playing = True
-            self.actualizar_estado("Reproduciendo...")
-
+            self.reproductor.abrir(self.sr)
+            # Si ya sonaba otra pista, sigue en la misma muestra
+            self.reproductor.reproducir(nombre)
         except Exception as e:
             self.actualizar_estado(f"Error en reproducción: {str(e)}")
-            self.is_playing = False
+            return
+        self.seguir_posicion()
+        self.actualizar_estado(f"Reproduciendo: {nombre}")
+
+    def reproducir_filtrada(self):
+        # La pista elegida (o la voz, si está separada) filtrada con el umbral
+        # actual; sale del grafo, así que repetir un umbral no recalcula nada
+        self.sincronizar_pistas()
+        base = self.reproductor.pista if self.reproductor.pista in ("original", "voz", "instrumental") else None
+        if base is None or self.reproductor.pista_cargada(base) is None:
+            base = "voz" if self.vocal_track is not None else "original"
+        fuente = self.reproductor.pista_cargada(base)
+        if fuente is None:
+            messagebox.showwarning("Advertencia", "No hay audio para reproducir")
+            return
+        nodo = {"original": "audio"}.get(base, base) + "_filtrada"
+        umbral = self.slider_umbral.get()
+
+        def lista(senal):
+            self.fuente_filtrada = fuente
+            self.reproductor.cargar("filtrada", senal)
+            self.iniciar_reproduccion("filtrada", alternar=False)
+
+        self.lanzar("Filtrando para reproducir", lambda tarea: self.grafo.obtener(nodo, umbral=umbral),
+                    compartidos=("audio", "pistas"), al_terminar=lista, error="Error al filtrar")
+
+    def alternar_ab(self):
+        self.sincronizar_pistas()
+        nombre = self.reproductor.ab() if self.reproductor.stream is not None else None
+        if nombre is None:
+            messagebox.showwarning("Advertencia", "Primero reproduce dos pistas para compararlas")
+            return
+        self.seguir_posicion()
+        self.actualizar_estado(f"Reproduciendo: {nombre}")
 
     def pausar_reanudar(self):
-        if self.is_playing:
-            self.is_playing = False
-            if self.stream is not None:
-                self.stream.stop()
+        if self.reproductor.pista is None or self.reproductor.stream is None:
+            return
+        if self.reproductor.reproduciendo:
+            self.reproductor.pausar()
             self.actualizar_estado("Reproducción pausada")
         else:
-            self.is_playing = True
-            if self.stream is not None:
-                self.stream.start()
+            self.reproductor.reanudar()
+            self.seguir_posicion()
             self.actualizar_estado("Reanudando reproducción...")
 
     def detener_audio(self):
-        self.is_playing = False
-        self.playback_position = 0.0
-        if self.stream is not None:
-            self.stream.stop()
-            self.stream.close()
-            self.stream = None
+        # El stream sigue abierto: volver a reproducir no tiene que recrearlo
+        self.reproductor.detener()
+        self.mostrar_posicion(0.0)
         self.actualizar_estado("Reproducción detenida")
 
-    def finalizar_reproduccion(self):
-        self.is_playing = False
-        self.playback_position = 0.0
-        self.actualizar_estado("Reproducción finalizada")
+    def buscar_posicion(self, valor):
+        if self.reproductor.stream is not None:
+            self.reproductor.buscar(float(valor))
+            self.mostrar_posicion(float(valor))
+
+    def mostrar_posicion(self, posicion):
+        duracion = self.reproductor.duracion_s()
+        self.barra_posicion.config(to=max(duracion, 1e-3))
+        if not self.arrastrando_posicion:
+            self.posicion_reproduccion.set(posicion)
+        self.etiqueta_posicion.config(
+            text=f"{int(posicion) // 60}:{int(posicion) % 60:02d} / {int(duracion) // 60}:{int(duracion) % 60:02d}")
+
+    def seguir_posicion(self):
+        if not self.sonando:
+            self.sonando = True
+            self.actualizar_posicion()
+
+    def actualizar_posicion(self):
+        # Solo lee la posición del motor; el callback de audio no toca la interfaz
+        if self.reproductor.reproduciendo:
+            self.mostrar_posicion(self.reproductor.posicion_s)
+            self.root.after(100, self.actualizar_posicion)
+            return
+        self.sonando = False
+        if self.reproductor.finalizada:
+            self.mostrar_posicion(0.0)
+            self.actualizar_estado("Reproducción finalizada")
 
     def actualizar_estado(self, mensaje):
+        metricas.evento(mensaje)
         self.barra_estado.config(text=mensaje)
         self.root.update_idletasks()
 
-    def mostrar_cargando(self, mensaje):
-        ventana = tk.Toplevel(self.root)
-        ventana.title("Procesando...")
-        ventana.geometry("250x80")
-        ventana.resizable(False, False)
-        tk.Label(ventana, text=mensaje, font=("Segoe UI", 11)).pack(pady=20)
-        ventana.update()
-        return ventana
-
 AudioPlayerApp = AudioPlayerApp
 
@@ -1,9 +1,11 @@
+import sys
 from gui import AudioPlayerApp
 import tkinter as tk
 
 if __name__ == "__main__":
     root = tk.Tk()
-    app = AudioPlayerApp(root)
+    # --sin-precalentar: no importar en segundo plano las dependencias pesadas
+    app = AudioPlayerApp(root, precalentar="--sin-precalentar" not in sys.argv[1:])
     root.mainloop()
 
 
@@ -0,0 +1,232 @@
+import itertools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+DIRECTORIO_METRICAS = "metricas"
+ARCHIVO_EVENTOS = "eventos.jsonl"
+ARCHIVO_PROMETHEUS = "metricas.prom"
+PREFIJO = "tg"
+# Límites superiores (segundos) de los cubos del histograma de latencias
+LIMITES_S = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+INTERVALO_VOLCADO_S = 1.0
+
+
+class Histograma:
+    def __init__(self, limites=LIMITES_S):
+        self.limites = limites
+        self.cuentas = [0] * (len(limites) + 1)
+        self.total = 0
+        self.suma = 0.0
+        self.maximo = 0.0
+        self.errores = 0
+        self.segundos_audio = 0.0
+
+    def agregar(self, duracion, error=False, segundos_audio=None):
+        indice = next((i for i, limite in enumerate(self.limites) if duracion <= limite), len(self.limites))
+        self.cuentas[indice] += 1
+        self.total += 1
+        self.suma += duracion
+        self.maximo = max(self.maximo, duracion)
+        self.errores += bool(error)
+        if segundos_audio:
+            self.segundos_audio += segundos_audio
+
+    def percentil(self, p):
+        # Estimación por cubos (como histogram_quantile): el límite superior del
+        # cubo donde cae el percentil
+        if not self.total:
+            return None
+        objetivo = p / 100 * self.total
+        acumulado = 0
+        for limite, cuenta in zip(self.limites + (self.maximo,), self.cuentas):
+            acumulado += cuenta
+            if acumulado >= objetivo:
+                return min(limite, self.maximo)
+        return self.maximo
+
+
+class Metricas:
+    # Tramos cronometrados por etapa. Cada tramo termina en un histograma de
+    # latencias por etapa y, si hay directorio configurado, en una línea JSON de
+    # eventos.jsonl; metricas.prom se reescribe con los histogramas en formato
+    # de texto de Prometheus. Sin configurar solo se agregan en memoria.
+    def __init__(self, limites=LIMITES_S):
+        self.limites = limites
+        self.directorio = None
+        self.recoger = False
+        self._histogramas = {}
+        self._recogidos = []
+        self._archivo = None
+        self._ultimo_volcado = 0.0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def configurar(self, directorio=DIRECTORIO_METRICAS, recoger=False):
+        # recoger=True guarda los eventos en memoria para entregarlos a otro
+        # proceso (ver fusionar) en lugar de escribirlos
+        self.cerrar()
+        with self._lock:
+            self.directorio = directorio
+            self.recoger = recoger
+            if directorio:
+                os.makedirs(directorio, exist_ok=True)
+                self._archivo = open(os.path.join(directorio, ARCHIVO_EVENTOS), "a", encoding="utf-8")
+
+    @contextmanager
+    def tramo(self, etapa, **atributos):
+        # Los atributos se pueden completar dentro del bloque (p. ej. la longitud
+        # de la pista cuando se acaba de cargar)
+        pila = self._pila()
+        identificador = next(self._ids)
+        padre = pila[-1] if pila else None
+        pila.append(identificador)
+        fecha = time.time()
+        inicio = time.perf_counter()
+        error = None
+        try:
+            yield atributos
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            duracion = time.perf_counter() - inicio
+            pila.pop()
+            self.registrar({
+                "tipo": "tramo",
+                "etapa": etapa,
+                "id": identificador,
+                "padre": padre,
+                "inicio": round(fecha, 6),
+                "duracion_s": round(duracion, 6),
+                "hilo": threading.current_thread().name,
+                "pid": os.getpid(),
+                "error": error,
+                "atributos": _serializable(atributos),
+            })
+
+    def evento(self, mensaje, **atributos):
+        # Sustituye a las líneas de texto libre del antiguo audio_analysis.log
+        self._escribir({"tipo": "evento", "inicio": round(time.time(), 6), "mensaje": mensaje,
+                        "atributos": _serializable(atributos)})
+
+    def registrar(self, registro):
+        atributos = registro.get("atributos") or {}
+        segundos_audio = atributos.get("duracion_audio_s")
+        with self._lock:
+            histograma = self._histogramas.get(registro["etapa"])
+            if histograma is None:
+                histograma = self._histogramas[registro["etapa"]] = Histograma(self.limites)
+            histograma.agregar(registro["duracion_s"], registro.get("error") is not None,
+                               segundos_audio if isinstance(segundos_audio, (int, float)) else None)
+        self._escribir(registro)
+        if self.directorio and time.monotonic() - self._ultimo_volcado >= INTERVALO_VOLCADO_S:
+            self.volcar()
+
+    def fusionar(self, registros):
+        # Tramos medidos en otro proceso (p. ej. trabajadores del lote)
+        for registro in registros:
+            self.registrar(registro)
+
+    def entregar(self):
+        with self._lock:
+            recogidos, self._recogidos = self._recogidos, []
+        return recogidos
+
+    def histogramas(self):
+        with self._lock:
+            return dict(self._histogramas)
+
+    def resumen(self):
+        return {
+            etapa: {
+                "total": h.total,
+                "errores": h.errores,
+                "suma_s": h.suma,
+                "media_s": h.suma / h.total if h.total else None,
+                "p50_s": h.percentil(50),
+                "p95_s": h.percentil(95),
+                "max_s": h.maximo,
+            }
+            for etapa, h in sorted(self.histogramas().items())
+        }
+
+    def texto_prometheus(self):
+        nombre = f"{PREFIJO}_etapa_duracion_segundos"
+        lineas = [f"# HELP {nombre} Duración de cada etapa del procesamiento de audio.",
+                  f"# TYPE {nombre} histogram"]
+        errores = [f"# HELP {PREFIJO}_etapa_errores_total Tramos terminados con excepción.",
+                   f"# TYPE {PREFIJO}_etapa_errores_total counter"]
+        audio = [f"# HELP {PREFIJO}_etapa_audio_segundos_total Segundos de audio procesados por etapa.",
+                 f"# TYPE {PREFIJO}_etapa_audio_segundos_total counter"]
+        for etapa, h in sorted(self.histogramas().items()):
+            acumulado = 0
+            for limite, cuenta in zip(self.limites, h.cuentas):
+                acumulado += cuenta
+                lineas.append(f'{nombre}_bucket{{etapa="{etapa}",le="{limite:g}"}} {acumulado}')
+            lineas.append(f'{nombre}_bucket{{etapa="{etapa}",le="+Inf"}} {h.total}')
+            lineas.append(f'{nombre}_sum{{etapa="{etapa}"}} {h.suma:.6f}')
+            lineas.append(f'{nombre}_count{{etapa="{etapa}"}} {h.total}')
+            errores.append(f'{PREFIJO}_etapa_errores_total{{etapa="{etapa}"}} {h.errores}')
+            audio.append(f'{PREFIJO}_etapa_audio_segundos_total{{etapa="{etapa}"}} {h.segundos_audio:.3f}')
+        return "\n".join(lineas + errores + audio) + "\n"
+
+    def volcar(self):
+        # Reescritura atómica: un lector nunca ve el archivo a medias
+        if not self.directorio or self.recoger:
+            return
+        self._ultimo_volcado = time.monotonic()
+        ruta = os.path.join(self.directorio, ARCHIVO_PROMETHEUS)
+        temporal = f"{ruta}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporal, "w", encoding="utf-8") as archivo:
+            archivo.write(self.texto_prometheus())
+        os.replace(temporal, ruta)
+
+    def cerrar(self):
+        self.volcar()
+        with self._lock:
+            if self._archivo is not None:
+                self._archivo.close()
+                self._archivo = None
+
+    def _escribir(self, registro):
+        with self._lock:
+            if self.recoger:
+                self._recogidos.append(registro)
+            elif self._archivo is not None:
+                self._archivo.write(json.dumps(registro, ensure_ascii=False) + "\n")
+                self._archivo.flush()
+
+    def _pila(self):
+        pila = getattr(self._local, "pila", None)
+        if pila is None:
+            pila = self._local.pila = []
+        return pila
+
+
+def _serializable(atributos):
+    resultado = {}
+    for clave, valor in atributos.items():
+        if hasattr(valor, "item") and getattr(valor, "ndim", None) == 0:
+            valor = valor.item()  # escalares de numpy
+        resultado[clave] = valor if isinstance(valor, (str, int, float, bool, type(None))) else str(valor)
+    return resultado
+
+
+def atributos_pista(audio, sr=None):
+    # Atributos comunes de una pista: longitud en muestras, frecuencia y duración
+    atributos = {"muestras": len(audio)}
+    if sr:
+        atributos["sr"] = sr
+        atributos["duracion_audio_s"] = round(len(audio) / sr, 3)
+    return atributos
+
+
+metricas = Metricas()
+
+
+def tramo(etapa, **atributos):
+    return metricas.tramo(etapa, **atributos)
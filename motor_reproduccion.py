@@ -0,0 +1,181 @@
+import itertools
+
+import numpy as np
+
+from filtro_vivo import TAM_BLOQUE_VIVO
+
+PISTAS_REPRODUCCION = ("original", "voz", "instrumental", "filtrada")
+# Fundido al cambiar de pista, buscar o pausar (~12 ms a 22050 Hz)
+TAM_FUNDIDO = 256
+SILENCIO = -1
+
+
+class MotorReproduccion:
+    # Un único OutputStream que se abre una vez y sigue abierto: las pistas se
+    # cargan por referencia en ranuras fijas y todas comparten la misma posición
+    # en muestras, así que cambiar de pista continúa en la misma muestra. Cada
+    # cambio (pista, búsqueda, pausa) es un fundido entre el estado anterior y el
+    # nuevo con rampas reservadas de antemano; buscar solo cambia un entero. La
+    # interfaz no toca el estado del callback: deja un pedido (versión, pista,
+    # posición) que el callback aplica al principio del siguiente bloque.
+    def __init__(self, tam_bloque=TAM_BLOQUE_VIVO, tam_fundido=TAM_FUNDIDO, filtro=None):
+        self.tam_bloque = tam_bloque
+        self.filtro = filtro
+        self.sr = None
+        self.stream = None
+        self._pistas = [None] * len(PISTAS_REPRODUCCION)
+        self._versiones = itertools.count(1)
+
+        # Fundido de coseno alzado: las dos rampas suman 1 en cada muestra
+        fase = (np.arange(tam_fundido, dtype=np.float64) + 0.5) / tam_fundido
+        self._rampa_sube = np.sin(fase * np.pi / 2).astype(np.float32) ** 2
+        self._rampa_baja = 1 - self._rampa_sube
+        self._auxiliar = np.zeros(tam_bloque, dtype=np.float32)
+
+        # Estado del callback
+        self._pedido = (0, SILENCIO, 0)
+        self._atendido = 0
+        self._final = 0
+        self._pista = SILENCIO
+        self._posicion = 0
+        self._pista_previa = SILENCIO
+        self._posicion_previa = 0
+        self._fundido_restante = 0
+
+        # Estado de la interfaz
+        self._elegida = None
+        self._anterior = None
+
+    def cargar(self, nombre, audio):
+        # Por referencia (también arrays mapeados en disco); None vacía la ranura
+        self._pistas[PISTAS_REPRODUCCION.index(nombre)] = audio
+
+    def pista_cargada(self, nombre):
+        return self._pistas[PISTAS_REPRODUCCION.index(nombre)]
+
+    def abrir(self, sr):
+        # Solo se vuelve a crear el stream si cambia la frecuencia de muestreo
+        if self.stream is not None and self.sr == sr:
+            return
+        import sounddevice as sd
+
+        self.cerrar()
+        self.sr = sr
+        if self.filtro is not None:
+            self.filtro.reiniciar()
+        self.stream = sd.OutputStream(samplerate=sr, channels=1, dtype="float32",
+                                      blocksize=self.tam_bloque, callback=self._callback)
+        self.stream.start()
+
+    def cerrar(self):
+        if self.stream is not None:
+            self.stream.stop()
+            self.stream.close()
+            self.stream = None
+
+    @property
+    def pista(self):
+        return self._elegida
+
+    @property
+    def reproduciendo(self):
+        version, pista, _ = self._pedido
+        return pista != SILENCIO and self._final != version
+
+    @property
+    def finalizada(self):
+        # La última orden de reproducir llegó al final de la pista
+        return self._final == self._pedido[0]
+
+    @property
+    def posicion_s(self):
+        return self._posicion / self.sr if self.sr else 0.0
+
+    def duracion_s(self, nombre=None):
+        nombre = nombre or self._elegida
+        audio = self.pista_cargada(nombre) if nombre else None
+        return len(audio) / self.sr if audio is not None and self.sr else 0.0
+
+    def _pedir(self, pista, posicion=None):
+        # posicion None: la que tenga el callback al atender el pedido
+        self._pedido = (next(self._versiones), pista, posicion)
+
+    def reproducir(self, nombre):
+        if self.pista_cargada(nombre) is None:
+            raise ValueError(f"No hay pista '{nombre}' para reproducir")
+        if nombre != self._elegida:
+            self._anterior = self._elegida
+            self._elegida = nombre
+        self._pedir(PISTAS_REPRODUCCION.index(nombre))
+
+    def ab(self):
+        # Alterna con la pista elegida antes de la actual
+        if self._anterior is None or self.pista_cargada(self._anterior) is None:
+            return None
+        self.reproducir(self._anterior)
+        return self._elegida
+
+    def pausar(self):
+        self._pedir(SILENCIO)
+
+    def reanudar(self):
+        self.reproducir(self._elegida)
+
+    def detener(self):
+        self._pedir(SILENCIO, 0)
+
+    def buscar(self, segundos):
+        _, pista, _ = self._pedido
+        muestra = max(0, int(round(segundos * (self.sr or 0))))
+        self._pedir(pista if self.reproduciendo else SILENCIO, muestra)
+
+    def _callback(self, outdata, frames, time_info, status):
+        self.procesar(outdata[:, 0])
+
+    def _leer(self, pista, posicion, destino):
+        audio = self._pistas[pista] if pista != SILENCIO else None
+        n = 0
+        if audio is not None and posicion < len(audio):
+            n = min(len(destino), len(audio) - posicion)
+            destino[:n] = audio[posicion:posicion + n]
+        destino[n:] = 0
+
+    def procesar(self, salida):
+        # Rellena un bloque de salida sin reservar memoria
+        version, pista, posicion = self._pedido
+        if version != self._atendido:
+            self._atendido = version
+            if posicion is None:
+                posicion = self._posicion
+            if (pista, posicion) != (self._pista, self._posicion):
+                self._pista_previa, self._posicion_previa = self._pista, self._posicion
+                self._pista, self._posicion = pista, posicion
+                self._fundido_restante = len(self._rampa_sube)
+
+        frames = len(salida)
+        self._leer(self._pista, self._posicion, salida)
+        hecho = 0
+        while self._fundido_restante and hecho < frames:
+            k = min(frames - hecho, self._fundido_restante, len(self._auxiliar))
+            desde = len(self._rampa_sube) - self._fundido_restante
+            previa = self._auxiliar[:k]
+            self._leer(self._pista_previa, self._posicion_previa, previa)
+            previa *= self._rampa_baja[desde:desde + k]
+            salida[hecho:hecho + k] *= self._rampa_sube[desde:desde + k]
+            salida[hecho:hecho + k] += previa
+            if self._pista_previa != SILENCIO:
+                self._posicion_previa += k
+            self._fundido_restante -= k
+            hecho += k
+
+        if self._pista != SILENCIO:
+            self._posicion += frames
+            audio = self._pistas[self._pista]
+            if audio is None or self._posicion >= len(audio):
+                # Fin de la pista: queda en silencio al principio
+                self._final = self._atendido
+                self._pista, self._posicion = SILENCIO, 0
+
+        if self.filtro is not None and self.filtro.activo and frames == self.filtro.tam_bloque:
+            self.filtro.procesar(salida)
+        return salida
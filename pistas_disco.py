@@ -0,0 +1,48 @@
+import itertools
+import os
+import shutil
+import tempfile
+import threading
+import numpy as np
+
+from audio_utils import TAM_BLOQUE_DISCO
+
+
+class AlmacenDisco:
+    # Directorio temporal de la sesión donde viven las pistas float32 mapeadas en memoria
+    def __init__(self, directorio=None):
+        self.directorio = directorio or tempfile.mkdtemp(prefix="tg_pistas_")
+        os.makedirs(self.directorio, exist_ok=True)
+        self._contador = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def ruta_nueva(self, nombre="pista"):
+        with self._lock:
+            numero = next(self._contador)
+        return os.path.join(self.directorio, f"{numero:04d}_{nombre}.f32")
+
+    def reservar(self, longitud, nombre="pista"):
+        return np.memmap(self.ruta_nueva(nombre), dtype=np.float32, mode="w+", shape=(max(longitud, 1),))[:longitud]
+
+    def liberar(self, array):
+        # Borra el archivo de un array reservado aquí. Un mapeo abierto sigue siendo
+        # válido hasta que se suelta; donde el sistema no deja borrar un archivo
+        # mapeado, se queda hasta cerrar()
+        ruta = getattr(array, "filename", None)
+        if ruta and os.path.dirname(os.path.abspath(ruta)) == os.path.abspath(self.directorio):
+            try:
+                os.remove(ruta)
+            except OSError:
+                pass
+
+    def copiar(self, audio, nombre="pista", tam_bloque=TAM_BLOQUE_DISCO):
+        if isinstance(audio, np.memmap):
+            return audio
+        destino = self.reservar(len(audio), nombre)
+        for inicio in range(0, len(audio), tam_bloque):
+            destino[inicio:inicio + tam_bloque] = audio[inicio:inicio + tam_bloque]
+        destino.flush()
+        return destino
+
+    def cerrar(self):
+        shutil.rmtree(self.directorio, ignore_errors=True)
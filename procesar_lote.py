@@ -0,0 +1,249 @@
+import argparse
+import glob
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+EXTENSIONES_AUDIO = (".wav", ".mp3", ".flac", ".ogg")
+ARCHIVO_MANIFIESTO = "manifiesto.jsonl"
+ARCHIVO_FALLOS = "fallos.json"
+
+_motor = None
+_cache = None
+
+
+def buscar_archivos(entradas):
+    archivos = []
+    for entrada in entradas:
+        if os.path.isdir(entrada):
+            candidatos = [os.path.join(entrada, nombre) for nombre in os.listdir(entrada)]
+        else:
+            candidatos = glob.glob(entrada, recursive=True)
+        archivos.extend(ruta for ruta in candidatos
+                        if os.path.isfile(ruta) and ruta.lower().endswith(EXTENSIONES_AUDIO))
+    # Sin duplicados y en orden estable para que las reanudaciones sean reproducibles
+    return sorted({os.path.abspath(ruta) for ruta in archivos})
+
+
+def nombre_salida(ruta):
+    base = os.path.splitext(os.path.basename(ruta))[0]
+    sufijo = hashlib.sha1(ruta.encode()).hexdigest()[:8]
+    return f"{base}-{sufijo}"
+
+
+def leer_manifiesto(directorio_salida):
+    completados = {}
+    ruta = os.path.join(directorio_salida, ARCHIVO_MANIFIESTO)
+    if not os.path.exists(ruta):
+        return completados
+    with open(ruta, encoding="utf-8") as manifiesto:
+        for linea in manifiesto:
+            try:
+                registro = json.loads(linea)
+            except json.JSONDecodeError:
+                # Línea a medio escribir por una ejecución interrumpida
+                continue
+            completados[registro["archivo"]] = registro
+    return completados
+
+
+def _inicializar_trabajador(tipo_separador, directorio_cache, precision):
+    global _motor, _cache
+    from audio_utils import establecer_precision
+    from metricas import metricas
+    from separacion import crear_motor
+
+    establecer_precision(precision)
+
+    # Los tramos se devuelven con cada resultado; solo el proceso principal escribe métricas
+    metricas.configurar(None, recoger=True)
+
+    _motor = crear_motor(tipo_separador)
+    _motor.cargar()
+    if directorio_cache:
+        from cache_pistas import CachePistas
+        _cache = CachePistas(directorio_cache)
+
+
+def procesar_archivo(ruta, directorio_salida, sr, umbral, formato="wav"):
+    from audio_utils import aplicar_fft, cargar_audio, guardar_pistas, obtener_nota_predominante, separar_pistas
+    from visuals import guardar_espectrograma
+
+    inicio = time.perf_counter()
+    destino = os.path.join(directorio_salida, nombre_salida(ruta))
+    os.makedirs(destino, exist_ok=True)
+
+    audio, sr = cargar_audio(ruta, sr=sr)
+    voz, instrumental = separar_pistas(audio, sr, motor=_motor, cache=_cache)
+    voz_fft = aplicar_fft(voz, umbral)
+    instrumental_fft = aplicar_fft(instrumental, umbral)
+
+    pistas = {
+        "voz": voz,
+        "instrumental": instrumental,
+        "voz_fft": voz_fft,
+        "instrumental_fft": instrumental_fft,
+    }
+    guardar_pistas([(pista, os.path.join(destino, f"{nombre}.{formato}")) for nombre, pista in pistas.items()], sr)
+
+    guardar_espectrograma(audio, sr, "Original", os.path.join(destino, "espectrograma_original.png"))
+    guardar_espectrograma(voz_fft, sr, "Voz - FFT Aplicada", os.path.join(destino, "espectrograma_voz_fft.png"))
+    guardar_espectrograma(instrumental_fft, sr, "Instrumental - FFT Aplicada",
+                          os.path.join(destino, "espectrograma_instrumental_fft.png"))
+
+    return {
+        "salida": destino,
+        "nota": obtener_nota_predominante(voz_fft, sr),
+        "duracion_audio_s": len(audio) / sr,
+        "tiempo_s": time.perf_counter() - inicio,
+    }
+
+
+def _procesar_seguro(ruta, directorio_salida, sr, umbral, formato):
+    from metricas import metricas
+
+    try:
+        resultado = {"estado": "ok", **procesar_archivo(ruta, directorio_salida, sr, umbral, formato)}
+    except Exception as e:
+        resultado = {"estado": "error", "error": str(e), "traza": traceback.format_exc()}
+    return resultado, metricas.entregar()
+
+
+def _crear_pool(trabajadores, separador, directorio_cache, precision):
+    return ProcessPoolExecutor(max_workers=trabajadores, mp_context=multiprocessing.get_context("spawn"),
+                               initializer=_inicializar_trabajador,
+                               initargs=(separador, directorio_cache, precision))
+
+
+def _resultado(futuro):
+    # Devuelve (resultado, trabajador_muerto)
+    from metricas import metricas
+
+    try:
+        resultado, tramos = futuro.result()
+    except BrokenProcessPool as e:
+        return {"estado": "error", "error": f"El proceso trabajador terminó de forma inesperada: {e}"}, True
+    metricas.fusionar(tramos)
+    return resultado, False
+
+
+def procesar_lote(archivos, directorio_salida, trabajadores=1, sr=22050, umbral=15,
+                  separador="demucs", directorio_cache=None, reintentar_fallos=False,
+                  directorio_metricas=None, precision="float32", formato="wav"):
+    from metricas import metricas
+
+    os.makedirs(directorio_salida, exist_ok=True)
+    metricas.configurar(directorio_metricas or os.path.join(directorio_salida, "metricas"))
+    previos = leer_manifiesto(directorio_salida)
+    pendientes = [ruta for ruta in archivos
+                  if ruta not in previos
+                  or (reintentar_fallos and previos[ruta]["estado"] != "ok")]
+    print(f"{len(archivos)} archivos, {len(archivos) - len(pendientes)} ya procesados, "
+          f"{len(pendientes)} pendientes")
+
+    fallos = {ruta: registro for ruta, registro in previos.items()
+              if registro["estado"] != "ok" and ruta not in pendientes}
+    ruta_manifiesto = os.path.join(directorio_salida, ARCHIVO_MANIFIESTO)
+
+    def registrar(ruta, resultado):
+        registro = {"archivo": ruta, "fecha": time.strftime("%Y-%m-%d %H:%M:%S"), **resultado}
+        # Solo el proceso principal escribe el manifiesto, línea a línea
+        manifiesto.write(json.dumps(registro, ensure_ascii=False) + "\n")
+        manifiesto.flush()
+        if registro["estado"] == "ok":
+            fallos.pop(ruta, None)
+        else:
+            fallos[ruta] = registro
+        print(f"[{len(pendientes) - len(cola) - len(en_curso)}/{len(pendientes)}] "
+              f"{registro['estado']}: {os.path.basename(ruta)}")
+
+    cola = list(reversed(pendientes))
+    en_curso = {}
+    pool = None
+    manifiesto = open(ruta_manifiesto, "a", encoding="utf-8")
+    try:
+        while cola or en_curso:
+            if pool is None:
+                pool = _crear_pool(trabajadores, separador, directorio_cache, precision)
+            # Como mucho un archivo en curso por trabajador: si uno muere se sabe
+            # qué archivos se perdieron con él
+            roto = False
+            try:
+                while cola and len(en_curso) < trabajadores:
+                    ruta = cola[-1]
+                    en_curso[pool.submit(_procesar_seguro, ruta, directorio_salida, sr, umbral, formato)] = ruta
+                    # Se saca de la cola solo si el pool lo aceptó
+                    cola.pop()
+            except BrokenProcessPool:
+                roto = True
+            else:
+                listos, _ = wait(en_curso, return_when=FIRST_COMPLETED)
+                for futuro in listos:
+                    resultado, trabajador_muerto = _resultado(futuro)
+                    roto |= trabajador_muerto
+                    registrar(en_curso.pop(futuro), resultado)
+            if roto:
+                # Un trabajador murió (sin memoria, fallo de un decodificador nativo...)
+                # y el pool quedó inservible: los archivos que seguían en curso se
+                # anotan como fallidos (--reintentar-fallos los repite) y el resto
+                # sigue en un pool nuevo
+                for futuro in wait(en_curso).done:
+                    registrar(en_curso.pop(futuro), _resultado(futuro)[0])
+                pool.shutdown()
+                pool = None
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+        manifiesto.close()
+        with open(os.path.join(directorio_salida, ARCHIVO_FALLOS), "w", encoding="utf-8") as informe:
+            json.dump(list(fallos.values()), informe, ensure_ascii=False, indent=2)
+        metricas.cerrar()
+
+    resumen = metricas.resumen()
+    if resumen:
+        print("Tiempo por etapa (total / p50 / p95):")
+        for etapa, datos in resumen.items():
+            print(f"  {etapa:18s} {datos['suma_s']:9.2f} s  {datos['p50_s']:8.3f} s  {datos['p95_s']:8.3f} s")
+    return fallos
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Procesamiento por lotes sin interfaz gráfica")
+    parser.add_argument("entradas", nargs="+", help="Directorios o patrones glob de archivos de audio")
+    parser.add_argument("-o", "--salida", default="salida_lote", help="Directorio de resultados")
+    parser.add_argument("-j", "--trabajadores", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument("--sr", type=int, default=22050)
+    parser.add_argument("--umbral", type=float, default=15, help="Umbral FFT (%%)")
+    parser.add_argument("--separador", default="demucs", choices=["demucs", "simulado"])
+    parser.add_argument("--cache", default=None, help="Directorio de caché de pistas separadas")
+    parser.add_argument("--reintentar-fallos", action="store_true")
+    parser.add_argument("--metricas", default=None,
+                        help="Directorio de métricas (por defecto <salida>/metricas)")
+    parser.add_argument("--precision", default="float32", choices=["float32", "float64"],
+                        help="Precisión de trabajo del filtro FFT, la STFT y la exportación")
+    parser.add_argument("--formato", default="wav", choices=["wav", "flac", "ogg"],
+                        help="Formato de las pistas exportadas")
+    args = parser.parse_args(argv)
+
+    archivos = buscar_archivos(args.entradas)
+    if not archivos:
+        print("No se encontraron archivos de audio")
+        return 1
+
+    fallos = procesar_lote(archivos, args.salida, args.trabajadores, args.sr, args.umbral,
+                           args.separador, args.cache, args.reintentar_fallos, args.metricas,
+                           args.precision, args.formato)
+    if fallos:
+        print(f"{len(fallos)} archivos fallaron, ver {os.path.join(args.salida, ARCHIVO_FALLOS)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,185 @@
+import os
+import struct
+import unicodedata
+import zlib
+import numpy as np
+
+from metricas import tramo
+
+# Paleta 'plasma' (10 paradas) interpolada a 256 colores
+PARADAS_PLASMA = ["#0d0887", "#46039f", "#7201a8", "#9c179e", "#bd3786",
+                  "#d8576b", "#ed7953", "#fb9f3a", "#fdca26", "#f0f921"]
+
+FMIN_LOG = 20.0
+ESCALA_TEXTO = 2
+BLANCO = (255, 255, 255)
+NEGRO = (0, 0, 0)
+
+# Fuente de mapa de bits de 3x5 píxeles (solo mayúsculas, dígitos y algunos signos)
+FUENTE = {
+    "0": ("###", "#.#", "#.#", "#.#", "###"), "1": (".#.", "##.", ".#.", ".#.", "###"),
+    "2": ("###", "..#", "###", "#..", "###"), "3": ("###", "..#", "###", "..#", "###"),
+    "4": ("#.#", "#.#", "###", "..#", "..#"), "5": ("###", "#..", "###", "..#", "###"),
+    "6": ("###", "#..", "###", "#.#", "###"), "7": ("###", "..#", "..#", "..#", "..#"),
+    "8": ("###", "#.#", "###", "#.#", "###"), "9": ("###", "#.#", "###", "..#", "###"),
+    "A": (".#.", "#.#", "###", "#.#", "#.#"), "B": ("##.", "#.#", "##.", "#.#", "##."),
+    "C": (".##", "#..", "#..", "#..", ".##"), "D": ("##.", "#.#", "#.#", "#.#", "##."),
+    "E": ("###", "#..", "##.", "#..", "###"), "F": ("###", "#..", "##.", "#..", "#.."),
+    "G": (".##", "#..", "#.#", "#.#", ".##"), "H": ("#.#", "#.#", "###", "#.#", "#.#"),
+    "I": ("###", ".#.", ".#.", ".#.", "###"), "J": ("..#", "..#", "..#", "#.#", ".#."),
+    "K": ("#.#", "#.#", "##.", "#.#", "#.#"), "L": ("#..", "#..", "#..", "#..", "###"),
+    "M": ("#.#", "###", "###", "#.#", "#.#"), "N": ("##.", "#.#", "#.#", "#.#", "#.#"),
+    "O": (".#.", "#.#", "#.#", "#.#", ".#."), "P": ("##.", "#.#", "##.", "#..", "#.."),
+    "Q": (".#.", "#.#", "#.#", "##.", ".##"), "R": ("##.", "#.#", "##.", "#.#", "#.#"),
+    "S": (".##", "#..", ".#.", "..#", "##."), "T": ("###", ".#.", ".#.", ".#.", ".#."),
+    "U": ("#.#", "#.#", "#.#", "#.#", "###"), "V": ("#.#", "#.#", "#.#", "#.#", ".#."),
+    "W": ("#.#", "#.#", "###", "###", "#.#"), "X": ("#.#", "#.#", ".#.", "#.#", "#.#"),
+    "Y": ("#.#", "#.#", ".#.", ".#.", ".#."), "Z": ("###", "..#", ".#.", "#..", "###"),
+    " ": ("...", "...", "...", "...", "..."), ".": ("...", "...", "...", "...", ".#."),
+    "-": ("...", "...", "###", "...", "..."), "+": ("...", ".#.", "###", ".#.", "..."),
+    ":": ("...", ".#.", "...", ".#.", "..."), "/": ("..#", "..#", ".#.", "#..", "#.."),
+    "(": ("..#", ".#.", ".#.", ".#.", "..#"), ")": ("#..", ".#.", ".#.", ".#.", "#.."),
+    "%": ("#.#", "..#", ".#.", "#..", "#.#"), "#": ("#.#", "###", "#.#", "###", "#.#"),
+}
+_GLIFOS = {caracter: np.array([[c == "#" for c in fila] for fila in filas])
+           for caracter, filas in FUENTE.items()}
+
+
+def construir_lut(paradas=PARADAS_PLASMA, n=256):
+    colores = np.array([[int(c[i:i + 2], 16) for i in (1, 3, 5)] for c in paradas], dtype=np.float64)
+    posiciones = np.linspace(0, 1, len(paradas))
+    x = np.linspace(0, 1, n)
+    return np.stack([np.interp(x, posiciones, colores[:, canal]) for canal in range(3)], axis=1).round().astype(np.uint8)
+
+
+LUT_PLASMA = construir_lut()
+
+
+def filas_log(n_bins, sr, alto, fmin=FMIN_LOG):
+    # Bin de frecuencia que corresponde a cada fila (de arriba abajo) en escala logarítmica
+    n_fft = 2 * (n_bins - 1)
+    frecuencias = np.geomspace(sr / 2, max(fmin, sr / n_fft), alto)
+    return np.clip(np.round(frecuencias * n_fft / sr).astype(int), 0, n_bins - 1)
+
+
+def rasterizar(D, sr, ancho, alto, rango_db=80.0, lut=LUT_PLASMA):
+    # Solo se muestrean las filas y columnas que caben en la imagen antes de mapear colores
+    columnas = np.minimum(((np.arange(ancho) + 0.5) * D.shape[1] / ancho).astype(int), D.shape[1] - 1)
+    muestra = D[filas_log(D.shape[0], sr, alto)][:, columnas]
+    maximo = float(D.max()) if D.size else 0.0
+    indices = np.clip((muestra - (maximo - rango_db)) * (255.0 / rango_db), 0, 255).astype(np.uint8)
+    return lut[indices]
+
+
+def ancho_texto(texto, escala=ESCALA_TEXTO):
+    return len(texto) * 4 * escala - escala
+
+
+def dibujar_texto(imagen, x, y, texto, color=NEGRO, escala=ESCALA_TEXTO):
+    texto = unicodedata.normalize("NFKD", texto).encode("ascii", "ignore").decode().upper()
+    for caracter in texto:
+        glifo = _GLIFOS.get(caracter, _GLIFOS[" "])
+        mascara = np.kron(glifo, np.ones((escala, escala), dtype=bool))
+        alto, ancho = mascara.shape
+        y0, x0 = max(y, 0), max(x, 0)
+        y1, x1 = min(y + alto, imagen.shape[0]), min(x + ancho, imagen.shape[1])
+        if y1 > y0 and x1 > x0:
+            imagen[y0:y1, x0:x1][mascara[y0 - y:y1 - y, x0 - x:x1 - x]] = color
+        x += 4 * escala
+
+
+def _marcas_tiempo(duracion, n=6):
+    if duracion <= 0:
+        return [0.0]
+    paso_bruto = duracion / n
+    magnitud = 10 ** np.floor(np.log10(paso_bruto))
+    paso = min((m * magnitud for m in (1, 2, 5, 10) if m * magnitud >= paso_bruto), default=paso_bruto)
+    return list(np.arange(0, duracion + paso * 1e-9, paso))
+
+
+def _formato_hz(frecuencia):
+    return f"{frecuencia / 1000:g}K" if frecuencia >= 1000 else f"{frecuencia:g}"
+
+
+def renderizar_espectrograma(D, sr, hop_length, titulo=None, ancho=1200, alto=400,
+                             rango_db=80.0, ejes=True, lut=LUT_PLASMA):
+    with tramo("render", motor="raster", ancho=ancho, alto=alto, columnas=D.shape[1], sr=sr):
+        if not ejes:
+            return rasterizar(D, sr, ancho, alto, rango_db, lut)
+
+        izq, der, inf, sup = 56, 64, 26, (26 if titulo else 8)
+        area_ancho, area_alto = ancho - izq - der, alto - sup - inf
+        imagen = np.full((alto, ancho, 3), 255, dtype=np.uint8)
+        imagen[sup:sup + area_alto, izq:izq + area_ancho] = rasterizar(D, sr, area_ancho, area_alto, rango_db, lut)
+
+        if titulo:
+            dibujar_texto(imagen, (ancho - ancho_texto(titulo)) // 2, 8, titulo)
+
+        # Eje de tiempo
+        duracion = D.shape[1] * hop_length / sr
+        for segundo in _marcas_tiempo(duracion):
+            x = izq + int(round(segundo / duracion * (area_ancho - 1))) if duracion else izq
+            imagen[sup + area_alto:sup + area_alto + 4, x] = NEGRO
+            etiqueta = f"{segundo:g}"
+            dibujar_texto(imagen, x - ancho_texto(etiqueta) // 2, sup + area_alto + 7, etiqueta)
+        dibujar_texto(imagen, 4, sup + area_alto + 7, "S")
+
+        # Eje de frecuencia (logarítmico)
+        n_fft = 2 * (D.shape[0] - 1)
+        fmin, fmax = max(FMIN_LOG, sr / n_fft), sr / 2
+        for frecuencia in (50, 100, 200, 500, 1000, 2000, 5000, 10000, 20000):
+            if not fmin <= frecuencia <= fmax:
+                continue
+            y = sup + int(round(np.log(fmax / frecuencia) / np.log(fmax / fmin) * (area_alto - 1)))
+            imagen[y, izq - 4:izq] = NEGRO
+            etiqueta = _formato_hz(frecuencia)
+            dibujar_texto(imagen, izq - 7 - ancho_texto(etiqueta), y - 5, etiqueta)
+        dibujar_texto(imagen, 4, sup, "HZ")
+
+        # Barra de color
+        x0 = izq + area_ancho + 10
+        gradiente = np.linspace(255, 0, area_alto).astype(np.uint8)
+        imagen[sup:sup + area_alto, x0:x0 + 12] = lut[gradiente][:, None, :]
+        dibujar_texto(imagen, x0 + 16, sup, "0")
+        dibujar_texto(imagen, x0 + 16, sup + area_alto - 10, f"-{rango_db:g}")
+        dibujar_texto(imagen, x0 + 16, sup + area_alto // 2 - 5, "DB")
+
+        # Marco
+        imagen[sup - 1, izq - 1:izq + area_ancho + 1] = NEGRO
+        imagen[sup + area_alto, izq - 1:izq + area_ancho + 1] = NEGRO
+        imagen[sup - 1:sup + area_alto + 1, izq - 1] = NEGRO
+        imagen[sup - 1:sup + area_alto + 1, izq + area_ancho] = NEGRO
+        return imagen
+
+
+def apilar(imagenes):
+    return np.concatenate(imagenes, axis=0)
+
+
+def codificar_png(imagen):
+    alto, ancho, _ = imagen.shape
+    crudo = np.zeros((alto, ancho * 3 + 1), dtype=np.uint8)
+    crudo[:, 1:] = imagen.reshape(alto, -1)
+
+    def bloque(tipo, contenido):
+        return (struct.pack(">I", len(contenido)) + tipo + contenido
+                + struct.pack(">I", zlib.crc32(tipo + contenido) & 0xFFFFFFFF))
+
+    return (b"\x89PNG\r\n\x1a\n"
+            + bloque(b"IHDR", struct.pack(">IIBBBBB", ancho, alto, 8, 2, 0, 0, 0))
+            + bloque(b"IDAT", zlib.compress(crudo.tobytes(), 6))
+            + bloque(b"IEND", b""))
+
+
+def guardar_imagen(imagen, ruta_guardado, calidad=90):
+    # Sin estado global: se puede llamar desde varios hilos o procesos a la vez
+    extension = os.path.splitext(ruta_guardado)[1].lower()
+    with tramo("exportacion", formato=extension, ancho=imagen.shape[1], alto=imagen.shape[0]):
+        if extension == ".png":
+            with open(ruta_guardado, "wb") as archivo:
+                archivo.write(codificar_png(imagen))
+        elif extension in (".jpg", ".jpeg"):
+            from PIL import Image
+            Image.fromarray(imagen).save(ruta_guardado, quality=calidad)
+        else:
+            raise ValueError(f"Formato de imagen no soportado: {extension}")
@@ -0,0 +1,297 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+
+SEGMENTO_S = 60.0
+SOLAPE_SEGMENTO_S = 5.0
+
+
+class MotorDemucs:
+    def __init__(self, nombre_modelo="htdemucs", dispositivo=None, desplazamientos=1, solape=0.25):
+        self.nombre_modelo = nombre_modelo
+        self.dispositivo = dispositivo
+        self.desplazamientos = desplazamientos
+        self.solape = solape
+        self._modelo = None
+        self._lock = threading.Lock()
+
+    def parametros(self):
+        return {
+            "motor": "demucs",
+            "modelo": self.nombre_modelo,
+            "two_stems": "vocals",
+            "shifts": self.desplazamientos,
+            "overlap": self.solape,
+        }
+
+    def cargar(self):
+        # El modelo se carga una sola vez y queda residente entre llamadas
+        with self._lock:
+            if self._modelo is None:
+                import torch
+                from demucs.pretrained import get_model
+
+                if self.dispositivo is None:
+                    self.dispositivo = "cuda" if torch.cuda.is_available() else "cpu"
+                modelo = get_model(self.nombre_modelo)
+                modelo.to(self.dispositivo)
+                modelo.eval()
+                self._modelo = modelo
+        return self._modelo
+
+    def separar(self, audio, sr, progreso=None):
+        import torch
+        from demucs.apply import apply_model
+        from demucs.audio import convert_audio
+
+        modelo = self.cargar()
+        mezcla = torch.from_numpy(np.ascontiguousarray(audio, dtype=np.float32))[None]
+        mezcla = convert_audio(mezcla, sr, modelo.samplerate, modelo.audio_channels)
+
+        # Misma normalización que aplica la CLI de demucs
+        referencia = mezcla.mean(0)
+        media, desviacion = referencia.mean(), referencia.std()
+        if desviacion == 0:
+            silencio = np.zeros(len(audio), dtype=np.float32)
+            return silencio, silencio.copy()
+        mezcla = (mezcla - media) / desviacion
+
+        with torch.no_grad():
+            fuentes = apply_model(modelo, mezcla[None], device=self.dispositivo,
+                                  shifts=self.desplazamientos, split=True,
+                                  overlap=self.solape, progress=False)[0]
+        fuentes = fuentes * desviacion + media
+
+        if progreso is not None:
+            progreso(1, 1)
+
+        indice_voz = modelo.sources.index("vocals")
+        voz = fuentes[indice_voz]
+        instrumental = fuentes.sum(0) - voz
+
+        return self._a_mono(voz, modelo.samplerate, sr, len(audio)), \
+            self._a_mono(instrumental, modelo.samplerate, sr, len(audio))
+
+    @staticmethod
+    def _a_mono(pista, sr_modelo, sr, longitud):
+        from demucs.audio import convert_audio
+
+        pista = convert_audio(pista.cpu(), sr_modelo, sr, 1)[0].numpy()
+        # El remuestreo puede variar la longitud en una o dos muestras
+        salida = np.zeros(longitud, dtype=np.float32)
+        n = min(longitud, len(pista))
+        salida[:n] = pista[:n]
+        return salida
+
+
+class MotorSimulado:
+    # Sustituto local sin pesos: parte el espectro en una banda "vocal" y el resto.
+    # La suma de ambas pistas reconstruye exactamente la mezcla.
+    def __init__(self, fmin=300.0, fmax=3400.0):
+        self.fmin = fmin
+        self.fmax = fmax
+
+    def parametros(self):
+        return {"motor": "simulado", "fmin": self.fmin, "fmax": self.fmax}
+
+    def cargar(self):
+        return self
+
+    def separar(self, audio, sr, progreso=None):
+        audio = np.asarray(audio, dtype=np.float32)
+        espectro = np.fft.rfft(audio)
+        frecuencias = np.fft.rfftfreq(len(audio), d=1.0 / sr)
+        espectro[(frecuencias < self.fmin) | (frecuencias > self.fmax)] = 0
+        voz = np.fft.irfft(espectro, n=len(audio)).astype(np.float32)
+        if progreso is not None:
+            progreso(1, 1)
+        return voz, audio - voz
+
+
+class MotorPuntual:
+    # Sustituto sin memoria: cada muestra se reparte en una proporción fija. Como
+    # no depende de sus vecinas, separar por segmentos tiene que dar lo mismo que
+    # separar de una vez; sirve para comprobar el cosido de MotorSegmentado.
+    def __init__(self, proporcion=0.5):
+        self.proporcion = proporcion
+
+    def parametros(self):
+        return {"motor": "puntual", "proporcion": self.proporcion}
+
+    def cargar(self):
+        return self
+
+    def separar(self, audio, sr, progreso=None):
+        audio = np.asarray(audio, dtype=np.float32)
+        voz = audio * np.float32(self.proporcion)
+        if progreso is not None:
+            progreso(1, 1)
+        return voz, audio - voz
+
+
+def planificar_segmentos(longitud, tam_segmento, solape):
+    # (inicio, fin) de cada segmento; dos consecutivos comparten `solape` muestras
+    # y ninguno es más corto que el solape
+    if longitud <= tam_segmento:
+        return [(0, longitud)]
+    paso = tam_segmento - solape
+    return [(inicio, min(inicio + tam_segmento, longitud))
+            for inicio in range(0, longitud - solape, paso)]
+
+
+def rampas_fundido(solape):
+    # Entrada sin² y salida cos²: suman exactamente 1 en cada muestra del solape
+    t = (np.arange(solape, dtype=np.float64) + 0.5) / solape
+    entrada = np.sin(np.pi / 2 * t) ** 2
+    return entrada.astype(np.float32), (1 - entrada).astype(np.float32)
+
+
+_motor_segmento = None
+
+
+def _inicializar_segmentador(tipo, opciones, hilos):
+    global _motor_segmento
+    from metricas import metricas
+
+    # Que N procesos no peleen por los núcleos. Con spawn, numpy ya está cargado
+    # aquí (lo importan este módulo y el __main__ que se repite en el proceso),
+    # así que las variables solo llegan a lo que se carga después, como torch en
+    # cargar(); el BLAS de numpy se limita en caliente con threadpoolctl
+    for variable in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[variable] = str(hilos)
+    try:
+        from threadpoolctl import threadpool_limits
+    except ImportError:
+        pass
+    else:
+        threadpool_limits(hilos)
+    metricas.configurar(None, recoger=True)
+    _motor_segmento = crear_motor(tipo, **opciones)
+    _motor_segmento.cargar()
+
+
+def _separar_segmento(indice, segmento, sr):
+    from metricas import metricas, tramo
+
+    with tramo("segmento", indice=indice, muestras=len(segmento)):
+        voz, instrumental = _motor_segmento.separar(segmento, sr)
+    return indice, voz, instrumental, metricas.entregar()
+
+
+class MotorSegmentado:
+    # Separa pistas largas por segmentos solapados repartidos en un pool de
+    # procesos, cada uno con su propio modelo cargado. Los segmentos se cosen con
+    # fundidos complementarios en el solape. Solo hay unos pocos segmentos en
+    # vuelo a la vez, así que la memoria no crece con la duración de la pista
+    # más allá de las dos pistas de salida.
+    def __init__(self, tipo="demucs", trabajadores=None, segmento_s=SEGMENTO_S,
+                 solape_s=SOLAPE_SEGMENTO_S, **opciones):
+        if solape_s <= 0 or solape_s * 2 > segmento_s:
+            raise ValueError("El solape debe ser positivo y como mucho la mitad del segmento")
+        self.tipo = tipo
+        self.trabajadores = trabajadores or os.cpu_count() or 1
+        self.segmento_s = segmento_s
+        self.solape_s = solape_s
+        self.opciones = opciones
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def parametros(self):
+        return {
+            "motor": "segmentado",
+            "base": crear_motor(self.tipo, **self.opciones).parametros(),
+            "segmento_s": self.segmento_s,
+            "solape_s": self.solape_s,
+        }
+
+    def cargar(self):
+        # El pool (y el modelo de cada proceso) queda vivo entre separaciones
+        with self._lock:
+            if self._pool is None:
+                hilos = max(1, (os.cpu_count() or 1) // self.trabajadores)
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.trabajadores, mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_inicializar_segmentador, initargs=(self.tipo, self.opciones, hilos))
+        return self._pool
+
+    def cerrar(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(cancel_futures=True)
+                self._pool = None
+
+    def separar(self, audio, sr, progreso=None):
+        from metricas import metricas
+
+        audio = np.asarray(audio, dtype=np.float32)
+        solape = max(1, int(round(self.solape_s * sr)))
+        segmentos = planificar_segmentos(len(audio), int(round(self.segmento_s * sr)), solape)
+        entrada, salida = rampas_fundido(solape)
+        voz = np.zeros(len(audio), dtype=np.float32)
+        instrumental = np.zeros(len(audio), dtype=np.float32)
+
+        pool = self.cargar()
+        pendientes = iter(enumerate(segmentos))
+        en_vuelo = set()
+        hechos = 0
+        try:
+            while True:
+                # Dos segmentos por proceso: ninguno espera y la memoria queda acotada
+                for indice, (inicio, fin) in pendientes:
+                    en_vuelo.add(pool.submit(_separar_segmento, indice, audio[inicio:fin], sr))
+                    if len(en_vuelo) >= 2 * self.trabajadores:
+                        break
+                if not en_vuelo:
+                    break
+                terminados, en_vuelo = wait(en_vuelo, return_when=FIRST_COMPLETED)
+                for futuro in terminados:
+                    indice, voz_segmento, instrumental_segmento, tramos = futuro.result()
+                    metricas.fusionar(tramos)
+                    inicio, fin = segmentos[indice]
+                    for pista, parte in ((voz_segmento, voz), (instrumental_segmento, instrumental)):
+                        if indice > 0:
+                            pista[:solape] *= entrada
+                        if indice < len(segmentos) - 1:
+                            pista[-solape:] *= salida
+                        parte[inicio:fin] += pista
+                    hechos += 1
+                    if progreso is not None:
+                        progreso(hechos, len(segmentos))
+        except BaseException:
+            for futuro in en_vuelo:
+                futuro.cancel()
+            raise
+        return voz, instrumental
+
+
+MOTORES = {
+    "demucs": MotorDemucs,
+    "simulado": MotorSimulado,
+    "puntual": MotorPuntual,
+}
+
+_motor_actual = None
+_lock_motor = threading.Lock()
+
+
+def crear_motor(tipo="demucs", **opciones):
+    if tipo not in MOTORES:
+        raise ValueError(f"Motor de separación desconocido: {tipo}")
+    return MOTORES[tipo](**opciones)
+
+
+def obtener_motor():
+    global _motor_actual
+    with _lock_motor:
+        if _motor_actual is None:
+            _motor_actual = crear_motor()
+        return _motor_actual
+
+
+def establecer_motor(motor):
+    global _motor_actual
+    with _lock_motor:
+        _motor_actual = motor
@@ -0,0 +1,333 @@
+import argparse
+import json
+import multiprocessing
+import os
+import re
+import shutil
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from procesar_lote import EXTENSIONES_AUDIO, _inicializar_trabajador, _procesar_seguro
+
+DIRECTORIO_TRABAJOS = "trabajos_servidor"
+PUERTO = 8765
+MAX_COLA = 8
+MAX_BYTES_SUBIDA = 1024 ** 3
+TAM_TROZO_SUBIDA = 1 << 20
+# Segundos que se sugieren al cliente (Retry-After) cuando la cola está llena
+REINTENTAR_S = 5
+FORMATOS = ("wav", "flac", "ogg")
+_RUTA_TRABAJO = re.compile(r"^/trabajos/([0-9a-f]{32})(?:/([^/]+))?$")
+
+
+class ColaLlena(Exception):
+    pass
+
+
+class ServicioNoDisponible(Exception):
+    pass
+
+
+class Trabajo:
+    def __init__(self, identificador, directorio, nombre, umbral, formato):
+        self.id = identificador
+        self.directorio = directorio
+        self.nombre = nombre
+        self.umbral = umbral
+        self.formato = formato
+        self.creado = time.time()
+        self.futuro = None
+        self.resultado = None
+
+    @property
+    def estado(self):
+        if self.resultado is not None:
+            return self.resultado["estado"]
+        if self.futuro is not None and self.futuro.running():
+            return "procesando"
+        return "en_cola"
+
+    def descripcion(self):
+        descripcion = {"id": self.id, "estado": self.estado, "nombre": self.nombre,
+                       "umbral": self.umbral, "formato": self.formato, "creado": self.creado}
+        if self.resultado is not None:
+            descripcion.update({clave: valor for clave, valor in self.resultado.items()
+                                if clave not in ("estado", "salida", "traza")})
+            if self.resultado["estado"] == "ok":
+                descripcion["archivos"] = sorted(os.listdir(self.resultado["salida"]))
+        return descripcion
+
+
+class ServidorTrabajos:
+    # Cola acotada de trabajos sobre el mismo pool que procesar_lote: cada
+    # proceso carga el separador una vez y lo reutiliza entre trabajos. Si ya hay
+    # max_cola trabajos sin terminar, enviar() rechaza el nuevo en lugar de
+    # acumularlo (el cliente recibe 503 con Retry-After).
+    def __init__(self, directorio=DIRECTORIO_TRABAJOS, trabajadores=1, max_cola=MAX_COLA, sr=22050,
+                 separador="demucs", directorio_cache=None, precision="float32"):
+        from metricas import metricas
+
+        self.directorio = directorio
+        self.trabajadores = trabajadores
+        self.max_cola = max_cola
+        self.sr = sr
+        self._trabajos = {}
+        self._pendientes = 0
+        self._lock = threading.Lock()
+        os.makedirs(directorio, exist_ok=True)
+        metricas.configurar(os.path.join(directorio, "metricas"))
+        self._inicializacion = (separador, directorio_cache, precision)
+        self._pool = self._crear_pool()
+
+    def _crear_pool(self):
+        return ProcessPoolExecutor(max_workers=self.trabajadores, mp_context=multiprocessing.get_context("spawn"),
+                                   initializer=_inicializar_trabajador, initargs=self._inicializacion)
+
+    def _renovar_pool(self, roto):
+        # Un proceso que muere (p. ej. sin memoria) deja el pool inservible para
+        # siempre: se sustituye por uno nuevo. El roto ya terminó sus procesos.
+        with self._lock:
+            if self._pool is roto:
+                self._pool = self._crear_pool()
+
+    def reservar(self, nombre, umbral, formato):
+        # Ocupa un hueco de la cola antes de recibir el audio: si no hay sitio
+        # no se llega a leer la subida
+        extension = os.path.splitext(nombre)[1].lower()
+        if extension not in EXTENSIONES_AUDIO:
+            raise ValueError(f"Formato de audio no soportado: {extension or nombre}")
+        if formato not in FORMATOS:
+            raise ValueError(f"Formato de salida no soportado: {formato}")
+        with self._lock:
+            if self._pendientes >= self.max_cola:
+                raise ColaLlena(f"Cola llena ({self.max_cola} trabajos pendientes)")
+            self._pendientes += 1
+        identificador = uuid.uuid4().hex
+        trabajo = Trabajo(identificador, os.path.join(self.directorio, identificador),
+                          os.path.basename(nombre), umbral, formato)
+        os.makedirs(trabajo.directorio)
+        return trabajo
+
+    def liberar(self, trabajo):
+        # La subida falló: se devuelve el hueco
+        with self._lock:
+            self._pendientes -= 1
+        shutil.rmtree(trabajo.directorio, ignore_errors=True)
+
+    def ruta_entrada(self, trabajo):
+        return os.path.join(trabajo.directorio, f"entrada{os.path.splitext(trabajo.nombre)[1].lower()}")
+
+    def enviar(self, trabajo):
+        with self._lock:
+            pool = self._pool
+        try:
+            trabajo.futuro = pool.submit(_procesar_seguro, self.ruta_entrada(trabajo), trabajo.directorio,
+                                         self.sr, trabajo.umbral, trabajo.formato)
+        except (BrokenProcessPool, RuntimeError) as e:
+            # Sin esto el hueco reservado no se devolvería nunca y, tras max_cola
+            # fallos, el servicio respondería 503 para siempre
+            self.liberar(trabajo)
+            if isinstance(e, BrokenProcessPool):
+                self._renovar_pool(pool)
+            raise ServicioNoDisponible(f"No se pudo encolar el trabajo: {e}") from e
+        with self._lock:
+            self._trabajos[trabajo.id] = trabajo
+        trabajo.futuro.add_done_callback(lambda futuro: self._terminado(trabajo, futuro, pool))
+        return trabajo
+
+    def _terminado(self, trabajo, futuro, pool):
+        from metricas import metricas
+
+        try:
+            resultado, tramos = futuro.result()
+            metricas.fusionar(tramos)
+        except BrokenProcessPool as e:
+            # El proceso trabajador murió (p. ej. sin memoria)
+            resultado = {"estado": "error", "error": f"El proceso trabajador terminó de forma inesperada: {e}"}
+            self._renovar_pool(pool)
+        except Exception as e:
+            resultado = {"estado": "error", "error": str(e)}
+        trabajo.resultado = resultado
+        with self._lock:
+            self._pendientes -= 1
+
+    def obtener(self, identificador):
+        with self._lock:
+            return self._trabajos.get(identificador)
+
+    def archivo(self, trabajo, nombre):
+        if trabajo.estado != "ok" or nombre not in os.listdir(trabajo.resultado["salida"]):
+            return None
+        return os.path.join(trabajo.resultado["salida"], nombre)
+
+    def eliminar(self, identificador):
+        with self._lock:
+            trabajo = self._trabajos.get(identificador)
+            if trabajo is None or trabajo.resultado is None:
+                return False
+            del self._trabajos[identificador]
+        shutil.rmtree(trabajo.directorio, ignore_errors=True)
+        return True
+
+    def salud(self):
+        with self._lock:
+            return {"pendientes": self._pendientes, "max_cola": self.max_cola,
+                    "trabajadores": self.trabajadores, "trabajos": len(self._trabajos)}
+
+    def cerrar(self):
+        from metricas import metricas
+
+        with self._lock:
+            pool = self._pool
+        pool.shutdown(cancel_futures=True)
+        metricas.cerrar()
+
+
+class ManejadorTrabajos(BaseHTTPRequestHandler):
+    # POST /trabajos?nombre=x.wav[&umbral=15&formato=wav]  cuerpo: el archivo de audio
+    # GET  /trabajos/<id>            estado y, al terminar, nota y archivos
+    # GET  /trabajos/<id>/<archivo>  descarga de una pista o figura
+    # DELETE /trabajos/<id>          borra un trabajo terminado
+    # GET  /salud, GET /metricas
+    servicio = None
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != "/trabajos":
+            return self._error(HTTPStatus.NOT_FOUND, "Ruta no encontrada")
+        parametros = {clave: valores[-1] for clave, valores in parse_qs(url.query).items()}
+        try:
+            longitud = int(self.headers.get("Content-Length", ""))
+            umbral = float(parametros.get("umbral", 15))
+        except ValueError:
+            return self._error(HTTPStatus.BAD_REQUEST, "Content-Length y umbral deben ser números")
+        if longitud <= 0 or longitud > MAX_BYTES_SUBIDA:
+            return self._error(HTTPStatus.REQUEST_ENTITY_TOO_LARGE if longitud > 0 else HTTPStatus.BAD_REQUEST,
+                               f"El audio debe ocupar entre 1 byte y {MAX_BYTES_SUBIDA} bytes")
+        try:
+            trabajo = self.servicio.reservar(parametros.get("nombre", "audio.wav"), umbral,
+                                             parametros.get("formato", "wav"))
+        except ColaLlena as e:
+            self.close_connection = True
+            return self._error(HTTPStatus.SERVICE_UNAVAILABLE, str(e), {"Retry-After": str(REINTENTAR_S)})
+        except ValueError as e:
+            return self._error(HTTPStatus.BAD_REQUEST, str(e))
+
+        try:
+            with open(self.servicio.ruta_entrada(trabajo), "wb") as archivo:
+                restante = longitud
+                while restante:
+                    trozo = self.rfile.read(min(TAM_TROZO_SUBIDA, restante))
+                    if not trozo:
+                        raise ConnectionError("Subida incompleta")
+                    archivo.write(trozo)
+                    restante -= len(trozo)
+        except (OSError, ConnectionError):
+            self.servicio.liberar(trabajo)
+            raise
+        try:
+            self.servicio.enviar(trabajo)
+        except ServicioNoDisponible as e:
+            return self._error(HTTPStatus.INTERNAL_SERVER_ERROR, str(e))
+        self._json(HTTPStatus.ACCEPTED, trabajo.descripcion(), {"Location": f"/trabajos/{trabajo.id}"})
+
+    def do_GET(self):
+        ruta = urlparse(self.path).path
+        if ruta == "/salud":
+            return self._json(HTTPStatus.OK, self.servicio.salud())
+        if ruta == "/metricas":
+            from metricas import metricas
+            return self._enviar(HTTPStatus.OK, metricas.texto_prometheus().encode("utf-8"),
+                                "text/plain; version=0.0.4; charset=utf-8")
+
+        coincidencia = _RUTA_TRABAJO.match(ruta)
+        trabajo = coincidencia and self.servicio.obtener(coincidencia.group(1))
+        if not trabajo:
+            return self._error(HTTPStatus.NOT_FOUND, "Trabajo no encontrado")
+        if coincidencia.group(2) is None:
+            return self._json(HTTPStatus.OK, trabajo.descripcion())
+
+        ruta_archivo = self.servicio.archivo(trabajo, coincidencia.group(2))
+        if ruta_archivo is None:
+            return self._error(HTTPStatus.NOT_FOUND, "Archivo no disponible")
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(os.path.getsize(ruta_archivo)))
+        self.send_header("Content-Disposition", f'attachment; filename="{coincidencia.group(2)}"')
+        self.end_headers()
+        with open(ruta_archivo, "rb") as archivo:
+            shutil.copyfileobj(archivo, self.wfile, TAM_TROZO_SUBIDA)
+
+    def do_DELETE(self):
+        coincidencia = _RUTA_TRABAJO.match(urlparse(self.path).path)
+        if not coincidencia or coincidencia.group(2) is not None:
+            return self._error(HTTPStatus.NOT_FOUND, "Ruta no encontrada")
+        if not self.servicio.eliminar(coincidencia.group(1)):
+            return self._error(HTTPStatus.CONFLICT, "El trabajo no existe o no ha terminado")
+        self._enviar(HTTPStatus.NO_CONTENT, b"")
+
+    def _json(self, estado, datos, cabeceras=None):
+        self._enviar(estado, json.dumps(datos, ensure_ascii=False).encode("utf-8"),
+                     "application/json; charset=utf-8", cabeceras)
+
+    def _error(self, estado, mensaje, cabeceras=None):
+        self._json(estado, {"error": mensaje}, cabeceras)
+
+    def _enviar(self, estado, cuerpo, tipo=None, cabeceras=None):
+        self.send_response(estado)
+        if tipo:
+            self.send_header("Content-Type", tipo)
+        self.send_header("Content-Length", str(len(cuerpo)))
+        for clave, valor in (cabeceras or {}).items():
+            self.send_header(clave, valor)
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, formato, *args):
+        from metricas import metricas
+        metricas.evento(formato % args, cliente=self.client_address[0])
+
+
+def crear_servidor(servicio, host="127.0.0.1", puerto=PUERTO):
+    manejador = type("Manejador", (ManejadorTrabajos,), {"servicio": servicio})
+    return ThreadingHTTPServer((host, puerto), manejador)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servicio HTTP local de separación y análisis")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=PUERTO)
+    parser.add_argument("-d", "--directorio", default=DIRECTORIO_TRABAJOS, help="Directorio de trabajos")
+    parser.add_argument("-j", "--trabajadores", type=int, default=1)
+    parser.add_argument("--max-cola", type=int, default=MAX_COLA,
+                        help="Trabajos sin terminar antes de responder 503")
+    parser.add_argument("--sr", type=int, default=22050)
+    parser.add_argument("--separador", default="demucs", choices=["demucs", "simulado", "puntual"])
+    parser.add_argument("--cache", default=None, help="Directorio de caché de pistas separadas")
+    parser.add_argument("--precision", default="float32", choices=["float32", "float64"])
+    args = parser.parse_args(argv)
+
+    servicio = ServidorTrabajos(args.directorio, args.trabajadores, args.max_cola, args.sr,
+                                args.separador, args.cache, args.precision)
+    servidor = crear_servidor(servicio, args.host, args.puerto)
+    print(f"Escuchando en http://{args.host}:{servidor.server_address[1]} "
+          f"({args.trabajadores} trabajadores, separador {args.separador})")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+        servicio.cerrar()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
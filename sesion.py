@@ -0,0 +1,159 @@
+import json
+import os
+import struct
+import numpy as np
+
+from audio_utils import TAM_BLOQUE_DISCO, huella_convertida, huella_memorizada, sembrar_huella
+from metricas import tramo
+
+EXTENSION_SESION = ".tgs"
+MAGICO = b"TGSESION"
+VERSION_SESION = 1
+# Cada array empieza alineado para poder mapearlo directamente desde el archivo
+ALINEACION = 64
+_CABECERA = struct.Struct("<8sIQ")  # mágico, versión, longitud del JSON
+
+
+def _alinear(posicion):
+    return -(-posicion // ALINEACION) * ALINEACION
+
+
+class _Contenido:
+    # Arrays que se van a escribir, con su posición dentro de la zona de datos
+    def __init__(self):
+        self.arrays = []
+        self.descripciones = {}
+        self.fin = 0
+
+    def agregar(self, nombre, array, dtype=None):
+        dtype = np.dtype(dtype or array.dtype)
+        self.descripciones[nombre] = {"dtype": dtype.str, "forma": list(array.shape), "offset": self.fin}
+        self.arrays.append((array, dtype))
+        self.fin = _alinear(self.fin + int(np.prod(array.shape)) * dtype.itemsize)
+        return nombre
+
+
+def guardar_sesion(ruta, sr, audio=None, vocal=None, instrumental=None, umbral=None,
+                   filtro_en_vivo=False, nombre=None, tam_bloque=TAM_BLOQUE_DISCO):
+    # Un solo archivo: cabecera fija, JSON con los metadatos y, detrás, los
+    # arrays en crudo y alineados (pistas en float32, y las señales filtradas,
+    # espectrogramas y notas que ya estuvieran calculados). Al abrirla todo se
+    # mapea en memoria, así que no se lee nada hasta que se usa.
+    from analisis_tono import memorizados_de
+    from espectrogramas import almacen_espectrogramas
+
+    with tramo("sesion", operacion="guardar", ruta=ruta):
+        contenido = _Contenido()
+        pistas = {}
+        huellas = set()
+        for clave, pista in (("original", audio), ("voz", vocal), ("instrumental", instrumental)):
+            if pista is None:
+                continue
+            if pista.dtype == np.float32:
+                huella = huella_memorizada(pista)
+                huellas.add(huella)
+            else:
+                # Se guarda en float32: la huella es la de lo que se escribe. Lo
+                # calculado sobre el original lleva otra huella y no se guarda,
+                # porque al abrir nadie lo pediría
+                huella = huella_convertida(pista, np.float32, tam_bloque)
+            pistas[clave] = {"array": contenido.agregar(clave, pista, np.float32), "huella": huella}
+
+        almacen = []
+        for indice, (clave, valor) in enumerate(almacen_espectrogramas.entradas_de(huellas)):
+            entrada = {"clave": list(clave), "array": contenido.agregar(f"almacen_{indice}", valor)}
+            if clave[0] == "senal":
+                # Las notas se calculan sobre la señal filtrada: hace falta su huella
+                entrada["huella"] = huella_memorizada(valor)
+                huellas.add(entrada["huella"])
+            almacen.append(entrada)
+
+        tono = [{"huella": huella, "sr": sr_tono,
+                 "tiempos": contenido.agregar(f"tono_{indice}_tiempos", linea.tiempos),
+                 "f0": contenido.agregar(f"tono_{indice}_f0", linea.f0)}
+                for indice, (huella, sr_tono, linea) in enumerate(memorizados_de(huellas))]
+
+        metadatos = json.dumps({
+            "sr": sr,
+            "umbral": umbral,
+            "filtro_en_vivo": filtro_en_vivo,
+            "nombre": nombre,
+            "pistas": pistas,
+            "almacen": almacen,
+            "tono": tono,
+            "arrays": contenido.descripciones,
+        }, ensure_ascii=False).encode("utf-8")
+
+        temporal = f"{ruta}.{os.getpid()}.tmp"
+        try:
+            with open(temporal, "wb") as archivo:
+                archivo.write(_CABECERA.pack(MAGICO, VERSION_SESION, len(metadatos)))
+                archivo.write(metadatos)
+                inicio_datos = _alinear(archivo.tell())
+                for (array, dtype), descripcion in zip(contenido.arrays, contenido.descripciones.values()):
+                    archivo.seek(inicio_datos + descripcion["offset"])
+                    # Por bloques: las pistas pueden estar en disco y ser más grandes que la RAM
+                    plano = array.reshape(-1)
+                    for desde in range(0, len(plano), tam_bloque):
+                        np.ascontiguousarray(plano[desde:desde + tam_bloque], dtype=dtype).tofile(archivo)
+                archivo.truncate(inicio_datos + contenido.fin)
+            os.replace(temporal, ruta)
+        except BaseException:
+            if os.path.exists(temporal):
+                os.remove(temporal)
+            raise
+        return ruta
+
+
+def cargar_sesion(ruta):
+    # Devuelve los metadatos y las pistas mapeadas (copia en escritura: quien
+    # las modifique no toca el archivo), y siembra las cachés de huellas,
+    # espectrogramas y notas para que nada de lo guardado se vuelva a calcular
+    from analisis_tono import LineaTiempoNotas, sembrar
+    from espectrogramas import almacen_espectrogramas
+
+    with tramo("sesion", operacion="cargar", ruta=ruta):
+        with open(ruta, "rb") as archivo:
+            cabecera = archivo.read(_CABECERA.size)
+            if len(cabecera) < _CABECERA.size:
+                raise ValueError("El archivo no es una sesión válida")
+            magico, version, longitud = _CABECERA.unpack(cabecera)
+            if magico != MAGICO:
+                raise ValueError("El archivo no es una sesión válida")
+            if version > VERSION_SESION:
+                raise ValueError(f"Sesión de una versión más reciente ({version})")
+            metadatos = json.loads(archivo.read(longitud).decode("utf-8"))
+        inicio_datos = _alinear(_CABECERA.size + longitud)
+
+        def mapear(nombre):
+            descripcion = metadatos["arrays"][nombre]
+            forma = tuple(descripcion["forma"])
+            if not np.prod(forma):
+                return np.zeros(forma, dtype=descripcion["dtype"])
+            return np.memmap(ruta, dtype=descripcion["dtype"], mode="c",
+                             offset=inicio_datos + descripcion["offset"], shape=forma)
+
+        pistas = {}
+        for clave, pista in metadatos["pistas"].items():
+            pistas[clave] = mapear(pista["array"])
+            sembrar_huella(pistas[clave], pista["huella"])
+
+        for entrada in metadatos["almacen"]:
+            valor = mapear(entrada["array"])
+            if "huella" in entrada:
+                sembrar_huella(valor, entrada["huella"])
+            almacen_espectrogramas.sembrar(tuple(entrada["clave"]), valor)
+
+        for entrada in metadatos["tono"]:
+            sembrar(entrada["huella"], entrada["sr"],
+                    LineaTiempoNotas(mapear(entrada["tiempos"]), mapear(entrada["f0"])))
+
+        return {
+            "sr": metadatos["sr"],
+            "umbral": metadatos["umbral"],
+            "filtro_en_vivo": metadatos["filtro_en_vivo"],
+            "nombre": metadatos["nombre"],
+            "original": pistas.get("original"),
+            "voz": pistas.get("voz"),
+            "instrumental": pistas.get("instrumental"),
+        }
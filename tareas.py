@@ -0,0 +1,155 @@
+import itertools
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class TareaCancelada(Exception):
+    pass
+
+
+class TareaEnConflicto(Exception):
+    pass
+
+
+class Tarea:
+    _contador = itertools.count(1)
+
+    def __init__(self, nombre, exclusivos, compartidos, eventos):
+        self.id = next(self._contador)
+        self.nombre = nombre
+        self.exclusivos = frozenset(exclusivos)
+        self.compartidos = frozenset(compartidos)
+        self.progreso = 0.0
+        self.mensaje = nombre
+        self._cancelacion = threading.Event()
+        self._eventos = eventos
+
+    @property
+    def cancelada(self):
+        return self._cancelacion.is_set()
+
+    def cancelar(self):
+        self._cancelacion.set()
+
+    def comprobar(self):
+        # Punto de cancelación cooperativa: las funciones de trabajo lo llaman entre etapas
+        if self._cancelacion.is_set():
+            raise TareaCancelada(self.nombre)
+
+    def reportar(self, progreso=None, mensaje=None):
+        # Se puede llamar desde cualquier hilo; la interfaz lo recoge en su siguiente sondeo
+        self.comprobar()
+        self._eventos.put(("progreso", self, progreso, mensaje))
+
+
+class PlanificadorTareas:
+    def __init__(self, root, max_trabajadores=2, intervalo_ms=100, al_cambiar=None):
+        self.root = root
+        self.intervalo_ms = intervalo_ms
+        self.al_cambiar = al_cambiar
+        self._ejecutor = ThreadPoolExecutor(max_workers=max_trabajadores, thread_name_prefix="tarea")
+        self._eventos = queue.Queue()
+        self._activas = {}
+        self._callbacks = {}
+        self._cerrado = False
+        self.root.after(self.intervalo_ms, self._sondear)
+
+    @property
+    def activas(self):
+        return list(self._activas.values())
+
+    def en_conflicto(self, exclusivos=(), compartidos=()):
+        exclusivos, compartidos = set(exclusivos), set(compartidos)
+        for tarea in self._activas.values():
+            if exclusivos & (tarea.exclusivos | tarea.compartidos):
+                return tarea
+            if compartidos & tarea.exclusivos:
+                return tarea
+        return None
+
+    def enviar(self, nombre, funcion, *args, exclusivos=(), compartidos=(),
+               al_terminar=None, al_fallar=None, al_cancelar=None):
+        # funcion(tarea, *args) corre en un hilo de trabajo; los callbacks, en el hilo de Tk.
+        # Los recursos exclusivos no se pueden compartir con ninguna otra tarea activa;
+        # los compartidos solo chocan con quien los tenga en exclusiva.
+        conflicto = self.en_conflicto(exclusivos, compartidos)
+        if conflicto is not None:
+            raise TareaEnConflicto(f"'{nombre}' choca con '{conflicto.nombre}', que sigue en curso")
+
+        tarea = Tarea(nombre, exclusivos, compartidos, self._eventos)
+        self._activas[tarea.id] = tarea
+        self._callbacks[tarea.id] = (al_terminar, al_fallar, al_cancelar)
+        self._ejecutor.submit(self._ejecutar, tarea, funcion, args)
+        self._notificar()
+        return tarea
+
+    def cancelar(self, tarea=None):
+        for activa in ([tarea] if tarea is not None else self.activas):
+            activa.cancelar()
+
+    def cerrar(self):
+        self._cerrado = True
+        self.cancelar()
+        self._ejecutor.shutdown(wait=False, cancel_futures=True)
+
+    def _ejecutar(self, tarea, funcion, args):
+        try:
+            tarea.comprobar()
+            resultado = funcion(tarea, *args)
+            tarea.comprobar()
+            self._eventos.put(("fin", tarea, resultado, None))
+        except TareaCancelada:
+            self._eventos.put(("cancelada", tarea, None, None))
+        except Exception as e:
+            self._eventos.put(("error", tarea, e, None))
+
+    def _sondear(self):
+        if self._cerrado:
+            return
+        try:
+            while True:
+                try:
+                    tipo, tarea, valor, mensaje = self._eventos.get_nowait()
+                except queue.Empty:
+                    break
+
+                if tipo == "progreso":
+                    if valor is not None:
+                        tarea.progreso = valor
+                    if mensaje is not None:
+                        tarea.mensaje = mensaje
+                    self._notificar()
+                    continue
+
+                self._activas.pop(tarea.id, None)
+                al_terminar, al_fallar, al_cancelar = self._callbacks.pop(tarea.id, (None, None, None))
+                self._notificar()
+                callback = {"fin": al_terminar, "error": al_fallar, "cancelada": al_cancelar}[tipo]
+                if callback is None:
+                    continue
+                try:
+                    if tipo == "cancelada":
+                        callback()
+                    else:
+                        callback(valor)
+                except Exception as e:
+                    # Un fallo al recoger el resultado se informa como el de la propia tarea
+                    if tipo == "fin" and al_fallar is not None:
+                        self._informar(al_fallar, e)
+                    else:
+                        self.root.report_callback_exception(type(e), e, e.__traceback__)
+        finally:
+            # Pase lo que pase con un callback, el sondeo sigue: si no, las tareas
+            # terminadas quedarían activas y bloquearían a las siguientes
+            self.root.after(self.intervalo_ms, self._sondear)
+
+    def _informar(self, al_fallar, error):
+        try:
+            al_fallar(error)
+        except Exception as e:
+            self.root.report_callback_exception(type(e), e, e.__traceback__)
+
+    def _notificar(self):
+        if self.al_cambiar is not None:
+            self.al_cambiar(self.activas)
@@ -0,0 +1,30 @@
+import numpy as np
+
+import espectrogramas
+from audio_utils import aplicar_fft
+from espectrogramas import AlmacenEspectrogramas
+
+
+def senal(n):
+    return np.random.default_rng(0).standard_normal(n).astype(np.float32)
+
+
+def claves(almacen):
+    return [clave[0] for clave in almacen._entradas]
+
+
+def test_las_pistas_cortas_reutilizan_el_barrido():
+    almacen = AlmacenEspectrogramas()
+    audio = senal(20000)
+    for umbral in (10, 30):
+        np.testing.assert_allclose(almacen.filtrada(audio, umbral), aplicar_fft(audio, umbral), atol=1e-5)
+    assert claves(almacen).count("barrido") == 1
+
+
+def test_las_pistas_largas_no_guardan_el_barrido(monkeypatch):
+    # Por encima del límite el barrido ocuparía unos 20 bytes por muestra
+    monkeypatch.setattr(espectrogramas, "MAX_MUESTRAS_BARRIDO", 10000)
+    almacen = AlmacenEspectrogramas()
+    audio = senal(20000)
+    np.testing.assert_allclose(almacen.filtrada(audio, 30), aplicar_fft(audio, 30), atol=1e-5)
+    assert "barrido" not in claves(almacen)
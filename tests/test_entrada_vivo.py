@@ -0,0 +1,108 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("tkinter")
+
+from entrada_vivo import (  # noqa: E402
+    HOP_VIVO,
+    N_FFT_VIVO,
+    SR_VIVO,
+    TAM_BLOQUE_ENTRADA,
+    AnalizadorVivo,
+    BufferCircular,
+    senal_prueba,
+)
+
+
+def rampa(desde, n):
+    return np.arange(desde, desde + n, dtype=np.float32)
+
+
+def test_la_capacidad_se_redondea_a_potencia_de_dos():
+    assert BufferCircular(1000).capacidad == 1024
+    assert BufferCircular(1024).capacidad == 1024
+
+
+def test_lectura_y_escritura_dan_la_vuelta_al_buffer():
+    buffer = BufferCircular(1024)
+    destino = np.zeros(1024, dtype=np.float32)
+    desde = 0
+    # 700 + 700 + ... obliga a partir bloques en el final del array varias veces
+    for _ in range(5):
+        assert buffer.escribir(rampa(desde, 700), instante=0.0)
+        assert buffer.disponibles() == 700
+        assert buffer.leer(destino) == 700
+        assert np.array_equal(destino[:700], rampa(desde, 700))
+        desde += 700
+    assert buffer.perdidos == 0 and buffer.disponibles() == 0
+
+
+def test_lectura_parcial():
+    buffer = BufferCircular(1024)
+    buffer.escribir(rampa(0, 600), instante=0.0)
+    destino = np.zeros(256, dtype=np.float32)
+    assert buffer.leer(destino) == 256 and np.array_equal(destino, rampa(0, 256))
+    assert buffer.leer(destino) == 256 and np.array_equal(destino, rampa(256, 256))
+    assert buffer.leer(destino) == 88 and np.array_equal(destino[:88], rampa(512, 88))
+
+
+def test_lleno_se_descarta_el_bloque_nuevo():
+    buffer = BufferCircular(1024)
+    assert buffer.escribir(rampa(0, 700), instante=1.0)
+    assert not buffer.escribir(rampa(700, 700), instante=2.0)
+    assert buffer.perdidos == 700 and buffer.disponibles() == 700
+    # Lo ya escrito no se toca y el instante descartado no se registra
+    destino = np.zeros(1024, dtype=np.float32)
+    assert buffer.leer(destino) == 700 and np.array_equal(destino[:700], rampa(0, 700))
+    assert buffer.instante(700) == 1.0
+    assert buffer.escribir(rampa(700, 300), instante=3.0)
+    assert buffer.instante(999) == 1.0 and buffer.instante(1000) == 3.0
+
+
+def alimentar(analizador, buffer, senal, al_bloque=None):
+    for indice, inicio in enumerate(range(0, len(senal) - TAM_BLOQUE_ENTRADA + 1, TAM_BLOQUE_ENTRADA)):
+        instante = (inicio + TAM_BLOQUE_ENTRADA) / SR_VIVO
+        assert buffer.escribir(senal[inicio:inicio + TAM_BLOQUE_ENTRADA], instante)
+        analizador.actualizar()
+        if al_bloque is not None:
+            al_bloque(inicio + TAM_BLOQUE_ENTRADA, instante)
+
+
+def test_el_analizador_sigue_el_arpegio():
+    buffer = BufferCircular(2 * SR_VIVO)
+    analizador = AnalizadorVivo(buffer, SR_VIVO)
+    duracion = int(0.5 * SR_VIVO)
+    notas = {}
+
+    def al_bloque(fin, instante):
+        # Nota mostrada hacia el final de cada una de las cuatro notas del arpegio
+        indice, resto = divmod(fin, duracion)
+        if int(0.9 * duracion) <= resto < int(0.9 * duracion) + TAM_BLOQUE_ENTRADA:
+            notas[indice] = analizador.nota
+
+    alimentar(analizador, buffer, senal_prueba(), al_bloque)
+    assert [notas.get(i) for i in range(4)] == ["A3", "C4", "E4", "A4"]
+    assert buffer.perdidos == 0
+
+
+def test_solo_se_calculan_las_columnas_nuevas():
+    buffer = BufferCircular(2 * SR_VIVO)
+    analizador = AnalizadorVivo(buffer, SR_VIVO)
+    senal = senal_prueba()
+    buffer.escribir(senal[:N_FFT_VIVO], 0.0)
+    assert analizador.actualizar() == 1
+    assert analizador.actualizar() == 0
+    buffer.escribir(senal[N_FFT_VIVO:N_FFT_VIVO + 3 * HOP_VIVO], 0.0)
+    assert analizador.actualizar() == 3
+    assert analizador.columna == 4
+
+
+def test_latencia_desde_la_ultima_muestra_analizada():
+    buffer = BufferCircular(2 * SR_VIVO)
+    analizador = AnalizadorVivo(buffer, SR_VIVO)
+    ultimo = []
+    alimentar(analizador, buffer, senal_prueba()[:SR_VIVO // 2], lambda fin, instante: ultimo.append(instante))
+    # Con bloques del tamaño del salto, cada bloque completa una trama
+    assert analizador.registrar_latencia(ahora=ultimo[-1] + 0.005) == pytest.approx(0.005)
+    p50, p95 = analizador.latencias()
+    assert p50 == pytest.approx(0.005) and p95 == pytest.approx(0.005)
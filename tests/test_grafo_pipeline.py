@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("librosa")
+
+from analisis_tono import memorizados_de  # noqa: E402
+from audio_utils import huella_memorizada  # noqa: E402
+from espectrogramas import AlmacenEspectrogramas  # noqa: E402
+from grafo_pipeline import crear_grafo_analisis  # noqa: E402
+
+SR = 22050
+
+
+def tono(frecuencia, segundos=1.0):
+    t = np.arange(int(segundos * SR)) / SR
+    return (0.5 * np.sin(2 * np.pi * frecuencia * t)).astype(np.float32)
+
+
+@pytest.fixture
+def grafo():
+    almacen = AlmacenEspectrogramas()
+    grafo = crear_grafo_analisis(almacen=almacen)
+    voz, instrumental = tono(440), tono(110)
+    grafo.fijar("audio", voz + instrumental)
+    grafo.fijar("pistas", (voz, instrumental))
+    grafo.establecer(sr=SR, umbral=20)
+    return grafo, almacen, voz
+
+
+def test_el_grafo_y_el_almacen_comparten_resultados(grafo):
+    grafo, almacen, voz = grafo
+    espectrograma = grafo.obtener("voz_espectrograma_filtrado")
+    # Lo que calcula el grafo es la entrada del almacén que usan las demás vistas
+    assert almacen.obtener(voz, 20) is espectrograma
+    assert grafo.obtener("voz_barrido") is almacen.barrido(voz)
+    assert grafo.obtener("voz_filtrada", umbral=35) is almacen.filtrada(voz, 35)
+    # Un solo barrido por pista para todos los umbrales
+    assert [clave[0] for clave in almacen._entradas].count("barrido") == 1
+    assert grafo.bytes_usados == 0
+
+
+def test_la_nota_sale_de_analizar_tono(grafo):
+    grafo, almacen, voz = grafo
+    assert grafo.obtener("voz_nota") == "A4"
+    huella = huella_memorizada(almacen.filtrada(voz, 20))
+    assert [sr for _, sr, _ in memorizados_de({huella})] == [SR]
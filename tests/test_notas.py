@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+
+from audio_utils import frecuencia_a_nota, frecuencias_a_notas
+
+
+# Cada frecuencia se nombra por el semitono más cercano: la frontera está a
+# medio semitono (±50 cents) de la nota, no en la nota siguiente
+@pytest.mark.parametrize("frecuencia, nota", [
+    (440.0, "A4"),
+    (452.0, "A4"),     # +47 cents
+    (460.0, "A#4"),    # +77 cents
+    (435.0, "A4"),     # -20 cents; truncando salía G#4
+    (329.1, "E4"),     # E4 algo bajo; truncando salía D#4
+    (261.63, "C4"),
+    (255.0, "C4"),     # -44 cents
+    (253.0, "B3"),     # -58 cents
+    (27.5, "A0"),
+    (4186.0, "C8"),
+])
+def test_frecuencia_a_nota_redondea_al_semitono_mas_cercano(frecuencia, nota):
+    assert frecuencia_a_nota(frecuencia) == nota
+    assert frecuencias_a_notas([frecuencia])[0] == nota
+
+
+def test_frecuencias_no_validas():
+    assert frecuencia_a_nota(0) == "N/A"
+    assert frecuencia_a_nota(-5.0) == "N/A"
+    notas = frecuencias_a_notas(np.array([np.nan, 0.0, 440.0]))
+    assert list(notas) == ["N/A", "N/A", "A4"]
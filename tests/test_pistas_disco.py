@@ -0,0 +1,49 @@
+import os
+
+import numpy as np
+
+from espectrogramas import AlmacenEspectrogramas
+from grafo_pipeline import crear_grafo_analisis
+from pistas_disco import AlmacenDisco
+
+
+def _pista(disco, segundos=2, sr=22050):
+    return disco.copiar(np.random.default_rng(0).standard_normal(segundos * sr).astype(np.float32), "voz")
+
+
+def test_las_senales_filtradas_expulsadas_se_borran_del_disco(tmp_path):
+    disco = AlmacenDisco(str(tmp_path))
+    audio = _pista(disco)
+    almacen = AlmacenEspectrogramas(limite_bytes=3 * audio.nbytes)
+    almacen.reservar = lambda longitud: disco.reservar(longitud, "filtrada")
+    almacen.liberar = disco.liberar
+
+    for umbral in range(1, 20):
+        almacen.filtrada(audio, umbral)
+    # La pista y las tres señales que caben en la caché
+    assert len(os.listdir(tmp_path)) == 1 + len(almacen._entradas) == 4
+
+    almacen.limpiar()
+    assert os.listdir(tmp_path) == [os.path.basename(audio.filename)]
+
+
+def test_el_grafo_usa_las_salidas_del_almacen(tmp_path):
+    disco = AlmacenDisco(str(tmp_path))
+    audio = _pista(disco)
+    almacen = AlmacenEspectrogramas(limite_bytes=3 * audio.nbytes)
+    almacen.reservar = lambda longitud: disco.reservar(longitud, "filtrada")
+    almacen.liberar = disco.liberar
+    grafo = crear_grafo_analisis(almacen=almacen)
+    grafo.fijar("audio", audio)
+    grafo.establecer(sr=22050, umbral=0)
+
+    # Con umbral 0 la salida es la propia pista: expulsarla no debe borrarla
+    assert grafo.obtener("audio_filtrada") is audio
+    for umbral in range(1, 20):
+        assert grafo.obtener("audio_filtrada", umbral=umbral) is almacen.filtrada(audio, umbral)
+    # Un único límite: el grafo no retiene señales que el almacén ya expulsó
+    assert grafo.bytes_usados == 0
+    assert len(os.listdir(tmp_path)) == 4
+
+    almacen.limpiar()
+    assert os.listdir(tmp_path) == [os.path.basename(audio.filename)]
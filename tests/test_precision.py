@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+from audio_utils import aplicar_fft, establecer_precision, obtener_precision, tipos_precision
+from barrido_umbral import BarridoUmbral
+
+SR = 22050
+UMBRAL = 15
+# Error máximo admitido al reconstruir sin umbral (análisis + síntesis con raíz de Hann)
+TOLERANCIA_RECONSTRUCCION = {"float32": 1e-5, "float64": 1e-12}
+
+
+def senal(segundos=3.0):
+    # Tono con armónicos más ruido, con pico 0.5, en float32 como las pistas cargadas
+    t = np.arange(int(segundos * SR)) / SR
+    tono = sum(np.sin(2 * np.pi * 220 * k * t) / k for k in range(1, 6))
+    ruido = np.random.default_rng(0).standard_normal(len(t)) * 0.05
+    audio = tono + ruido
+    return (0.5 * audio / np.abs(audio).max()).astype(np.float32)
+
+
+@pytest.fixture(params=["float32", "float64"])
+def precision(request):
+    anterior = obtener_precision()
+    establecer_precision(request.param)
+    yield request.param
+    establecer_precision(anterior)
+
+
+def snr_db(resultado, referencia):
+    error = np.asarray(resultado, dtype=np.float64) - referencia
+    return 10 * np.log10(np.mean(referencia ** 2) / np.mean(error ** 2))
+
+
+def test_reconstruccion_sin_umbral(precision):
+    audio = senal()
+    resultado = aplicar_fft(audio, 0)
+    assert resultado.dtype == tipos_precision()[0]
+    assert np.max(np.abs(resultado - audio.astype(np.float64))) < TOLERANCIA_RECONSTRUCCION[precision]
+
+
+def test_barrido_igual_que_aplicar_fft(precision):
+    audio = senal()
+    directo = aplicar_fft(audio, UMBRAL)
+    barrido = BarridoUmbral(audio).senal_filtrada(UMBRAL)
+    assert barrido.dtype == directo.dtype
+    assert np.max(np.abs(barrido - directo)) < TOLERANCIA_RECONSTRUCCION[precision]
+
+
+def test_filtrado_float32_frente_a_float64():
+    audio = senal()
+    referencia = aplicar_fft(audio.astype(np.float64), UMBRAL, precision="float64")
+    resultado = aplicar_fft(audio, UMBRAL, precision="float32")
+    assert resultado.dtype == np.float32
+    assert np.max(np.abs(resultado - referencia)) < 1e-5
+    assert snr_db(resultado, referencia) > 100
+
+
+def test_espectrograma_float32_frente_a_float64():
+    pytest.importorskip("librosa")
+    from espectrogramas import calcular_db
+
+    audio = senal()
+    anterior = obtener_precision()
+    try:
+        establecer_precision("float64")
+        referencia = calcular_db(audio.astype(np.float64))
+        establecer_precision("float32")
+        resultado = calcular_db(audio)
+    finally:
+        establecer_precision(anterior)
+    assert referencia.dtype == np.float64 and resultado.dtype == np.float32
+    assert resultado.shape == referencia.shape
+    # En dB: una centésima es inaudible e invisible en el espectrograma
+    assert np.max(np.abs(resultado - referencia)) < 0.01
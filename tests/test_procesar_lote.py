@@ -0,0 +1,45 @@
+import json
+import os
+
+import pytest
+
+import procesar_lote
+from procesar_lote import ARCHIVO_FALLOS, leer_manifiesto
+
+
+def procesar_o_morir(ruta, directorio_salida, sr, umbral, formato):
+    # Sustituye a _procesar_seguro en los trabajadores: "muere" mata el proceso
+    # como lo haría el OOM killer o un fallo en un decodificador nativo
+    if "muere" in os.path.basename(ruta):
+        os._exit(1)
+    return {"estado": "ok", "salida": directorio_salida}, []
+
+
+def test_un_trabajador_muerto_no_aborta_el_lote(tmp_path, monkeypatch):
+    monkeypatch.setattr(procesar_lote, "_procesar_seguro", procesar_o_morir)
+    salida = str(tmp_path / "salida")
+    archivos = [str(tmp_path / nombre) for nombre in ("a.wav", "muere.wav", "c.wav", "d.wav")]
+
+    fallos = procesar_lote.procesar_lote(archivos, salida, trabajadores=1, separador="simulado")
+
+    # Solo el archivo que mató al trabajador queda como fallido; el resto sigue
+    # en un pool nuevo
+    assert list(fallos) == [archivos[1]]
+    manifiesto = leer_manifiesto(salida)
+    assert {ruta: registro["estado"] for ruta, registro in manifiesto.items()} == {
+        archivos[0]: "ok", archivos[1]: "error", archivos[2]: "ok", archivos[3]: "ok"}
+    assert "terminó de forma inesperada" in manifiesto[archivos[1]]["error"]
+    with open(os.path.join(salida, ARCHIVO_FALLOS), encoding="utf-8") as informe:
+        assert [registro["archivo"] for registro in json.load(informe)] == [archivos[1]]
+
+
+def test_el_informe_de_fallos_se_escribe_aunque_se_interrumpa(tmp_path, monkeypatch):
+    def interrumpir(*args, **kwargs):
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(procesar_lote, "wait", interrumpir)
+    salida = str(tmp_path / "salida")
+    with pytest.raises(KeyboardInterrupt):
+        procesar_lote.procesar_lote([str(tmp_path / "a.wav")], salida, separador="simulado")
+    with open(os.path.join(salida, ARCHIVO_FALLOS), encoding="utf-8") as informe:
+        assert json.load(informe) == []
@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from separacion import MotorPuntual, MotorSegmentado, planificar_segmentos, rampas_fundido
+
+SR = 8000
+
+
+@pytest.mark.parametrize("longitud", [1, 999, 1000, 1001, 2500, 10_000, 12_345])
+def test_los_segmentos_cubren_la_pista_con_el_solape_pedido(longitud):
+    tam, solape = 1000, 200
+    segmentos = planificar_segmentos(longitud, tam, solape)
+    assert segmentos[0][0] == 0 and segmentos[-1][1] == longitud
+    for (inicio, fin), (siguiente, _) in zip(segmentos, segmentos[1:]):
+        assert fin - inicio == tam
+        assert fin - siguiente == solape
+    assert all(fin - inicio >= min(solape, longitud) for inicio, fin in segmentos)
+
+
+def test_las_rampas_suman_uno():
+    entrada, salida = rampas_fundido(257)
+    assert np.allclose(entrada + salida, 1.0, atol=1e-6)
+    assert entrada[0] < 0.01 and entrada[-1] > 0.99
+
+
+@pytest.fixture
+def segmentado():
+    motor = MotorSegmentado("puntual", trabajadores=2, segmento_s=1.0, solape_s=0.25)
+    yield motor
+    motor.cerrar()
+
+
+@pytest.mark.parametrize("segundos", [0.5, 5.3])
+def test_el_cosido_coincide_con_separar_de_una_vez(segmentado, segundos):
+    audio = np.random.default_rng(1).standard_normal(int(segundos * SR)).astype(np.float32)
+    avances = []
+    voz, instrumental = segmentado.separar(audio, SR, progreso=lambda hechos, total: avances.append((hechos, total)))
+    referencia_voz, referencia_instrumental = MotorPuntual().separar(audio, SR)
+
+    assert voz.shape == instrumental.shape == audio.shape
+    assert np.max(np.abs(voz - referencia_voz)) < 1e-6
+    assert np.max(np.abs(instrumental - referencia_instrumental)) < 1e-6
+    total = len(planificar_segmentos(len(audio), SR, SR // 4))
+    assert avances[-1] == (total, total) and len(avances) == total
@@ -0,0 +1,119 @@
+import io
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import numpy as np
+import pytest
+
+sf = pytest.importorskip("soundfile")
+pytest.importorskip("librosa")
+
+from servidor import REINTENTAR_S, ServidorTrabajos, crear_servidor  # noqa: E402
+
+SR = 22050
+
+
+def wav(segundos=2.0):
+    buffer = io.BytesIO()
+    t = np.arange(int(segundos * SR)) / SR
+    sf.write(buffer, (0.3 * np.sin(2 * np.pi * 440 * t)).astype(np.float32), SR, format="WAV")
+    return buffer.getvalue()
+
+
+class Cliente:
+    def __init__(self, base):
+        self.base = base
+
+    def pedir(self, metodo, ruta, datos=None):
+        peticion = urllib.request.Request(self.base + ruta, data=datos, method=metodo)
+        try:
+            with urllib.request.urlopen(peticion, timeout=60) as respuesta:
+                return respuesta.status, dict(respuesta.headers), respuesta.read()
+        except urllib.error.HTTPError as e:
+            return e.code, dict(e.headers), e.read()
+
+    def enviar(self, datos, formato="flac"):
+        return self.pedir("POST", f"/trabajos?nombre=a.wav&formato={formato}&umbral=10", datos)
+
+    def esperar(self, identificador, limite_s=120):
+        fin = time.monotonic() + limite_s
+        while time.monotonic() < fin:
+            _, _, cuerpo = self.pedir("GET", f"/trabajos/{identificador}")
+            descripcion = json.loads(cuerpo)
+            if descripcion["estado"] not in ("en_cola", "procesando"):
+                return descripcion
+            time.sleep(0.2)
+        raise TimeoutError(identificador)
+
+    def salud(self):
+        return json.loads(self.pedir("GET", "/salud")[2])
+
+
+@pytest.fixture
+def servicio(tmp_path):
+    servicio = ServidorTrabajos(str(tmp_path / "trabajos"), trabajadores=1, max_cola=1, separador="simulado")
+    servidor = crear_servidor(servicio, puerto=0)
+    hilo = threading.Thread(target=servidor.serve_forever, daemon=True)
+    hilo.start()
+    yield servicio, Cliente(f"http://127.0.0.1:{servidor.server_address[1]}")
+    servidor.shutdown()
+    servidor.server_close()
+    servicio.cerrar()
+
+
+def test_ciclo_completo_de_un_trabajo(servicio):
+    _, cliente = servicio
+    datos = wav()
+
+    estado, cabeceras, cuerpo = cliente.enviar(datos)
+    assert estado == 202
+    trabajo = json.loads(cuerpo)
+    assert cabeceras["Location"] == f"/trabajos/{trabajo['id']}"
+
+    # Con max_cola=1 el segundo se rechaza sin leer la subida
+    estado, cabeceras, _ = cliente.enviar(datos)
+    assert estado == 503
+    assert cabeceras["Retry-After"] == str(REINTENTAR_S)
+
+    descripcion = cliente.esperar(trabajo["id"])
+    assert descripcion["estado"] == "ok"
+    assert "voz.flac" in descripcion["archivos"]
+
+    estado, _, contenido = cliente.pedir("GET", f"/trabajos/{trabajo['id']}/voz.flac")
+    assert estado == 200
+    audio, sr = sf.read(io.BytesIO(contenido))
+    assert sr == SR and len(audio) > 0
+    assert cliente.pedir("GET", f"/trabajos/{trabajo['id']}/no_existe.wav")[0] == 404
+
+    assert cliente.pedir("DELETE", f"/trabajos/{trabajo['id']}")[0] == 204
+    assert cliente.pedir("GET", f"/trabajos/{trabajo['id']}")[0] == 404
+    assert cliente.salud()["pendientes"] == 0
+
+
+def test_un_pool_roto_no_deja_la_cola_llena(servicio):
+    servidor_trabajos, cliente = servicio
+    datos = wav(0.5)
+    estado, _, cuerpo = cliente.enviar(datos)
+    assert estado == 202
+    assert cliente.esperar(json.loads(cuerpo)["id"])["estado"] == "ok"
+
+    # Un trabajador muere (como al quedarse sin memoria) y el pool queda roto
+    roto = servidor_trabajos._pool
+    for proceso in list(roto._processes.values()):
+        proceso.kill()
+    fin = time.monotonic() + 30
+    while not roto._broken and time.monotonic() < fin:
+        time.sleep(0.05)
+    assert roto._broken
+
+    estado, _, cuerpo = cliente.enviar(datos)
+    assert estado == 500 and "error" in json.loads(cuerpo)
+    assert cliente.salud()["pendientes"] == 0
+
+    # El hueco se devolvió y el pool se renovó: el siguiente trabajo sale adelante
+    estado, _, cuerpo = cliente.enviar(datos)
+    assert estado == 202
+    assert cliente.esperar(json.loads(cuerpo)["id"])["estado"] == "ok"
@@ -0,0 +1,28 @@
+import numpy as np
+import pytest
+
+from audio_utils import huella_audio, huella_convertida, huella_memorizada
+from sesion import cargar_sesion, guardar_sesion
+
+
+def test_huella_convertida_igual_que_convertir_y_calcular():
+    audio = np.random.default_rng(0).standard_normal(10_007)
+    assert huella_convertida(audio, np.float32, tam_bloque=1000) == huella_audio(audio.astype(np.float32))
+
+
+@pytest.mark.parametrize("dtype", [np.float32, np.float64])
+def test_la_huella_sembrada_es_la_del_contenido_guardado(tmp_path, dtype):
+    rng = np.random.default_rng(1)
+    audio = rng.standard_normal(5000).astype(dtype)
+    voz = (audio * 0.5).astype(dtype)
+    ruta = str(tmp_path / "sesion.tgs")
+    guardar_sesion(ruta, 22050, audio, voz, None, umbral=20, nombre="prueba")
+
+    sesion = cargar_sesion(ruta)
+    assert sesion["sr"] == 22050 and sesion["umbral"] == 20 and sesion["nombre"] == "prueba"
+    assert sesion["instrumental"] is None
+    for clave, original in (("original", audio), ("voz", voz)):
+        pista = sesion[clave]
+        assert pista.dtype == np.float32
+        assert np.array_equal(pista, original.astype(np.float32))
+        assert huella_memorizada(pista) == huella_audio(np.asarray(pista))
@@ -0,0 +1,64 @@
+import time
+
+from tareas import PlanificadorTareas
+
+
+class RaizFalsa:
+    # Sustituye a Tk: guarda los after() y los informes de excepciones
+    def __init__(self):
+        self.programados = []
+        self.errores = []
+
+    def after(self, ms, funcion):
+        self.programados.append(funcion)
+
+    def report_callback_exception(self, tipo, valor, traza):
+        self.errores.append(valor)
+
+    def sondear(self, planificador, limite_s=5.0):
+        fin = time.monotonic() + limite_s
+        while planificador.activas and time.monotonic() < fin:
+            self.programados.pop(0)()
+            time.sleep(0.01)
+
+
+def test_un_callback_que_falla_no_detiene_el_sondeo():
+    raiz = RaizFalsa()
+    planificador = PlanificadorTareas(raiz)
+    fallos = []
+
+    def al_terminar(_):
+        raise RuntimeError("fallo al mostrar el resultado")
+
+    planificador.enviar("a", lambda tarea: 1, exclusivos=("audio",),
+                        al_terminar=al_terminar, al_fallar=fallos.append)
+    raiz.sondear(planificador)
+
+    assert planificador.activas == []
+    assert [str(e) for e in fallos] == ["fallo al mostrar el resultado"]
+    assert len(raiz.programados) == 1
+    # El recurso quedó libre: otra tarea sobre él ya no choca
+    resultados = []
+    planificador.enviar("b", lambda tarea: 2, exclusivos=("audio",), al_terminar=resultados.append)
+    raiz.sondear(planificador)
+    assert resultados == [2]
+    planificador.cerrar()
+
+
+def test_un_al_fallar_que_falla_se_informa_a_tk():
+    raiz = RaizFalsa()
+    planificador = PlanificadorTareas(raiz)
+
+    def trabajo(tarea):
+        raise ValueError("fallo en la tarea")
+
+    def al_fallar(_):
+        raise RuntimeError("fallo al avisar")
+
+    planificador.enviar("a", trabajo, al_fallar=al_fallar)
+    raiz.sondear(planificador)
+
+    assert planificador.activas == []
+    assert [str(e) for e in raiz.errores] == ["fallo al avisar"]
+    assert len(raiz.programados) == 1
+    planificador.cerrar()
@@ -0,0 +1,178 @@
+import tkinter as tk
+from tkinter import ttk
+import numpy as np
+
+from render_raster import LUT_PLASMA
+
+N_FFT = 2048
+HOP_LENGTH = 512
+FILAS = 256
+FMIN_VISOR = 30.0
+TAM_TESELA = 1024
+TRAMAS_POR_TROZO = 4096
+
+
+class PiramideEspectrograma:
+    # Espectrograma cuantizado a uint8 (0.5 dB por paso, 0 dB = escala completa) en
+    # filas de frecuencia logarítmica. El nivel 0 tiene una columna por trama; cada
+    # nivel siguiente se queda con el máximo de cada par de columnas. Cada nivel se
+    # guarda en teselas de TAM_TESELA columnas.
+    def __init__(self, audio, sr, n_fft=N_FFT, hop_length=HOP_LENGTH, filas=FILAS):
+        import librosa
+
+        self.sr = sr
+        self.hop_length = hop_length
+        self.filas = filas
+        self.duracion = len(audio) / sr
+        self.frecuencias = np.geomspace(FMIN_VISOR, sr / 2, filas + 1)
+        inicios_filas = np.minimum((self.frecuencias[:-1] * n_fft / sr).astype(int), n_fft // 2)
+        referencia = n_fft / 2
+
+        longitud = len(audio)
+        n_tramas = 1 + longitud // hop_length
+        nivel0 = np.empty((filas, n_tramas), dtype=np.uint8)
+        segmento = np.zeros((TRAMAS_POR_TROZO - 1) * hop_length + n_fft, dtype=np.float32)
+        for t0 in range(0, n_tramas, TRAMAS_POR_TROZO):
+            t1 = min(t0 + TRAMAS_POR_TROZO, n_tramas)
+            a = t0 * hop_length - n_fft // 2
+            b = (t1 - 1) * hop_length - n_fft // 2 + n_fft
+            tramo = segmento[:b - a]
+            tramo[:] = 0
+            tramo[max(a, 0) - a:min(b, longitud) - a] = audio[max(a, 0):min(b, longitud)]
+            magnitud = np.abs(librosa.stft(tramo, n_fft=n_fft, hop_length=hop_length, center=False))
+            magnitud = np.maximum.reduceat(magnitud, inicios_filas, axis=0)
+            db = 20 * np.log10(np.maximum(magnitud, 1e-10) / referencia)
+            nivel0[:, t0:t1] = np.clip(255 + 2 * db, 0, 255)
+
+        self.maximo = int(nivel0.max()) if nivel0.size else 255
+        self.niveles = [self._teselas(nivel0)]
+        del nivel0
+        while self.columnas(len(self.niveles) - 1) > TAM_TESELA:
+            self.niveles.append(self._reducir(self.niveles[-1]))
+
+    @staticmethod
+    def _teselas(matriz):
+        return [matriz[:, i:i + TAM_TESELA].copy() for i in range(0, matriz.shape[1], TAM_TESELA)]
+
+    @staticmethod
+    def _reducir(teselas):
+        reducidas = []
+        for i in range(0, len(teselas), 2):
+            par = np.concatenate(teselas[i:i + 2], axis=1)
+            if par.shape[1] % 2:
+                par = np.concatenate((par, par[:, -1:]), axis=1)
+            reducidas.append(np.maximum(par[:, 0::2], par[:, 1::2]))
+        return reducidas
+
+    def columnas(self, nivel):
+        return sum(tesela.shape[1] for tesela in self.niveles[nivel])
+
+    def segundos_por_columna(self, nivel):
+        return self.hop_length * (2 ** nivel) / self.sr
+
+    def region(self, t0, t1, ancho, alto):
+        # Devuelve una imagen uint8 (alto, ancho) del intervalo [t0, t1) en segundos,
+        # leyendo solo las teselas visibles del nivel más cercano a 1 columna por píxel.
+        columnas_por_pixel = (t1 - t0) / self.segundos_por_columna(0) / ancho
+        nivel = int(np.clip(np.floor(np.log2(max(columnas_por_pixel, 1))), 0, len(self.niveles) - 1))
+        paso = self.segundos_por_columna(nivel)
+        total = self.columnas(nivel)
+
+        centros = t0 + (np.arange(ancho) + 0.5) * (t1 - t0) / ancho
+        indices = np.clip((centros / paso).astype(np.int64), 0, total - 1)
+        primera, ultima = indices[0] // TAM_TESELA, indices[-1] // TAM_TESELA
+        visibles = np.concatenate(self.niveles[nivel][primera:ultima + 1], axis=1)
+        columnas = visibles[:, indices - primera * TAM_TESELA]
+
+        filas = np.clip((np.arange(alto)[::-1] * self.filas / alto).astype(int), 0, self.filas - 1)
+        return columnas[filas]
+
+    def lut_ajustada(self, lut, rango_db=80):
+        # Igual que ref=np.max: el máximo de la pista es el color más alto y se
+        # muestran rango_db decibelios por debajo.
+        pasos = 2 * rango_db
+        q = np.arange(256)
+        return lut[np.clip((q - (self.maximo - pasos)) * 255 // pasos, 0, 255)]
+
+
+class VisorEspectrograma(ttk.Frame):
+    def __init__(self, master, alto=300, **kwargs):
+        super().__init__(master, **kwargs)
+        self.canvas = tk.Canvas(self, height=alto, background="black", highlightthickness=0)
+        self.canvas.pack(fill=tk.BOTH, expand=True)
+        self.etiqueta = ttk.Label(self, text="Rueda: zoom · Arrastrar: desplazar · Doble clic: vista completa")
+        self.etiqueta.pack(fill=tk.X)
+
+        self.lut = LUT_PLASMA
+        self.piramide = None
+        self._lut_actual = None
+        self._imagen = None
+        self._pendiente = False
+        self.t0 = 0.0
+        self.t1 = 1.0
+        self._arrastre = None
+
+        self.canvas.bind("<Configure>", lambda _: self.redibujar())
+        self.canvas.bind("<MouseWheel>", lambda e: self._zoom(e.x, 0.8 if e.delta > 0 else 1.25))
+        self.canvas.bind("<Button-4>", lambda e: self._zoom(e.x, 0.8))
+        self.canvas.bind("<Button-5>", lambda e: self._zoom(e.x, 1.25))
+        self.canvas.bind("<ButtonPress-1>", self._iniciar_arrastre)
+        self.canvas.bind("<B1-Motion>", self._arrastrar)
+        self.canvas.bind("<Double-Button-1>", lambda _: self.vista_completa())
+
+    def mostrar(self, piramide):
+        self.piramide = piramide
+        self._lut_actual = piramide.lut_ajustada(self.lut)
+        self.vista_completa()
+
+    def vista_completa(self):
+        if self.piramide is not None:
+            self.t0, self.t1 = 0.0, self.piramide.duracion
+            self.redibujar()
+
+    def redibujar(self):
+        # Agrupa varios eventos seguidos (rueda, arrastre) en un solo dibujo
+        if not self._pendiente:
+            self._pendiente = True
+            self.after_idle(self._dibujar)
+
+    def _dibujar(self):
+        self._pendiente = False
+        if self.piramide is None:
+            return
+        ancho, alto = self.canvas.winfo_width(), self.canvas.winfo_height()
+        if ancho < 2 or alto < 2:
+            return
+
+        rgb = self._lut_actual[self.piramide.region(self.t0, self.t1, ancho, alto)]
+        cabecera = f"P6 {ancho} {alto} 255\n".encode()
+        self._imagen = tk.PhotoImage(width=ancho, height=alto, data=cabecera + rgb.tobytes(), format="PPM")
+        self.canvas.delete("all")
+        self.canvas.create_image(0, 0, image=self._imagen, anchor=tk.NW)
+        self.canvas.create_text(4, alto - 4, text=f"{self.t0:.2f} s", anchor=tk.SW, fill="white")
+        self.canvas.create_text(ancho - 4, alto - 4, text=f"{self.t1:.2f} s", anchor=tk.SE, fill="white")
+        self.canvas.create_text(4, 4, text=f"{self.piramide.sr / 2:.0f} Hz", anchor=tk.NW, fill="white")
+
+    def _zoom(self, x, factor):
+        if self.piramide is None:
+            return
+        ancho = max(self.canvas.winfo_width(), 1)
+        centro = self.t0 + (self.t1 - self.t0) * x / ancho
+        minimo = self.piramide.segundos_por_columna(0) * 16
+        duracion = np.clip((self.t1 - self.t0) * factor, minimo, self.piramide.duracion)
+        self._mover_a(centro - (centro - self.t0) * duracion / (self.t1 - self.t0), duracion)
+
+    def _iniciar_arrastre(self, evento):
+        self._arrastre = (evento.x, self.t0)
+
+    def _arrastrar(self, evento):
+        if self.piramide is None or self._arrastre is None:
+            return
+        x0, t0 = self._arrastre
+        duracion = self.t1 - self.t0
+        self._mover_a(t0 - (evento.x - x0) * duracion / max(self.canvas.winfo_width(), 1), duracion)
+
+    def _mover_a(self, inicio, duracion):
+        inicio = float(np.clip(inicio, 0, max(self.piramide.duracion - duracion, 0)))
+        self.t0, self.t1 = inicio, inicio + duracion
+        self.redibujar()
@@ -1,30 +1,47 @@
 # visuals.py
 
-import numpy as np
-import matplotlib.pyplot as plt
-import librosa
-import librosa.display
 from audio_utils import obtener_nota_predominante
+from metricas import atributos_pista, tramo
+from render_raster import apilar, guardar_imagen, renderizar_espectrograma
+from espectrogramas import HOP_LENGTH, hop_visual, obtener_espectrograma, obtener_senal_filtrada
 
-# 1. Primero graficar_espectrograma
-def graficar_espectrograma(audio, sr, titulo):
-    D = librosa.amplitude_to_db(np.abs(librosa.stft(audio)), ref=np.max)
-    librosa.display.specshow(D, sr=sr, x_axis='time', y_axis='log', cmap='plasma')
+
+# matplotlib y librosa.display se importan al dibujar: cargarlos retrasa el arranque
+# y las exportaciones (render_raster) no los necesitan
+
+# 1. Primero dibujar_espectrograma y graficar_espectrograma
+def dibujar_espectrograma(D, sr, hop_length=HOP_LENGTH):
+    import librosa.display
+    import matplotlib.pyplot as plt
+
+    librosa.display.specshow(D, sr=sr, hop_length=hop_length, x_axis='time', y_axis='log', cmap='plasma')
     plt.colorbar(format='%+2.0f dB')
-    nota = obtener_nota_predominante(audio, sr)
-    plt.title(f"{titulo} - Nota Predominante: {nota}", fontsize=12, fontweight="bold")
-    plt.xlabel("Tiempo (s)")
-    plt.ylabel("Frecuencia (Hz)")
+
+
+def graficar_espectrograma(audio, sr, titulo, umbral=None):
+    # Con umbral se grafica la pista filtrada; la matriz en dB sale del almacén compartido
+    import matplotlib.pyplot as plt
+
+    with tramo("render", motor="matplotlib", **atributos_pista(audio, sr)):
+        dibujar_espectrograma(obtener_espectrograma(audio, umbral), sr, hop_visual(len(audio)))
+        nota = obtener_nota_predominante(obtener_senal_filtrada(audio, umbral), sr)
+        plt.title(f"{titulo} - Nota Predominante: {nota}", fontsize=12, fontweight="bold")
+        plt.xlabel("Tiempo (s)")
+        plt.ylabel("Frecuencia (Hz)")
 
 
 # 2. Luego todas las funciones que la usan
 def mostrar_espectrograma(audio, sr, titulo):
+    import matplotlib.pyplot as plt
+
     plt.figure(figsize=(12, 4))
     graficar_espectrograma(audio, sr, titulo)
     plt.tight_layout()
-    plt.show()
+    plt.show(block=False)
 
 def mostrar_espectrogramas_separados(vocal_track, instrumental_track, sr):
+    import matplotlib.pyplot as plt
+
     plt.figure(figsize=(12, 8))
 
     plt.subplot(2, 1, 1)
@@ -34,14 +51,31 @@ def mostrar_espectrogramas_separados(vocal_track, instrumental_track, sr):
     graficar_espectrograma(instrumental_track, sr, "Instrumental - Original")
 
     plt.tight_layout()
-    plt.show()
+    plt.show(block=False)
+
 
+def mostrar_comparacion_fft(original, sr, titulo, umbral):
+    import matplotlib.pyplot as plt
 
-def mostrar_comparacion_fft(original, procesado, sr, titulo):
     plt.figure(figsize=(12, 6))
     plt.subplot(2, 1, 1)
     graficar_espectrograma(original, sr, f"{titulo} Original")
     plt.subplot(2, 1, 2)
-    graficar_espectrograma(procesado, sr, f"{titulo} con FFT")
+    graficar_espectrograma(original, sr, f"{titulo} con FFT", umbral=umbral)
     plt.tight_layout()
-    plt.show()
+    plt.show(block=False)
+
+
+def guardar_espectrograma(audio, sr, titulo, ruta_guardado, umbral=None):
+    nota = obtener_nota_predominante(obtener_senal_filtrada(audio, umbral), sr)
+    guardar_figura([(audio, umbral, f"{titulo} - Nota Predominante: {nota}")], sr, ruta_guardado)
+
+
+def guardar_figura(paneles, sr, ruta_guardado, figsize=(12, 4), dpi=100):
+    # paneles: lista de (audio, umbral, titulo), uno por fila. Se rasteriza sin
+    # matplotlib, así que puede llamarse desde hilos de trabajo.
+    ancho, alto = int(figsize[0] * dpi), int(figsize[1] * dpi) // len(paneles)
+    imagenes = [renderizar_espectrograma(obtener_espectrograma(audio, umbral), sr, hop_visual(len(audio)),
+                                         titulo=titulo, ancho=ancho, alto=alto)
+                for audio, umbral, titulo in paneles]
+    guardar_imagen(apilar(imagenes), ruta_guardado)